@@ -1,5 +1,8 @@
+from typing import Optional
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
+from core.advisor import RiskAdvisor
+from core.db import DatabaseManager
 from core.pipeline import RiskPipeline
 from core.context import RiskContext
 # Importe seus modelos de dados aqui
@@ -32,4 +35,60 @@ async def run_risk_analysis(req: SimulationRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/v1/backtest/{simulation_id}/narratives")
+async def get_backtest_narratives(simulation_id: str, sim_date: Optional[str] = None,
+                                  contract_id: Optional[str] = None, limit: int = 100):
+    """
+    Laudos XAI do backtest, renderizados sob demanda a partir do vetor de features gravado
+    (memoizados por faixa: contratos com o mesmo perfil não refazem o texto).
+    """
+    try:
+        db = DatabaseManager(use_service_role=False)
+        query = db.client.table("backtest_results")\
+            .select("contract_id, sim_date, pd_score, expected_loss, risk_features, risk_justification")\
+            .eq("simulation_id", simulation_id)
+        if sim_date:
+            query = query.eq("sim_date", sim_date)
+        if contract_id:
+            query = query.eq("contract_id", contract_id)
+        res = query.order("sim_date").limit(min(max(limit, 1), 1000)).execute()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+    return {
+        "simulation_id": simulation_id,
+        "results": [
+            {
+                "contract_id": row["contract_id"],
+                "sim_date": row["sim_date"],
+                "pd_score": row["pd_score"],
+                "expected_loss": row["expected_loss"],
+                "risk_justification": RiskAdvisor.narrative_for(row)
+            }
+            for row in res.data or []
+        ]
+    }
+
+@app.get("/v1/portfolio/{contract_id}/narrative")
+async def get_contract_narrative(contract_id: str):
+    """Laudo XAI do último scoring do contrato (renderizado sob demanda)."""
+    try:
+        db = DatabaseManager(use_service_role=False)
+        res = db.client.table("credit_portfolio")\
+            .select("id, client_name, last_pd_score, risk_features, risk_justification")\
+            .eq("id", contract_id)\
+            .execute()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    if not res.data:
+        raise HTTPException(status_code=404, detail=f"Contrato {contract_id} não encontrado")
+
+    contract = res.data[0]
+    return {
+        "contract_id": contract["id"],
+        "client_name": contract.get("client_name"),
+        "pd_score": contract.get("last_pd_score"),
+        "risk_justification": RiskAdvisor.narrative_for(contract)
+    }
+
 # Para rodar: uv run uvicorn api:app --reload
\ No newline at end of file
@@ -1,5 +1,7 @@
 # core/advisor.py
 import logging
+import math
+from functools import lru_cache
 
 logger = logging.getLogger(__name__)
 
@@ -7,57 +9,130 @@ class RiskAdvisor:
     """
     XAI Engine (Explainable AI) para Risco de Crédito Agro.
     Gera narrativas determinísticas baseadas em gatilhos fundamentais.
+
+    Os resultados guardam só o vetor de features da narrativa (`narrative_features`); o texto
+    é renderizado sob demanda (`render_narrative`) e memoizado por faixa de features.
     """
 
+    # Faixas de PD usadas pelos gatilhos da narrativa: <=40, (40, 50], (50, 70], >70
+    PD_BANDS = (40, 50, 70)
+    # Faixas de LTV: <=0.7, (0.7, 1.0], >1.0
+    LTV_BANDS = (0.7, 1.0)
+
+    @staticmethod
+    def _band(value, limits) -> int:
+        return sum(value > limit for limit in limits)
+
+    @classmethod
+    def narrative_features(cls, pd_score, metrics) -> dict:
+        """
+        Vetor compacto com tudo o que a narrativa usa (gravado no lugar do texto).
+        Valores já no arredondamento exibido no laudo.
+        """
+        yield_loss = float(metrics.get('yield_loss_est', '0%').strip('%'))
+        ltv = metrics.get('ltv', 0)
+        ltv_band = cls._band(ltv, cls.LTV_BANDS)
+        collateral = metrics.get('collateral_value_brl', 0) if ltv_band == 2 else 0
+        return {
+            "pd_band": cls._band(pd_score, cls.PD_BANDS),
+            "yield_loss": yield_loss,
+            "ltv_band": ltv_band,
+            "ltv": float(f"{ltv:.2f}"),
+            # O colateral só aparece no texto da estrutura descoberta
+            "collateral": round(collateral) if math.isfinite(collateral) else collateral,
+            "basis_stressed": "Estressado" in metrics.get('basis_status', 'Normal'),
+        }
+
+    @classmethod
+    def narrative_features_batch(cls, scored) -> list:
+        """
+        `narrative_features` da carteira inteira a partir do frame do `score_portfolio`
+        (faixas em NumPy; mesmo resultado de `portfolio_row_metrics` + `narrative_features`).
+        """
+        pd_scores = scored['pd_score'].to_numpy(dtype=float)
+        ltv = scored['ltv'].to_numpy(dtype=float)
+        has_collateral = (scored['collateral_status'] != "DATA_MISSING").to_numpy()
+        pd_band = sum((pd_scores > limit).astype(int) for limit in cls.PD_BANDS)
+        ltv_band = sum((ltv > limit).astype(int) for limit in cls.LTV_BANDS)
+        stressed = scored['basis_status'].astype(str).str.contains("Estressado", regex=False).to_numpy()
+        yield_loss = scored['yield_loss_factor'].tolist()
+        collateral = scored['collateral_value_brl'].tolist()
+
+        features = []
+        for i, ltv_value in enumerate(ltv.tolist()):
+            collateral_value = collateral[i] if has_collateral[i] and ltv_band[i] == 2 else 0
+            features.append({
+                "pd_band": int(pd_band[i]),
+                "yield_loss": float(f"{yield_loss[i]:.1%}".strip('%')) if has_collateral[i] else 0.0,
+                "ltv_band": int(ltv_band[i]),
+                "ltv": float(f"{ltv_value:.2f}"),
+                "collateral": round(collateral_value) if math.isfinite(collateral_value) else collateral_value,
+                "basis_stressed": bool(stressed[i]),
+            })
+        return features
+
+    @staticmethod
+    def render_narrative(features: dict) -> str:
+        """Laudo a partir do vetor de features (memoizado: faixas repetidas não refazem o texto)."""
+        return _render_narrative((
+            features['pd_band'], features['yield_loss'], features['ltv_band'],
+            features['ltv'], features['collateral'], bool(features['basis_stressed'])
+        ))
+
+    @classmethod
+    def narrative_for(cls, record: dict):
+        """Narrativa de uma linha gravada: renderiza `risk_features` ou devolve o texto legado."""
+        features = record.get('risk_features')
+        if features:
+            return cls.render_narrative(features)
+        return record.get('risk_justification')
+
     def generate_credit_narrative(self, pd_score, metrics):
         """
         Constrói um laudo técnico detalhado explicando o 'Porquê' do score.
         Estrutura: [VEREDITO] + [CAUSA RAIZ CLIMÁTICA] + [SAÚDE FINANCEIRA] + [FATOR LOGÍSTICO].
         """
-        narrative_parts = []
-
-        # 1. VEREDITO INICIAL (O "Headline")
-        if pd_score > 70:
-            narrative_parts.append("🔴 PERFIL CRÍTICO: Probabilidade de Default elevada.")
-        elif pd_score > 40:
-            narrative_parts.append("🟡 PERFIL ALERTA: Sinais de deterioração da capacidade de pagamento.")
-        else:
-            narrative_parts.append("🟢 PERFIL ROBUSTO: Operação dentro dos parâmetros de segurança.")
-
-        # 2. ANÁLISE CLIMÁTICA (A Causa Raiz Biológica)
-        # Extrai a perda de produtividade calculada no engine
-        yield_loss_str = metrics.get('yield_loss_est', '0%')
-        yield_loss_val = float(yield_loss_str.strip('%'))
-        
-        if yield_loss_val > 15.0:
-            narrative_parts.append(f"Quebra de safra severa estimada em {yield_loss_str} devido a estresse térmico/hídrico na janela crítica.")
-        elif yield_loss_val > 5.0:
-            narrative_parts.append(f"Perda marginal de produtividade ({yield_loss_str}) detectada, pressionando levemente o fluxo de caixa.")
-        else:
-            narrative_parts.append("Condições climáticas favoráveis sustentam a produtividade projetada.")
-
-        # 3. ANÁLISE FINANCEIRA (LTV e Garantias)
-        ltv = metrics.get('ltv', 0)
-        collateral_val = metrics.get('collateral_value_brl', 0)
-        
-        if ltv > 1.0:
-            narrative_parts.append(f"⚠️ ESTRUTURA DESCOBERTA: LTV projetado de {ltv:.2f}x indica insuficiência de garantias (Colateral: R$ {collateral_val:,.0f}).")
-        elif ltv > 0.7:
-            narrative_parts.append(f"Alavancagem moderada (LTV {ltv:.2f}x), exigindo monitoramento da liquidez.")
-        else:
-            narrative_parts.append(f"Excelente cobertura de garantias (LTV {ltv:.2f}x), mitigando risco de perda final (LGD).")
-
-        # 4. ANÁLISE LOGÍSTICA (O "Custo Brasil")
-        # Se o preço do frete/basis estiver estressado
-        basis_status = metrics.get('basis_status', 'Normal')
-        if "Estressado" in basis_status:
-            narrative_parts.append("Logística pressionada: Custo de escoamento corrói a margem líquida do produtor.")
-        
-        # 5. ANÁLISE COMPORTAMENTAL (Serasa/Dívida)
-        # Recuperamos isso indiretamente se o PD for alto mas o clima for bom
-        if pd_score > 50 and yield_loss_val < 5.0:
-            narrative_parts.append("Risco impulsionado majoritariamente por fatores comportamentais (Score de Crédito/Endividamento prévio).")
-
-        # Montagem Final
-        full_narrative = " ".join(narrative_parts)
-        return full_narrative
\ No newline at end of file
+        return self.render_narrative(self.narrative_features(pd_score, metrics))
+
+
+@lru_cache(maxsize=65536)
+def _render_narrative(key) -> str:
+    pd_band, yield_loss_val, ltv_band, ltv, collateral_val, basis_stressed = key
+    yield_loss_str = f"{yield_loss_val:.1f}%"
+    narrative_parts = []
+
+    # 1. VEREDITO INICIAL (O "Headline")
+    if pd_band == 3:
+        narrative_parts.append("🔴 PERFIL CRÍTICO: Probabilidade de Default elevada.")
+    elif pd_band >= 1:
+        narrative_parts.append("🟡 PERFIL ALERTA: Sinais de deterioração da capacidade de pagamento.")
+    else:
+        narrative_parts.append("🟢 PERFIL ROBUSTO: Operação dentro dos parâmetros de segurança.")
+
+    # 2. ANÁLISE CLIMÁTICA (A Causa Raiz Biológica)
+    if yield_loss_val > 15.0:
+        narrative_parts.append(f"Quebra de safra severa estimada em {yield_loss_str} devido a estresse térmico/hídrico na janela crítica.")
+    elif yield_loss_val > 5.0:
+        narrative_parts.append(f"Perda marginal de produtividade ({yield_loss_str}) detectada, pressionando levemente o fluxo de caixa.")
+    else:
+        narrative_parts.append("Condições climáticas favoráveis sustentam a produtividade projetada.")
+
+    # 3. ANÁLISE FINANCEIRA (LTV e Garantias)
+    if ltv_band == 2:
+        narrative_parts.append(f"⚠️ ESTRUTURA DESCOBERTA: LTV projetado de {ltv:.2f}x indica insuficiência de garantias (Colateral: R$ {collateral_val:,.0f}).")
+    elif ltv_band == 1:
+        narrative_parts.append(f"Alavancagem moderada (LTV {ltv:.2f}x), exigindo monitoramento da liquidez.")
+    else:
+        narrative_parts.append(f"Excelente cobertura de garantias (LTV {ltv:.2f}x), mitigando risco de perda final (LGD).")
+
+    # 4. ANÁLISE LOGÍSTICA (O "Custo Brasil")
+    if basis_stressed:
+        narrative_parts.append("Logística pressionada: Custo de escoamento corrói a margem líquida do produtor.")
+
+    # 5. ANÁLISE COMPORTAMENTAL (Serasa/Dívida)
+    # Recuperamos isso indiretamente se o PD for alto mas o clima for bom
+    if pd_band >= 2 and yield_loss_val < 5.0:
+        narrative_parts.append("Risco impulsionado majoritariamente por fatores comportamentais (Score de Crédito/Endividamento prévio).")
+
+    # Montagem Final
+    return " ".join(narrative_parts)
@@ -0,0 +1,62 @@
+# core/alert_timeline.py
+from bisect import bisect_left, bisect_right
+from collections import Counter
+import numpy as np
+import pandas as pd
+
+
+class AlertCounts(Counter):
+    """Contagem de alertas por (categoria, nível). Aceita no lugar da lista de alertas nas Estratégias."""
+
+    @classmethod
+    def from_alerts(cls, alerts):
+        return cls((alert.get('category', ''), alert.get('risk_level', 'NEUTRO')) for alert in alerts or [])
+
+
+class AlertTimeline:
+    """
+    Histórico de alertas geopolíticos carregado uma vez e ordenado por `created_at`.
+    A janela de relevância de cada snapshot é um recorte por bisect, e as contagens por
+    categoria/nível saem de somas acumuladas (sem nova consulta ao banco por data).
+    """
+
+    def __init__(self, alerts):
+        records = [a for a in (alerts or []) if a.get('created_at')]
+        stamps = [self._to_utc(a['created_at']) for a in records]
+        order = sorted(range(len(records)), key=lambda i: stamps[i])
+        self.alerts = [records[i] for i in order]
+        self.timestamps = [stamps[i] for i in order]
+
+        # Somas acumuladas por (categoria, nível): contagem da janela = cum[hi] - cum[lo]
+        keys = [(a.get('category', ''), a.get('risk_level', 'NEUTRO')) for a in self.alerts]
+        self.keys = sorted(set(keys))
+        key_pos = {key: i for i, key in enumerate(self.keys)}
+        hits = np.zeros((len(self.alerts) + 1, len(self.keys)), dtype=np.int64)
+        for row, key in enumerate(keys, start=1):
+            hits[row, key_pos[key]] = 1
+        self._cumulative = np.cumsum(hits, axis=0)
+
+    @staticmethod
+    def _to_utc(value) -> pd.Timestamp:
+        stamp = pd.Timestamp(value)
+        return stamp.tz_localize('UTC') if stamp.tzinfo is None else stamp.tz_convert('UTC')
+
+    def _bounds(self, end, days: int):
+        # Mesma janela da consulta original: created_at entre (data - dias) e data, limites por dia (00:00)
+        end = self._to_utc(pd.Timestamp(end).strftime('%Y-%m-%d'))
+        start = end - pd.Timedelta(days=days)
+        return bisect_left(self.timestamps, start), bisect_right(self.timestamps, end)
+
+    def window(self, end, days: int = 30) -> list:
+        """Alertas da janela de relevância (ordenados por data)."""
+        lo, hi = self._bounds(end, days)
+        return self.alerts[lo:hi]
+
+    def counts(self, end, days: int = 30) -> AlertCounts:
+        """Contagens por (categoria, nível) na janela, em O(categorias)."""
+        lo, hi = self._bounds(end, days)
+        window = self._cumulative[hi] - self._cumulative[lo]
+        return AlertCounts({key: int(n) for key, n in zip(self.keys, window) if n})
+
+    def __len__(self):
+        return len(self.alerts)
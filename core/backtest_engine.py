@@ -2,40 +2,152 @@
 import pandas as pd
 import numpy as np
 import logging
+from concurrent.futures import ProcessPoolExecutor
 from datetime import timedelta
 from core.logger import get_logger
+from core.alert_timeline import AlertTimeline
+from core.climate_cube import ClimateWindowCube
 from core.climate_risk import ClimateIntelligence
 from core.advisor import RiskAdvisor  # <--- IMPORT NOVO
+from core.env import get_config
+from core.monte_carlo import MonteCarloLossSimulator
+from core.result_writer import BacktestResultWriter
+from core.backtest_metrics import StreamingBacktestMetrics
+from core.feature_store import BacktestFeatureStore
 
 logging.getLogger('InstitutionalBacktest').setLevel(logging.INFO)
 logger = get_logger("InstitutionalBacktest")
 
 class InstitutionalBacktestEngine:
-    def __init__(self, risk_engine, db_manager):
+    def __init__(self, risk_engine, db_manager, lake=None):
         self.engine = risk_engine
         self.db = db_manager
+        self.lake = lake # LocalDataLake: leitura offline (mmap) no lugar do Supabase
         self.climate_intel = ClimateIntelligence()
         self.advisor = RiskAdvisor() # <--- INICIALIZAÇÃO DO NARRADOR
+        self.loss_distribution = None # Monte Carlo do último snapshot
+        self.metrics = None # Agregados em streaming do último run
 
-    def run_walk_forward(self, simulation_name, start_date, end_date, contracts):
-        logger.info(f"🚀 Iniciando Backtest Institucional: {simulation_name}")
+    # Frequências suportadas do walk-forward (código -> freq do pandas, rótulo do log, horizonte do relatório)
+    # As métricas são por snapshot: EL médio e VaR valem para o horizonte da frequência usada
+    FREQUENCIES = {
+        "D": ("D", "diários", "DIÁRIO"),
+        "W": ("W-MON", "semanais", "SEMANAL"),
+        "MS": ("MS", "mensais", "MENSAL"),
+    }
+    # Janela de relevância do news flow: notícia importa por 30 dias
+    ALERT_WINDOW_DAYS = 30
+    # Datas conferidas contra o recálculo sobre o prefixo (look-ahead) antes do walk-forward
+    POINT_IN_TIME_SAMPLES = 8
+
+    def run_walk_forward(self, simulation_name, start_date, end_date, contracts, frequency="MS", workers=1, resume=False):
+        if frequency not in self.FREQUENCIES:
+            raise ValueError(f"Frequência inválida: {frequency} (use {', '.join(self.FREQUENCIES)})")
+        if not contracts:
+            raise ValueError("❌ Carteira vazia: nenhum contrato para o backtest.")
+        pandas_freq, freq_label, _ = self.FREQUENCIES[frequency]
+        logger.info(f"🚀 Iniciando Backtest Institucional: {simulation_name} (frequência {frequency})")
         
         warm_up_start = start_date - timedelta(days=45)
         full_market = self._load_historical_market(warm_up_start, end_date)
         if full_market is None or full_market.empty:
             raise ValueError("❌ Falha crítica: Dados de mercado insuficientes.")
 
-        climate_map = self._load_historical_climate_map(contracts, start_date, end_date)
+        climate_map = self._prepare_climate_windows(self._load_historical_climate_map(contracts, start_date, end_date))
+
+        sim_id, writer, resume_from = self._open_simulation(simulation_name, start_date, end_date, resume, frequency)
+
+        # Carteira colunar (a chave do clima é o client_name)
+        portfolio = pd.DataFrame(contracts)
+        portfolio['name'] = portfolio['client_name']
+
+        dates = pd.date_range(start_date, end_date, freq=pandas_freq, tz='UTC')
+        if resume_from is not None:
+            # Datas já confirmadas no checkpoint não são recalculadas
+            dates = dates[dates.strftime('%Y-%m-%d') > resume_from]
+        total_steps = len(dates)
+        loan_amounts = portfolio['loan_amount'].astype(float).to_numpy()
+        contract_ids = portfolio['id'].tolist()
+        
+        logger.info(f"⏳ Executando {total_steps} snapshots {freq_label}...")
+
+        # Indicadores calculados uma vez sobre aquecimento + teste; cada snapshot lê sua data
+        feature_store = BacktestFeatureStore(full_market)
+        feature_store.positions(dates) # Toda data tem mercado até ela (índice ordenado: sem linha futura)
+        # Causalidade: snapshot indexado x recálculo sobre o prefixo em datas amostradas da janela
+        feature_store.assert_point_in_time_sample(dates, self.POINT_IN_TIME_SAMPLES)
+
+        # Dados somente leitura compartilhados por todos os snapshots (e pelos workers)
+        job = {
+            "sim_id": sim_id,
+            "contracts": contracts,
+            "portfolio": portfolio,
+            "loan_amounts": loan_amounts,
+            "contract_ids": contract_ids,
+            "feature_store": feature_store,
+            "climate_windows": climate_map,
+            "climate_positions": climate_map.positions(contracts),
+        }
+        # --- NOVO: News flow da época carregado uma vez; cada data recebe as contagens da sua janela ---
+        alert_timeline = self._load_alert_timeline(start_date, end_date)
+        alerts_by_date = [alert_timeline.counts(current_date, self.ALERT_WINDOW_DAYS) for current_date in dates]
+
+        # Agregados em streaming; na retomada, as datas já confirmadas vêm do spool local
+        metrics = StreamingBacktestMetrics(portfolio, frequency=frequency)
+        if resume_from is not None:
+            metrics.replay(writer.read_spool())
+        spool_complete = resume_from is None or (metrics.n_dates > 0 and metrics.dates[-1] >= resume_from)
+
+        last_scored = None
+        for i, current_date, scored, snapshot_results in self._iter_snapshots(job, dates, alerts_by_date, workers):
+            sim_date = current_date.date().isoformat()
+            # Spool + insert em blocos com retry; a data só entra no checkpoint depois de gravada
+            writer.write(sim_date, snapshot_results)
+            metrics.update(sim_date, snapshot_results)
+            if i % max(1, total_steps // 10) == 0:
+                logger.info(f"🔄 Progresso: {current_date.date()} ({i+1}/{total_steps}) | VaR 95% corrente: R$ {metrics.percentile(95):,.2f}")
+            if scored is not None:
+                last_scored = scored
+
+        if spool_complete:
+            self._save_final_metrics(sim_id, metrics)
+        else:
+            # Spool local ausente (retomada em outra máquina): único caso que relê o banco
+            self._calculate_final_metrics_sql(sim_id, frequency)
+        if last_scored is not None:
+            self.loss_distribution = self._simulate_loss_distribution(last_scored, portfolio)
+        logger.info(f"✅ Backtest {simulation_name} finalizado com sucesso.")
+
+    def _open_simulation(self, simulation_name, start_date, end_date, resume=False, frequency="MS"):
+        """
+        Gestão da Simulação (Limpeza/Retomada e Criação).
+        Retorna (sim_id, writer, última data confirmada ou None).
+        """
+        if self.db is None:
+            # Modo offline (data lake): resultados só no spool local, com o mesmo checkpoint
+            sim_id = f"local_{simulation_name}"
+            writer = BacktestResultWriter.from_config(None, sim_id, get_config())
+            if resume and writer.last_committed_date() is not None:
+                return sim_id, writer, writer.resume()
+            writer.reset()
+            return sim_id, writer, None
 
-        # Gestão da Simulação (Limpeza e Criação)
         existing = self.db.client.table("backtest_simulations").select("id").eq("simulation_name", simulation_name).execute()
+        resume_from = None
         if existing.data:
             sim_id = existing.data[0]['id']
-            logger.info(f"🧹 Limpando dados antigos da simulação ID {sim_id}...")
-            self.db.client.table("backtest_results").delete().eq("simulation_id", sim_id).execute()
+            writer = BacktestResultWriter.from_config(self.db.client, sim_id, get_config())
+            if resume and writer.last_committed_date() is not None:
+                resume_from = writer.resume()
+                logger.info(f"♻️ Retomando simulação ID {sim_id} após {resume_from}...")
+            else:
+                logger.info(f"🧹 Limpando dados antigos da simulação ID {sim_id}...")
+                self.db.client.table("backtest_results").delete().eq("simulation_id", sim_id).execute()
+                writer.reset()
             self.db.client.table("backtest_simulations").update({
                 "start_date": start_date.isoformat(),
                 "end_date": end_date.isoformat(),
+                "frequency": frequency,
                 "status": "RUNNING"
             }).eq("id", sim_id).execute()
         else:
@@ -43,102 +155,131 @@ class InstitutionalBacktestEngine:
                 "simulation_name": simulation_name,
                 "start_date": start_date.isoformat(),
                 "end_date": end_date.isoformat(),
+                "frequency": frequency,
                 "status": "RUNNING"
             }).execute()
             sim_id = res.data[0]['id']
+            writer = BacktestResultWriter.from_config(self.db.client, sim_id, get_config())
+            writer.reset()
+        return sim_id, writer, resume_from
 
-        dates = pd.date_range(start_date, end_date, freq='MS', tz='UTC')
-        total_steps = len(dates)
-        
-        logger.info(f"⏳ Executando {total_steps} snapshots mensais...")
+    def _iter_snapshots(self, job, dates, alerts_by_date, workers=1):
+        """
+        Executa os snapshots (independentes entre si) em série ou num pool de processos.
+        Os resultados são entregues sempre na ordem das datas, prontos para o writer (checkpoint por data).
+        Em paralelo, apenas o último snapshot devolve a carteira pontuada (Monte Carlo).
+        """
+        last = len(dates) - 1
+        if workers <= 1 or len(dates) <= 1:
+            for i, current_date in enumerate(dates):
+                scored, results = self._score_snapshot(job, current_date, alerts_by_date[i])
+                yield i, current_date, scored, results
+            return
 
-        for i, current_date in enumerate(dates):
-            if i % max(1, total_steps // 10) == 0:
-                logger.info(f"🔄 Progresso: {current_date.date()} ({i+1}/{total_steps})")
-            
-            pit_market = full_market.loc[:current_date]
-            df_snapshot_climate = self._build_climate_snapshot(contracts, climate_map, current_date)
-
-            # --- NOVO: Busca notícias da época ---
-            historical_alerts = self._get_historical_alerts(current_date)
-            # -------------------------------------
-
-            snapshot_results = []
-
-            for contract in contracts:
-                try:
-                    pd_score, metrics = self.engine.calculate_pd_metrics(
-                        pit_market, 
-                        contract['client_name'],
-                        df_snapshot_climate, 
-                        contract,
-                        current_date.month,
-                        active_alerts=historical_alerts # <--- Passa aqui!
-                    )
-
-                    # --- CORREÇÃO XAI: GERAÇÃO DA NARRATIVA ---
-                    # Aqui chamamos o Advisor explicitamente para este snapshot
-                    narrative = self.advisor.generate_credit_narrative(pd_score, metrics)
-                    # ------------------------------------------
-
-                    lgd = 0.45 
-                    expected_loss = (pd_score / 100.0) * lgd * contract['loan_amount']
-                    
-                    snapshot_results.append({
-                        "simulation_id": sim_id,
-                        "contract_id": contract['id'],
-                        "sim_date": current_date.date().isoformat(),
-                        "pd_score": float(pd_score),
-                        "ltv_ratio": float(metrics.get('ltv', 0)),
-                        "exposure_at_default": float(contract['loan_amount']),
-                        "expected_loss": float(expected_loss),
-                        "risk_justification": narrative # <--- SALVANDO O TEXTO GERADO
-                    })
-
-                except Exception as e:
-                    logger.error(f"Erro no contrato {contract.get('client_name')}: {e}")
-                    continue
-
-            if snapshot_results:
-                self._bulk_save(snapshot_results)
-
-        self._calculate_final_metrics_sql(sim_id)
-        logger.info(f"✅ Backtest {simulation_name} finalizado com sucesso.")
+        tasks = [(i, current_date, alerts_by_date[i], i == last) for i, current_date in enumerate(dates)]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_snapshot_worker, initargs=(job,)) as pool:
+            # map devolve na ordem de submissão (ordem das datas), independente de qual worker termina antes
+            for i, scored, results in pool.map(_run_snapshot_task, tasks):
+                yield i, dates[i], scored, results
+
+    def _score_snapshot(self, job, current_date, historical_alerts):
+        """Pontua a carteira em uma data (point-in-time). Retorna (scored, linhas para o banco)."""
+        pit_market = job["feature_store"].snapshot_at(current_date)
+        df_snapshot_climate = self._build_climate_snapshot(
+            job["contracts"], job["climate_windows"], current_date, job.get("climate_positions")
+        )
+
+        try:
+            scored = self.engine.score_portfolio(
+                job["portfolio"],
+                pit_market,
+                df_snapshot_climate,
+                current_date.month,
+                alerts=historical_alerts # <--- Passa aqui!
+            )
+        except Exception as e:
+            logger.error(f"Erro no scoring do snapshot {current_date.date()}: {e}")
+            return None, []
+
+        # Perda esperada da carteira em uma passada (LGD regulatória fixa de 45%)
+        lgd = 0.45
+        loan_amounts = job["loan_amounts"]
+        pd_scores = scored['pd_score'].to_numpy(dtype=float)
+        expected_losses = (pd_scores / 100.0) * lgd * loan_amounts
+        ltv_ratios = scored['ltv'].to_numpy(dtype=float)
+        sim_date = current_date.date().isoformat()
+
+        # --- XAI: só o vetor de features da narrativa; o texto é renderizado sob demanda (API/relatório) ---
+        features = self.advisor.narrative_features_batch(scored)
+
+        snapshot_results = [
+            {
+                "simulation_id": job["sim_id"],
+                "contract_id": contract_id,
+                "sim_date": sim_date,
+                "pd_score": pd_value,
+                "ltv_ratio": ltv_value,
+                "exposure_at_default": exposure,
+                "expected_loss": loss,
+                "risk_features": feature_vector
+            }
+            for contract_id, pd_value, ltv_value, exposure, loss, feature_vector in zip(
+                job["contract_ids"], pd_scores.tolist(), ltv_ratios.tolist(),
+                loan_amounts.tolist(), expected_losses.tolist(), features
+            )
+        ]
+
+        return scored, snapshot_results
 
     # ... (Mantenha os métodos auxiliares _build_climate_snapshot, _calculate_final_metrics_sql, etc. iguais ao anterior)
-    def _build_climate_snapshot(self, contracts, climate_map, current_date):
-        snapshot_records = []
-        lookback_date = (current_date - timedelta(days=7)).strftime('%Y-%m-%d')
-        target_date_str = current_date.strftime('%Y-%m-%d')
-
-        for contract in contracts:
-            coords = (contract['latitude'], contract['longitude'])
-            weather_df = climate_map.get(coords)
-            
-            if weather_df is not None:
-                window = weather_df[
-                    (weather_df['date'] <= target_date_str) & 
-                    (weather_df['date'] > lookback_date)
-                ]
-                rain_7d = window['precipitation'].sum() if not window.empty else 0
-                temp_max = window['temp_max'].mean() if not window.empty else 25
-                
-                status, score = self.climate_intel.analyze_risk(
-                    {'rain_7d': rain_7d, 'temp_max': temp_max},
-                    'production',
-                    'S', 
-                    current_date.month
-                )
-                snapshot_records.append({
-                    'Location': contract['client_name'],
-                    'Risk_Status': status,
-                    'Risk_Score': score,
-                    'Rain_7d': rain_7d,
-                    'Temp_Max': temp_max
-                })
-        return pd.DataFrame(snapshot_records)
-
-    def _calculate_final_metrics_sql(self, sim_id):
+    def _prepare_climate_windows(self, climate_map):
+        """
+        Pré-computa as janelas móveis de 7 dias de todas as coordenadas (cumsum sobre o eixo de datas),
+        para que cada snapshot seja um gather em vez de filtrar o histórico de cada contrato.
+        """
+        return ClimateWindowCube(climate_map, window_days=7)
+
+    def _build_climate_snapshot(self, contracts, climate_windows, current_date, positions=None):
+        return climate_windows.snapshot(contracts, current_date, self.climate_intel, positions)
+
+    def _simulate_loss_distribution(self, scored, portfolio):
+        """
+        Distribuição de perdas da carteira no último snapshot (Monte Carlo com LGD dinâmica).
+        Complementa o VaR por percentil das poucas perdas esperadas mensais.
+        """
+        try:
+            simulator = MonteCarloLossSimulator.from_config(get_config())
+            distribution = simulator.simulate_portfolio(scored, portfolio['loan_amount'].to_numpy(dtype=float))
+            report = distribution.to_dict()
+            logger.info(f"🎲 Monte Carlo: EL R$ {report['expected_loss']:,.2f} | " + " | ".join(
+                f"VaR/ES {level:.0%}: R$ {distribution.var(level):,.2f} / R$ {distribution.expected_shortfall(level):,.2f}"
+                for level in distribution.confidence_levels
+            ))
+            return distribution
+        except Exception as e:
+            logger.error(f"Erro na simulação de Monte Carlo: {e}")
+            return None
+
+    def _save_final_metrics(self, sim_id, metrics):
+        """Grava o sumário a partir dos agregados em streaming (sem reler o `backtest_results`)."""
+        self.metrics = metrics
+        if self.db is None:
+            logger.info(f"📊 Sumário (offline): {metrics.summary()}")
+            return
+        try:
+            self.db.client.table("backtest_simulations").update({
+                **metrics.summary(),
+                "status": "COMPLETED"
+            }).eq("id", sim_id).execute()
+        except Exception as e:
+            logger.error(f"Erro ao salvar métricas finais: {e}")
+            return
+        try:
+            self.db.client.table("backtest_simulations").update({"metrics": metrics.breakdown()}).eq("id", sim_id).execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Quebra por estado/cluster não salva (coluna `metrics` ausente?): {e}")
+
+    def _calculate_final_metrics_sql(self, sim_id, frequency="MS"):
         try:
             all_results = []
             offset = 0
@@ -164,13 +305,22 @@ class InstitutionalBacktestEngine:
             }).eq("id", sim_id).execute()
         except Exception as e:
             logger.error(f"Erro na agregação: {e}")
+            return
+        try:
+            self.db.client.table("backtest_simulations").update({"metrics": {"frequency": frequency}}).eq("id", sim_id).execute()
+        except Exception as e:
+            logger.warning(f"⚠️ Frequência não salva em `metrics` (coluna ausente?): {e}")
 
     def _load_historical_market(self, start, end):
         start_str = start.strftime('%Y-%m-%d')
         end_str = end.strftime('%Y-%m-%d')
-        res = self.db.client.table("market_prices").select("ticker, close, date").gte("date", start_str).lte("date", end_str).execute()
-        if not res.data: return None
-        df = pd.DataFrame(res.data)
+        if self.lake is not None and self.lake.has_market:
+            df = self.lake.read_market(start_str, end_str)
+            if df.empty: return None
+        else:
+            res = self.db.client.table("market_prices").select("ticker, close, date").gte("date", start_str).lte("date", end_str).execute()
+            if not res.data: return None
+            df = pd.DataFrame(res.data)
         df['date'] = pd.to_datetime(df['date'], utc=True)
         df_pivot = df.pivot(index='date', columns='ticker', values='close').sort_index().ffill()
         for t in ["ZS=F", "USDBRL=X", "CL=F"]:
@@ -178,6 +328,9 @@ class InstitutionalBacktestEngine:
         return df_pivot
 
     def _load_historical_climate_map(self, contracts, start, end):
+        if self.lake is not None:
+            # Só as células dos contratos, sem baixar os blobs JSON do cache inteiro
+            return self.lake.read_climate_map(contracts)
         climate_map = {}
         try:
             res = self.db.client.table("climate_historical_cache").select("*").execute()
@@ -191,29 +344,57 @@ class InstitutionalBacktestEngine:
             logger.error(f"Erro mapa clima: {e}")
             return {}
 
-    def _bulk_save(self, data):
-        if not data: return
-        try:
-            self.db.client.table("backtest_results").insert(data).execute()
-        except Exception:
-            pass
-
-    def _get_historical_alerts(self, sim_date):
+    def _load_alert_timeline(self, start_date, end_date) -> AlertTimeline:
         """
-        Busca alertas que aconteceram nos 30 dias anteriores à data da simulação.
-        Simula o 'News Flow' da época.
+        Busca (uma única vez) os alertas do período simulado mais a janela de relevância.
+        Simula o 'News Flow' da época; o recorte de 30 dias por data é feito em memória.
         """
-        # Janela de relevância: Notícia importa por 30 dias
-        start_window = (sim_date - timedelta(days=30)).strftime('%Y-%m-%d')
-        end_window = sim_date.strftime('%Y-%m-%d')
-        
+        start_window = (start_date - timedelta(days=self.ALERT_WINDOW_DAYS)).strftime('%Y-%m-%d')
+        end_window = end_date.strftime('%Y-%m-%d')
+
+        if self.lake is not None:
+            alerts = self.lake.read_alerts(start_window, end_window)
+        else:
+            alerts = self._fetch_alerts(start_window, end_window)
+
+        timeline = AlertTimeline(alerts)
+        logger.info(f"📰 {len(timeline)} alertas históricos indexados.")
+        return timeline
+
+    def _fetch_alerts(self, start_window, end_window) -> list:
+        alerts = []
         try:
-            res = self.db.client.table("geopolitical_alerts")\
-                .select("*")\
-                .gte("created_at", start_window)\
-                .lte("created_at", end_window)\
-                .in_("risk_level", ["CRÍTICO", "ALERTA"])\
-                .execute()
-            return res.data if res.data else []
-        except Exception:
-            return []
\ No newline at end of file
+            offset = 0
+            while True:
+                res = self.db.client.table("geopolitical_alerts")\
+                    .select("*")\
+                    .gte("created_at", start_window)\
+                    .lte("created_at", end_window)\
+                    .in_("risk_level", ["CRÍTICO", "ALERTA"])\
+                    .order("created_at")\
+                    .range(offset, offset + 999)\
+                    .execute()
+                if not res.data: break
+                alerts.extend(res.data)
+                if len(res.data) < 1000: break
+                offset += 1000
+        except Exception as e:
+            logger.warning(f"⚠️ Alertas históricos indisponíveis: {e}")
+        return alerts
+
+# --- Workers do pool de snapshots ---
+# O job (mercado indexado, janelas de clima e carteira) chega uma vez por worker pelo initializer;
+# com fork ele é herdado do processo pai sem cópia (copy-on-write).
+_SNAPSHOT_WORKER = {}
+
+
+def _init_snapshot_worker(job):
+    from core.engine import RiskEngine
+    _SNAPSHOT_WORKER["job"] = job
+    _SNAPSHOT_WORKER["backtester"] = InstitutionalBacktestEngine(RiskEngine(), None)
+
+
+def _run_snapshot_task(task):
+    i, current_date, historical_alerts, keep_scored = task
+    scored, results = _SNAPSHOT_WORKER["backtester"]._score_snapshot(_SNAPSHOT_WORKER["job"], current_date, historical_alerts)
+    return i, scored if keep_scored else None, results
@@ -0,0 +1,104 @@
+# core/backtest_metrics.py
+from bisect import insort
+import numpy as np
+import pandas as pd
+
+
+class StreamingBacktestMetrics:
+    """
+    Agregados do walk-forward mantidos durante a execução (sem reler o `backtest_results`).
+
+    A cada snapshot acumula a perda esperada da carteira na data, a quebra por estado e por
+    cluster (bincount sobre códigos pré-computados) e insere o total da data numa lista
+    ordenada, de onde saem os percentis correntes (mesma interpolação linear do np.percentile).
+    Os valores são por snapshot: o horizonte é o da `frequency` do walk-forward (D, W ou MS).
+    """
+
+    def __init__(self, portfolio: pd.DataFrame, var_level: float = 95.0, frequency: str = "MS"):
+        self.var_level = var_level
+        self.frequency = frequency
+        self._position = {cid: i for i, cid in enumerate(portfolio['id'].tolist())}
+        self.state_codes, self.states = pd.factorize(self._column(portfolio, 'state_code', 'DEFAULT').astype(str))
+        self.cluster_codes, self.clusters = pd.factorize(self._cluster_labels(portfolio))
+
+        self.dates = []
+        self.date_el = []
+        self._sorted_el = []
+        self.state_el = np.zeros(len(self.states))
+        self.cluster_el = np.zeros(len(self.clusters))
+
+    @staticmethod
+    def _column(frame, column, default):
+        if column in frame.columns:
+            return frame[column].fillna(default)
+        return pd.Series(default, index=frame.index)
+
+    @classmethod
+    def _cluster_labels(cls, portfolio: pd.DataFrame) -> pd.Series:
+        """Cluster = `group` do contrato; sem ele, UF + célula de 0.5° (hubs produtores vizinhos)."""
+        states = cls._column(portfolio, 'state_code', 'DEFAULT').astype(str)
+        lat = pd.to_numeric(cls._column(portfolio, 'latitude', 0.0), errors='coerce').fillna(0.0)
+        lon = pd.to_numeric(cls._column(portfolio, 'longitude', 0.0), errors='coerce').fillna(0.0)
+        grid = states + ":" + (np.round(lat * 2) / 2).map('{:.1f}'.format) + "," + (np.round(lon * 2) / 2).map('{:.1f}'.format)
+        if 'group' in portfolio.columns:
+            return portfolio['group'].where(portfolio['group'].notna(), grid).astype(str)
+        return grid
+
+    def update(self, sim_date: str, rows: list):
+        """Registra as linhas gravadas de um snapshot (mesmo conteúdo do `backtest_results`)."""
+        if not rows:
+            return
+        positions = np.fromiter((self._position[r['contract_id']] for r in rows), dtype=int, count=len(rows))
+        losses = np.fromiter((r['expected_loss'] for r in rows), dtype=float, count=len(rows))
+        self._add(sim_date, positions, losses)
+
+    def replay(self, spool: pd.DataFrame):
+        """Reconstrói os agregados das datas já confirmadas (retomada) a partir do spool local."""
+        if spool is None or spool.empty:
+            return
+        for sim_date, group in spool.groupby('sim_date', sort=True):
+            positions = group['contract_id'].map(self._position).to_numpy(dtype=int)
+            self._add(str(sim_date), positions, group['expected_loss'].to_numpy(dtype=float))
+
+    def _add(self, sim_date, positions, losses):
+        total = float(losses.sum())
+        self.dates.append(sim_date)
+        self.date_el.append(total)
+        insort(self._sorted_el, total)
+        self.state_el += np.bincount(self.state_codes[positions], weights=losses, minlength=len(self.states))
+        self.cluster_el += np.bincount(self.cluster_codes[positions], weights=losses, minlength=len(self.clusters))
+
+    def percentile(self, q: float) -> float:
+        """Percentil corrente da perda esperada por data (interpolação linear, como np.percentile)."""
+        values = self._sorted_el
+        if not values:
+            return 0.0
+        rank = (len(values) - 1) * q / 100.0
+        lo = int(np.floor(rank))
+        hi = min(lo + 1, len(values) - 1)
+        return values[lo] + (values[hi] - values[lo]) * (rank - lo)
+
+    @property
+    def n_dates(self) -> int:
+        return len(self.dates)
+
+    def summary(self) -> dict:
+        """Campos do `backtest_simulations` (mesmas definições do cálculo via SQL)."""
+        total = float(sum(self.date_el))
+        return {
+            "total_expected_loss": total,
+            "avg_log_loss": total / self.n_dates if self.n_dates else 0.0,
+            "max_var_95": float(self.percentile(self.var_level)),
+        }
+
+    def breakdown(self) -> dict:
+        """Quebra por data, estado e cluster para o relatório (com a frequência dos snapshots)."""
+        return {
+            "frequency": self.frequency,
+            "el_by_date": dict(zip(self.dates, self.date_el)),
+            "el_by_state": {state: float(v) for state, v in zip(self.states, self.state_el)},
+            "el_by_cluster": {cluster: float(v) for cluster, v in zip(self.clusters, self.cluster_el)},
+            "avg_el_by_state": {
+                state: float(v) / self.n_dates if self.n_dates else 0.0 for state, v in zip(self.states, self.state_el)
+            },
+        }
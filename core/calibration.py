@@ -0,0 +1,192 @@
+# core/calibration.py
+import itertools
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, fields
+import numpy as np
+import pandas as pd
+from core.backtest_engine import InstitutionalBacktestEngine
+from core.feature_store import BacktestFeatureStore
+from core.logger import get_logger
+
+logger = get_logger("CalibrationSweep")
+
+
+@dataclass(frozen=True)
+class ModelParameters:
+    """
+    Parâmetros calibráveis do `calculate_pd_metrics` (defaults = modelo em produção).
+
+    Pesos dos pilares do risco produtivo, limiares do Veto Climático e a sigmoid do PD.
+    """
+    weight_climate: float = 0.45
+    weight_logistics: float = 0.25
+    weight_market: float = 0.20
+    weight_fx: float = 0.10
+    veto_catastrophe: float = 80.0
+    veto_alert: float = 50.0
+    sigmoid_midpoint: float = 65.0
+    sigmoid_steepness: float = 0.15
+
+    @classmethod
+    def names(cls) -> list:
+        return [f.name for f in fields(cls)]
+
+    @classmethod
+    def grid(cls, space: dict) -> list:
+        """Produto cartesiano dos valores de `space` (campos ausentes ficam no default)."""
+        keys = list(space)
+        return [cls(**dict(zip(keys, combo))) for combo in itertools.product(*(space[k] for k in keys))]
+
+    @classmethod
+    def sample(cls, space: dict, n: int, seed: int = 42) -> list:
+        """
+        Amostra aleatória: `{min, max}` sorteado uniformemente ou lista de valores
+        sorteada com reposição. Reprodutível pela semente.
+        """
+        rng = np.random.default_rng(seed)
+        columns = {}
+        for key, values in space.items():
+            if isinstance(values, dict):
+                columns[key] = rng.uniform(values['min'], values['max'], n)
+            else:
+                columns[key] = rng.choice(list(values), n)
+        return [cls(**{k: float(v[i]) for k, v in columns.items()}) for i in range(n)]
+
+
+class CalibrationInputs:
+    """
+    Tudo o que não depende dos parâmetros, calculado uma vez por data do walk-forward:
+    Risk_Score de cada contrato, pilares de mercado, penalidade geopolítica e risco comportamental.
+    """
+
+    def __init__(self, dates, climate_score, pillars, geo_penalty, behavioral_score, loan_amounts):
+        self.dates = list(dates)
+        self.climate_score = climate_score # D x N
+        self.pillars = pillars # D x 3 (Logística, Mercado, Câmbio)
+        self.geo_penalty = geo_penalty # D x N
+        self.behavioral_score = behavioral_score # N
+        self.loan_amounts = loan_amounts # N
+
+
+class CalibrationSweep:
+    """
+    Sweep de parâmetros sobre o mesmo walk-forward: mercado, clima e alertas são carregados
+    uma única vez; cada data vira arrays e todos os conjuntos de parâmetros são avaliados
+    juntos em broadcast (conjuntos x contratos), em blocos limitados por memória.
+    Com os parâmetros default, a perda por data é a mesma do `run_walk_forward`.
+    """
+
+    LGD = 0.45 # Mesma LGD regulatória fixa do backtest
+
+    def __init__(self, backtester: InstitutionalBacktestEngine, max_chunk_mb: int = 256, workers: int = 1):
+        self.backtester = backtester
+        self.engine = backtester.engine
+        self.max_chunk_mb = max_chunk_mb
+        self.workers = max(1, workers or os.cpu_count() or 1)
+
+    def load(self, start_date, end_date, contracts, frequency="MS") -> CalibrationInputs:
+        """Busca mercado, clima e alertas do período (uma vez) e monta os insumos por data."""
+        if frequency not in self.backtester.FREQUENCIES:
+            raise ValueError(f"Frequência inválida: {frequency} (use {', '.join(self.backtester.FREQUENCIES)})")
+        backtester = self.backtester
+        full_market = backtester._load_historical_market(start_date - pd.Timedelta(days=45), end_date)
+        if full_market is None or full_market.empty:
+            raise ValueError("❌ Falha crítica: Dados de mercado insuficientes.")
+        climate_windows = backtester._prepare_climate_windows(
+            backtester._load_historical_climate_map(contracts, start_date, end_date)
+        )
+        alert_timeline = backtester._load_alert_timeline(start_date, end_date)
+        dates = pd.date_range(start_date, end_date, freq=backtester.FREQUENCIES[frequency][0], tz='UTC')
+        return self.build(BacktestFeatureStore(full_market), climate_windows, alert_timeline, contracts, dates)
+
+    def build(self, feature_store, climate_windows, alert_timeline, contracts, dates) -> CalibrationInputs:
+        portfolio = pd.DataFrame(contracts)
+        portfolio['name'] = portfolio['client_name']
+        positions = climate_windows.positions(contracts)
+        base = self.engine.contract_arrays(portfolio)
+
+        climate_rows, pillar_rows, geo_rows = [], [], []
+        for current_date in dates:
+            snapshot = feature_store.snapshot_at(current_date)
+            raw_scores, _ = self.engine.calculate_full_analysis(snapshot, None, None, current_date.month)
+            if snapshot.is_complete:
+                climate = self.backtester._build_climate_snapshot(contracts, climate_windows, current_date, positions)
+                climate_rows.append(self.engine._lookup_climate_scores(base['names'], climate))
+            else:
+                climate_rows.append(np.zeros(len(portfolio)))
+            pillar_rows.append([raw_scores.get('Logística', 0), raw_scores.get('Mercado', 0), raw_scores.get('Câmbio', 0)])
+            alerts = alert_timeline.counts(current_date, self.backtester.ALERT_WINDOW_DAYS)
+            geo_rows.append(self.engine.contract_arrays(portfolio, alerts)['geo_penalty'])
+
+        logger.info(f"📦 Insumos da calibração: {len(dates)} datas x {len(portfolio)} contratos")
+        return CalibrationInputs(
+            [d.date().isoformat() for d in dates],
+            np.array(climate_rows).reshape(len(dates), len(portfolio)),
+            np.array(pillar_rows, dtype=float).reshape(len(dates), 3),
+            np.array(geo_rows).reshape(len(dates), len(portfolio)),
+            base['behavioral_score'],
+            portfolio['loan_amount'].astype(float).to_numpy()
+        )
+
+    def evaluate(self, inputs: CalibrationInputs, parameter_sets) -> pd.DataFrame:
+        """Uma linha por conjunto de parâmetros com as métricas do sumário do backtest."""
+        parameter_sets = list(parameter_sets)
+        n_sets, n_contracts = len(parameter_sets), len(inputs.loan_amounts)
+        if n_sets == 0:
+            return pd.DataFrame(columns=ModelParameters.names())
+        params = {name: np.array([getattr(p, name) for p in parameter_sets], dtype=float)[:, None] for name in ModelParameters.names()}
+
+        # ~8 matrizes temporárias (conjuntos x contratos) em float64 por bloco
+        chunk = max(1, int(self.max_chunk_mb * 1024 ** 2 // (8 * 8 * max(n_contracts, 1))))
+        bounds = [(start, min(start + chunk, n_sets)) for start in range(0, n_sets, chunk)]
+        logger.info(f"🎛️ Avaliando {n_sets} conjuntos de parâmetros em {len(bounds)} blocos ({len(inputs.dates)} datas)")
+
+        def run(bound):
+            return self._evaluate_chunk(inputs, {k: v[bound[0]:bound[1]] for k, v in params.items()})
+
+        if self.workers > 1 and len(bounds) > 1:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool: # NumPy libera o GIL nas operações
+                parts = list(pool.map(run, bounds))
+        else:
+            parts = [run(bound) for bound in bounds]
+
+        el_by_date = np.vstack([p[0] for p in parts])
+        pd_sum = np.concatenate([p[1] for p in parts])
+        high_pd = np.concatenate([p[2] for p in parts])
+        n_obs = max(len(inputs.dates) * n_contracts, 1)
+
+        results = pd.DataFrame([asdict(p) for p in parameter_sets])
+        results['total_expected_loss'] = el_by_date.sum(axis=1)
+        results['avg_log_loss'] = el_by_date.mean(axis=1) if inputs.dates else 0.0
+        results['max_var_95'] = np.percentile(el_by_date, 95, axis=1) if inputs.dates else 0.0
+        results['avg_pd'] = pd_sum / n_obs
+        results['pct_pd_above_50'] = high_pd / n_obs
+        return results
+
+    def _evaluate_chunk(self, inputs, p):
+        engine = self.engine
+        n_sets = len(p['weight_climate'])
+        el_by_date = np.zeros((n_sets, len(inputs.dates)))
+        pd_sum = np.zeros(n_sets)
+        high_pd = np.zeros(n_sets)
+        for d in range(len(inputs.dates)):
+            climate = inputs.climate_score[d][None, :]
+            logistics, market, fx = inputs.pillars[d]
+            # Mesma ordem de operações do `score_portfolio` (paridade bit a bit com os defaults)
+            productive_score = (
+                (climate * p['weight_climate']) +
+                (logistics * p['weight_logistics']) +
+                (market * p['weight_market']) +
+                (fx * p['weight_fx'])
+            )
+            productive_score_with_geo = productive_score + inputs.geo_penalty[d][None, :]
+            combined = engine._combine_scores(
+                climate, productive_score_with_geo, inputs.behavioral_score[None, :],
+                p['veto_catastrophe'], p['veto_alert']
+            )
+            pd_score = np.round(np.minimum(engine._sigmoid_array(combined, p['sigmoid_midpoint'], p['sigmoid_steepness']), 99.9), 2)
+            el_by_date[:, d] = ((pd_score / 100.0) * self.LGD * inputs.loan_amounts[None, :]).sum(axis=1)
+            pd_sum += pd_score.sum(axis=1)
+            high_pd += (pd_score > 50).sum(axis=1)
+        return el_by_date, pd_sum, high_pd
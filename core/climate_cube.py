@@ -0,0 +1,104 @@
+# core/climate_cube.py
+import numpy as np
+import pandas as pd
+from core.climate_index import ClimateIndex
+
+
+class ClimateWindowCube:
+    """
+    Janelas móveis de clima pré-computadas para o backtest (datas x coordenadas).
+
+    O histórico diário de cada coordenada é alinhado num eixo de datas comum e acumulado
+    (cumsum) uma única vez. A janela de N dias de qualquer data vira a diferença entre duas
+    linhas do acumulado, e o snapshot de toda a carteira é um gather por coordenada.
+    Mesma regra do filtro original: dias em (data - N, data], soma da chuva (0 sem dados)
+    e média da máxima (25 sem dados).
+    """
+
+    def __init__(self, climate_map: dict, window_days: int = 7):
+        self.window_days = window_days
+        self.coords = list(climate_map.keys())
+        self._coord_index = {coords: i for i, coords in enumerate(self.coords)}
+
+        frames = []
+        for i, weather_df in enumerate(climate_map.values()):
+            if weather_df is None or weather_df.empty:
+                continue
+            frames.append(pd.DataFrame({
+                "k": i,
+                "date": pd.to_datetime(weather_df['date']).to_numpy(),
+                "precipitation": weather_df['precipitation'].to_numpy(dtype=float),
+                "temp_max": weather_df['temp_max'].to_numpy(dtype=float),
+            }))
+
+        if not frames:
+            self.dates = pd.DatetimeIndex([])
+            zeros = np.zeros((1, len(self.coords)))
+            self._rain_cum = self._temp_cum = self._temp_count_cum = self._rows_cum = zeros
+            return
+
+        daily = pd.concat(frames, ignore_index=True)
+        daily['has_temp'] = daily['temp_max'].notna()
+        daily['row'] = 1
+        # Linhas repetidas na mesma data entram todas na janela, como no filtro original
+        grouped = daily.groupby(['date', 'k']).agg(
+            precipitation=('precipitation', 'sum'),
+            temp_sum=('temp_max', 'sum'),
+            temp_count=('has_temp', 'sum'),
+            rows=('row', 'sum'),
+        )
+        self.dates = pd.DatetimeIndex(grouped.index.get_level_values('date').unique()).sort_values()
+        shape = (len(self.dates), len(self.coords))
+        date_pos = self.dates.get_indexer(grouped.index.get_level_values('date'))
+        coord_pos = grouped.index.get_level_values('k').to_numpy()
+
+        def cumulative(values):
+            dense = np.zeros(shape)
+            dense[date_pos, coord_pos] = values
+            # Linha 0 = acumulado antes da primeira data
+            return np.vstack([np.zeros((1, shape[1])), np.cumsum(dense, axis=0)])
+
+        self._rain_cum = cumulative(grouped['precipitation'].to_numpy())
+        self._temp_cum = cumulative(grouped['temp_sum'].to_numpy())
+        self._temp_count_cum = cumulative(grouped['temp_count'].to_numpy())
+        self._rows_cum = cumulative(grouped['rows'].to_numpy())
+
+    def positions(self, contracts) -> np.ndarray:
+        """Coluna da coordenada de cada contrato (-1 = sem histórico)."""
+        return np.array([
+            self._coord_index.get((c['latitude'], c['longitude']), -1) for c in contracts
+        ], dtype=int)
+
+    def window_at(self, current_date):
+        """(chuva acumulada, temperatura média, nº de dias com dado) por coordenada na janela."""
+        target = pd.Timestamp(current_date.strftime('%Y-%m-%d'))
+        first = target - pd.Timedelta(days=self.window_days - 1)
+        lo = self.dates.searchsorted(first, side='left')
+        hi = self.dates.searchsorted(target, side='right')
+
+        rows = self._rows_cum[hi] - self._rows_cum[lo]
+        rain = self._rain_cum[hi] - self._rain_cum[lo]
+        temp_count = self._temp_count_cum[hi] - self._temp_count_cum[lo]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            temp = (self._temp_cum[hi] - self._temp_cum[lo]) / temp_count
+        temp = np.where(rows > 0, np.where(temp_count > 0, temp, np.nan), 25.0)
+        return np.where(rows > 0, rain, 0.0), temp, rows
+
+    def snapshot(self, contracts, current_date, climate_intel, positions=None) -> ClimateIndex:
+        """Clima de todos os contratos na data: um gather + `analyze_risk` vetorizado."""
+        positions = self.positions(contracts) if positions is None else positions
+        rain, temp, _ = self.window_at(current_date)
+        status, score = climate_intel.analyze_risk_array(rain, temp, 'production', 'S', current_date.month)
+
+        has_history = positions >= 0
+        idx = positions[has_history]
+        names = [c['client_name'] for c, keep in zip(contracts, has_history) if keep]
+        frame = pd.DataFrame({
+            'Location': names,
+            'Risk_Status': status[idx],
+            'Risk_Score': score[idx],
+            'Rain_7d': rain[idx],
+            'Temp_Max': temp[idx],
+        })
+        aliases = {c.get('id'): c['client_name'] for c in contracts}
+        return ClimateIndex(frame, aliases)
@@ -0,0 +1,85 @@
+# core/climate_index.py
+import numpy as np
+import pandas as pd
+
+
+class ClimateIndex:
+    """
+    Resultado do scan climático indexado por Location (busca O(1) via hash).
+    Substitui os filtros `df_climate[df_climate['Location'] == loc_name]`, que varriam o frame
+    inteiro a cada contrato. Aceita também o id do contrato como chave (alias para a Location).
+    Em Locations duplicadas vale a primeira linha, como no filtro original com `.iloc[0]`.
+    """
+
+    KEY_COLUMN = 'Location'
+
+    def __init__(self, frame: pd.DataFrame = None, aliases: dict = None):
+        self.frame = frame if frame is not None else pd.DataFrame()
+        if not self.frame.empty and self.KEY_COLUMN in self.frame.columns:
+            keys = self.frame[self.KEY_COLUMN]
+            self._first = np.flatnonzero(~keys.duplicated(keep='first').to_numpy())
+            self._locations = pd.Index(keys.to_numpy()[self._first])
+        else:
+            self._first = np.array([], dtype=int)
+            self._locations = pd.Index([])
+        self._rows = None # Dicionário Location -> linha, montado só no primeiro `get`
+        self._aliases = {}
+        for contract_id, location in (aliases or {}).items():
+            self.add_alias(contract_id, location)
+
+    @classmethod
+    def coerce(cls, climate):
+        """Aceita ClimateIndex, DataFrame, lista de registros ou None."""
+        if isinstance(climate, cls):
+            return climate
+        if climate is None:
+            return cls()
+        if isinstance(climate, pd.DataFrame):
+            return cls(climate)
+        return cls(pd.DataFrame(list(climate)))
+
+    @property
+    def empty(self) -> bool:
+        return len(self._locations) == 0
+
+    def __len__(self):
+        return len(self._locations)
+
+    def __contains__(self, key):
+        return self._resolve(key) in self._locations
+
+    def add_alias(self, contract_id, location):
+        """Registra o id do contrato como chave alternativa para a Location."""
+        if contract_id is not None and contract_id not in self._locations:
+            self._aliases[contract_id] = location
+
+    def _resolve(self, key):
+        return self._aliases.get(key, key)
+
+    def get(self, key, default=None):
+        """Linha climática (dict) da Location ou do id do contrato."""
+        if self._rows is None:
+            records = self.frame.iloc[self._first].to_dict('records')
+            self._rows = dict(zip(self._locations, records))
+        return self._rows.get(self._resolve(key), default)
+
+    def score(self, key, default: float = 10.0) -> float:
+        row = self.get(key)
+        if row is None:
+            return default
+        return float(row['Risk_Score'])
+
+    def scores(self, keys, default: float = 10.0) -> np.ndarray:
+        """Risk_Score de vários contratos de uma vez (get_indexer sobre a tabela hash do índice)."""
+        keys = [self._resolve(k) for k in keys] if self._aliases else list(keys)
+        result = np.full(len(keys), default, dtype=float)
+        if self.empty:
+            return result
+        positions = self._locations.get_indexer(keys)
+        found = positions >= 0
+        values = self.frame['Risk_Score'].to_numpy(dtype=float)[self._first]
+        result[found] = values[positions[found]]
+        return result
+
+    def to_frame(self) -> pd.DataFrame:
+        return self.frame
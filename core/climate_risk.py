@@ -2,11 +2,17 @@
 import httpx
 import asyncio
 import pandas as pd
+import numpy as np
 import logging
-import random
 import os
+import random
+import threading
+import time
 from dotenv import load_dotenv
 from datetime import datetime
+from core.climate_index import ClimateIndex
+from core.forecast_cache import ForecastCache
+from core.rate_limiter import AdaptiveRateLimiter, LatencyStats
 
 # Carrega variáveis de ambiente do .env
 load_dotenv()
@@ -15,8 +21,51 @@ logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class ClimateIntelligence:
-    def __init__(self):
+    # Resolução da grade do modelo de previsão (best_match do Open-Meteo ~0.1°):
+    # pontos na mesma célula recebem a mesma previsão, então basta uma requisição por célula.
+    GRID_RESOLUTION = 0.1
+    # Máximo de coordenadas por requisição multi-local do Open-Meteo
+    BATCH_SIZE = 100
+    DAILY_VARIABLES = ["precipitation_sum", "temperature_2m_max"]
+    # Limites de tráfego por provedor (token bucket + AIMD) e prazo total do scan
+    FETCH_DEFAULTS = {
+        "request_timeout_seconds": 10.0,
+        "scan_deadline_seconds": 90.0,
+        "max_retries": 3,
+        # Backoff exponencial com jitter entre tentativas (limitado pelo prazo do scan)
+        "retry_backoff_seconds": 0.25,
+        "retry_backoff_max_seconds": 8.0,
+        "providers": {
+            "open_meteo": {"rate_per_second": 10.0, "burst": 10, "initial_concurrency": 2,
+                           "max_concurrency": 16, "latency_target_seconds": 2.0},
+            "weatherapi": {"rate_per_second": 1.0, "burst": 2, "initial_concurrency": 1,
+                           "max_concurrency": 4, "latency_target_seconds": 2.0},
+        },
+        # Hedging: se o Open-Meteo passar do seu p95 observado, dispara um secundário em paralelo
+        # (WeatherAPI por local até `max_locations`; acima disso, o lote em `split_parts` partes no Open-Meteo)
+        "hedging": {"enabled": True, "max_locations": 10, "split_parts": 2, "default_delay_seconds": 2.0,
+                    "min_samples": 20, "window": 500},
+    }
+
+    def __init__(self, grid_resolution=None, batch_size=None, cache=None, fetch_config=None):
         self.base_url = "https://api.open-meteo.com/v1/forecast"
+        self.grid_resolution = grid_resolution or self.GRID_RESOLUTION
+        self.batch_size = max(1, int(batch_size or self.BATCH_SIZE))
+        self.cache = cache # ForecastCache (SQLite) compartilhado entre execuções do watch
+        self._refresh_thread = None
+        fetch_config = fetch_config or {}
+        self.fetch_config = {**self.FETCH_DEFAULTS, **fetch_config}
+        self.fetch_config["providers"] = {
+            name: {**params, **(fetch_config.get("providers", {}) or {}).get(name, {})}
+            for name, params in self.FETCH_DEFAULTS["providers"].items()
+        }
+        self.fetch_config["hedging"] = {**self.FETCH_DEFAULTS["hedging"], **(fetch_config.get("hedging") or {})}
+        # Latências por provedor (em memória, acumuladas entre scans do mesmo processo)
+        hedging = self.fetch_config["hedging"]
+        self.latency = {
+            name: LatencyStats(window=hedging["window"], min_samples=hedging["min_samples"])
+            for name in self.fetch_config["providers"]
+        }
         self.weatherapi_key = os.getenv("WEATHERAPI_KEY") # Chave da API Secundária
         
         # Lista de Regiões
@@ -37,6 +86,12 @@ class ClimateIntelligence:
             {'name': 'China_Dalian', 'lat': 38.91, 'lon': 121.60, 'type': 'demand', 'hemisphere': 'N'}
         ]
 
+    @classmethod
+    def from_config(cls, config: dict):
+        """Scan com o cache de previsões e os limites de tráfego do settings.yaml."""
+        config = config or {}
+        return cls(cache=ForecastCache.from_config(config), fetch_config=config.get('climate_fetch'))
+
     def _get_synthetic_fallback(self, region, month):
         """
         PLANO B (FINAL): Se todas as APIs falharem, gera dados baseados na média histórica.
@@ -44,8 +99,8 @@ class ClimateIntelligence:
         """
         logger.warning(f"⚠️ Usando Fallback Sintético para {region['name']}")
         
-        is_summer = (region['hemisphere'] == 'S' and month in [12, 1, 2]) or \
-                    (region['hemisphere'] == 'N' and month in [6, 7, 8])
+        is_summer = (region.get('hemisphere', 'S') == 'S' and month in [12, 1, 2]) or \
+                    (region.get('hemisphere', 'S') == 'N' and month in [6, 7, 8])
         
         # Simula dados normais para não gerar pânico falso
         return {
@@ -54,78 +109,267 @@ class ClimateIntelligence:
             'is_estimated': True # Flag para avisar no relatório
         }
 
-    async def _fetch_single_forecast(self, client, region, semaphore):
+    @staticmethod
+    def _parse_open_meteo(data):
+        """Agrega o bloco `daily` de um local do Open-Meteo (None se ausente ou com buracos)."""
+        daily = (data or {}).get('daily') or {}
+        rain = daily.get('precipitation_sum') or []
+        temp = daily.get('temperature_2m_max') or []
+        if not rain or not temp or any(v is None for v in rain + temp):
+            return None
+        return {'rain_7d': sum(rain), 'temp_max': sum(temp) / len(temp), 'is_estimated': False}
+
+    def _new_limiters(self):
+        """Um limitador por provedor, compartilhado por todas as requisições de um scan."""
+        return {name: AdaptiveRateLimiter.from_config(params) for name, params in self.fetch_config["providers"].items()}
+
+    @staticmethod
+    def _retry_after(response):
+        try:
+            return float(response.headers.get("Retry-After"))
+        except (TypeError, ValueError):
+            return None
+
+    async def _request(self, client, limiters, provider, url, params, sent=None):
         """
-        Busca dados com Semáforo (limite de conexões) e Retry.
+        GET passando pelo limitador do provedor e alimentando o AIMD:
+        resposta rápida aumenta a concorrência; 429, 5xx e timeout/erro de transporte reduzem.
+        A latência das respostas 200 entra nas estatísticas do provedor (hedging).
+        `sent` (asyncio.Event) é sinalizado quando o GET sai, já fora da fila do limitador.
+        """
+        limiter = limiters[provider]
+        async with limiter:
+            if sent is not None:
+                sent.set()
+            started = time.monotonic()
+            try:
+                response = await client.get(url, params=params)
+            except httpx.TransportError:
+                limiter.on_throttle()
+                raise
+            latency = time.monotonic() - started
+            if response.status_code == 429 or response.status_code >= 500:
+                limiter.on_throttle(self._retry_after(response))
+            elif response.status_code == 200:
+                limiter.on_success(latency)
+                self.latency[provider].record(latency)
+            return response
+
+    def _retry_delay(self, attempt, deadline=None):
+        """
+        Espera antes da próxima tentativa: backoff exponencial com jitter (metade fixa, metade aleatória).
+        Retorna None se a espera passar do prazo do scan (não vale tentar de novo).
+        """
+        base = min(self.fetch_config["retry_backoff_max_seconds"], self.fetch_config["retry_backoff_seconds"] * 2 ** attempt)
+        delay = base / 2 + random.uniform(0, base / 2)
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return None
+        return delay
+
+    def _hedge_delay(self):
+        """Espera antes de acionar o secundário: p95 observado do Open-Meteo (ou o default sem amostras)."""
+        p95 = self.latency["open_meteo"].percentile(95)
+        return p95 if p95 is not None else self.fetch_config["hedging"]["default_delay_seconds"]
+
+    def _hedge_mode(self, n_locations):
+        """
+        Secundário de um lote lento: "weatherapi" (local a local, até `hedging.max_locations`)
+        ou "split" (o mesmo lote re-pedido ao Open-Meteo em `hedging.split_parts` partes).
+        None = sem hedging. O tamanho do lote não depende do hedging.
+        """
+        hedging = self.fetch_config["hedging"]
+        if not hedging["enabled"]:
+            return None
+        if n_locations <= hedging["max_locations"]:
+            # A WeatherAPI (1 req/s) não recebe rajadas de lotes grandes
+            return "weatherapi" if self.weatherapi_key else None
+        return "split" if int(hedging["split_parts"]) > 1 else None
+
+    async def _fetch_single_forecast(self, client, region, limiters):
+        """
+        Busca dados de um local (mesmo caminho do lote, com hedging entre provedores).
         Prioridade: Open-Meteo -> WeatherAPI -> Sintético.
         """
-        async with semaphore: # <--- AQUI ESTÁ A MÁGICA DO CONTROLE DE TRÁFEGO
-            max_retries = 3
+        return (await self._fetch_batch(client, [region], limiters))[0]
+
+    async def _fetch_weatherapi(self, client, region, limiters):
+        """Previsão de um local na WeatherAPI (None se falhar)."""
+        try:
+            wapi_url = "http://api.weatherapi.com/v1/forecast.json"
+            wapi_params = {
+                "key": self.weatherapi_key,
+                "q": f"{region['lat']},{region['lon']}",
+                "days": 7,
+                "aqi": "no",
+                "alerts": "no"
+            }
+            
+            # Usa o mesmo client http async
+            response = await self._request(client, limiters, "weatherapi", wapi_url, wapi_params)
             
-            # --- TENTATIVA 1: OPEN-METEO ---
-            for attempt in range(max_retries):
-                try:
-                    # Adiciona um jitter (atraso aleatório) para não bater na API ao mesmo tempo
-                    await asyncio.sleep(random.uniform(0.1, 0.5))
-                    
-                    params = {
-                        "latitude": region['lat'],
-                        "longitude": region['lon'],
-                        "daily": ["precipitation_sum", "temperature_2m_max"],
-                        "timezone": "auto"
-                    }
-                    
-                    response = await client.get(self.base_url, params=params)
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        if 'daily' in data:
-                            rain_7d = sum(data['daily']['precipitation_sum'])
-                            temp_max = sum(data['daily']['temperature_2m_max']) / len(data['daily']['temperature_2m_max'])
-                            return {'rain_7d': rain_7d, 'temp_max': temp_max, 'is_estimated': False}
-                    
-                    # Se não for 200, tenta de novo
-                    logger.warning(f"API Open-Meteo {region['name']} status {response.status_code}. Tentativa {attempt+1}")
-
-                except Exception as e:
-                    # Se for erro de conexão (Device busy), espera mais tempo
-                    wait = (attempt + 1) * 2
-                    logger.warning(f"Erro Conexão Open-Meteo ({region['name']}): {e}. Esperando {wait}s...")
-                    await asyncio.sleep(wait)
-
-            # --- TENTATIVA 2: WEATHERAPI (FALLBACK) ---
-            if self.weatherapi_key:
-                try:
-                    logger.info(f"🔄 Tentando WeatherAPI para {region['name']}...")
-                    wapi_url = "http://api.weatherapi.com/v1/forecast.json"
-                    wapi_params = {
-                        "key": self.weatherapi_key,
-                        "q": f"{region['lat']},{region['lon']}",
-                        "days": 7,
-                        "aqi": "no",
-                        "alerts": "no"
-                    }
-                    
-                    # Usa o mesmo client http async
-                    response = await client.get(wapi_url, params=wapi_params)
-                    
-                    if response.status_code == 200:
-                        data = response.json()
-                        forecast_days = data.get('forecast', {}).get('forecastday', [])
-                        
-                        if forecast_days:
-                            rain_7d = sum(day['day']['totalprecip_mm'] for day in forecast_days)
-                            temp_max = sum(day['day']['maxtemp_c'] for day in forecast_days) / len(forecast_days)
-                            return {'rain_7d': rain_7d, 'temp_max': temp_max, 'is_estimated': False}
-                    else:
-                        logger.error(f"WeatherAPI falhou com status {response.status_code}")
-
-                except Exception as e:
-                    logger.error(f"Erro WeatherAPI ({region['name']}): {e}")
-
-            # --- TENTATIVA 3: SINTÉTICO (FINAL) ---
-            # Se falhar todas as tentativas (Open-Meteo e WeatherAPI), retorna o Fallback Sintético
-            return self._get_synthetic_fallback(region, datetime.now().month)
+            if response.status_code == 200:
+                data = response.json()
+                forecast_days = data.get('forecast', {}).get('forecastday', [])
+                
+                if forecast_days:
+                    rain_7d = sum(day['day']['totalprecip_mm'] for day in forecast_days)
+                    temp_max = sum(day['day']['maxtemp_c'] for day in forecast_days) / len(forecast_days)
+                    return {'rain_7d': rain_7d, 'temp_max': temp_max, 'is_estimated': False}
+            else:
+                logger.error(f"WeatherAPI falhou com status {response.status_code}")
+
+        except Exception as e:
+            logger.error(f"Erro WeatherAPI ({region['name']}): {e}")
+        return None
+
+    async def _fetch_fallback(self, client, region, limiters):
+        """Fallback de um único local: WeatherAPI -> Sintético."""
+        # --- TENTATIVA 2: WEATHERAPI (FALLBACK) ---
+        if self.weatherapi_key:
+            logger.info(f"🔄 Tentando WeatherAPI para {region['name']}...")
+            data = await self._fetch_weatherapi(client, region, limiters)
+            if data is not None:
+                return data
+
+        # --- TENTATIVA 3: SINTÉTICO (FINAL) ---
+        # Se falhar todas as tentativas (Open-Meteo e WeatherAPI), retorna o Fallback Sintético
+        return self._get_synthetic_fallback(region, datetime.now().month)
+
+    async def _fetch_open_meteo_batch(self, client, regions, limiters, deadline=None, sent=None):
+        """
+        Uma única requisição multi-coordenada (latitude/longitude separadas por vírgula).
+        Retorna um resultado por região, na ordem de entrada (None = sem dados para o local).
+        Falhas são repetidas com backoff exponencial enquanto couberem no prazo do scan.
+        """
+        params = {
+            "latitude": ",".join(f"{r['lat']}" for r in regions),
+            "longitude": ",".join(f"{r['lon']}" for r in regions),
+            "daily": self.DAILY_VARIABLES,
+            "timezone": "auto"
+        }
+        max_retries = self.fetch_config["max_retries"]
+        for attempt in range(max_retries):
+            try:
+                response = await self._request(client, limiters, "open_meteo", self.base_url, params, sent)
+
+                if response.status_code == 200:
+                    data = response.json()
+                    # Com um único local a API devolve o objeto em vez da lista
+                    items = data if isinstance(data, list) else [data]
+                    if len(items) == len(regions):
+                        return [self._parse_open_meteo(item) for item in items]
+
+                logger.warning(f"API Open-Meteo lote de {len(regions)} locais status {response.status_code}. Tentativa {attempt+1}")
+
+            except Exception as e:
+                logger.warning(f"Erro Conexão Open-Meteo (lote de {len(regions)} locais): {e}. Tentativa {attempt+1}")
+
+            if attempt + 1 < max_retries:
+                delay = self._retry_delay(attempt, deadline)
+                if delay is None:
+                    break
+                await asyncio.sleep(delay)
+
+        return [None] * len(regions)
+
+    async def _race(self, client, regions, limiters, primary, results, mode="weatherapi", deadline=None):
+        """
+        Corrida primário x secundários: fica, por local, com a primeira resposta válida.
+        `weatherapi` dispara a WeatherAPI para cada local; `split` re-pede o lote ao Open-Meteo
+        em partes menores. Cancela o que sobrar quando todos tiverem valor.
+        """
+        if mode == "split":
+            size = -(-len(regions) // int(self.fetch_config["hedging"]["split_parts"]))
+            parts = [list(range(start, min(start + size, len(regions)))) for start in range(0, len(regions), size)]
+            sources = {
+                asyncio.ensure_future(self._fetch_open_meteo_batch(client, [regions[i] for i in part], limiters, deadline)): part
+                for part in parts
+            }
+        else:
+            sources = {
+                asyncio.ensure_future(self._fetch_weatherapi(client, region, limiters)): [i]
+                for i, region in enumerate(regions)
+            }
+        sources[primary] = list(range(len(regions)))
+        pending = set(sources)
+        try:
+            while pending and any(data is None for data in results):
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    values = task.result()
+                    for i, data in zip(sources[task], values if isinstance(values, list) else [values]):
+                        if results[i] is None:
+                            results[i] = data
+        finally:
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _fetch_batch(self, client, regions, limiters, results=None, deadline=None):
+        """
+        Previsão de um lote de locais: Open-Meteo multi-coordenada, com hedging (ver `_hedge_mode`)
+        se a resposta passar do p95 observado (vale a primeira resposta válida por local).
+        Itens ainda vazios recebem o fallback individual (WeatherAPI -> Sintético).
+        `results` é preenchida à medida que os itens chegam (o prazo do scan aproveita o parcial).
+        """
+        results = results if results is not None else [None] * len(regions)
+        sent = asyncio.Event()
+        primary = asyncio.ensure_future(self._fetch_open_meteo_batch(client, regions, limiters, deadline, sent))
+        mode = self._hedge_mode(len(regions))
+        hedged = False
+        try:
+            if mode is not None:
+                # O relógio do hedge começa quando o GET sai, como a latência medida em `_request`
+                # (a fila do limitador não conta)
+                sending = asyncio.ensure_future(sent.wait())
+                await asyncio.wait({primary, sending}, return_when=asyncio.FIRST_COMPLETED)
+                sending.cancel()
+                delay = self._hedge_delay()
+                done, _ = await asyncio.wait({primary}, timeout=delay)
+                if not done:
+                    hedged = True
+                    secondary = "WeatherAPI" if mode == "weatherapi" else "Open-Meteo em partes"
+                    logger.info(f"🏁 Open-Meteo acima do p95 ({delay:.2f}s): acionando {secondary} em paralelo para {len(regions)} locais")
+                    await self._race(client, regions, limiters, primary, results, mode, deadline)
+            if not hedged:
+                for i, data in enumerate(await primary):
+                    results[i] = data
+        finally:
+            if not primary.done():
+                primary.cancel()
+
+        missing = [i for i, data in enumerate(results) if data is None]
+        if missing:
+            logger.warning(f"⚠️ {len(missing)}/{len(regions)} locais sem dados no lote Open-Meteo. Usando fallback individual.")
+            if hedged and mode == "weatherapi": # A WeatherAPI já correu para esses locais
+                month = datetime.now().month
+                for i in missing:
+                    results[i] = self._get_synthetic_fallback(regions[i], month)
+            else:
+                async def fallback(i):
+                    results[i] = await self._fetch_fallback(client, regions[i], limiters)
+
+                await asyncio.gather(*(fallback(i) for i in missing))
+        return results
+
+    def _grid_cell(self, lat, lon):
+        """Centro da célula da grade que contém o ponto (chave de deduplicação e coordenada da requisição)."""
+        step = self.grid_resolution
+        return (round(round(float(lat) / step) * step, 4), round(round(float(lon) / step) * step, 4))
+
+    def _group_by_cell(self, regions):
+        """
+        Agrupa as regiões por célula da grade.
+        Retorna {célula: região representativa (lat/lon = centro da célula)} e a célula de cada região.
+        """
+        cells, region_cells = {}, []
+        for region in regions:
+            cell = self._grid_cell(region['lat'], region['lon'])
+            region_cells.append(cell)
+            if cell not in cells:
+                cells[cell] = {**region, 'lat': cell[0], 'lon': cell[1]}
+        return cells, region_cells
 
     def _is_off_season(self, region_type, hemisphere, month):
         if region_type != 'production': return False
@@ -159,44 +403,180 @@ class ClimateIntelligence:
 
         return "NORMAL", 0
 
-    async def run_full_scan_async(self, locations=None):
+    def analyze_risk_array(self, rain_7d, temp_max, region_type, hemisphere, current_month, is_estimated=False):
+        """
+        Versão vetorizada de `analyze_risk` para vários pontos do mesmo tipo/hemisfério.
+        Retorna (status, score) como arrays NumPy, com as mesmas regras e prioridades.
+        """
+        rain = np.asarray(rain_7d, dtype=float)
+        temp = np.asarray(temp_max, dtype=float)
+
+        if self._is_off_season(region_type, hemisphere, current_month):
+            status_suffix = " (EST)" if is_estimated else ""
+            return np.full(rain.shape, f"ENTRESSAFRA{status_suffix}", dtype=object), np.zeros(rain.shape, dtype=int)
+
+        conditions, labels, scores = [], [], []
+        if region_type == 'production':
+            conditions += [(rain < 5) & (temp > 35), (rain < 5) & (temp > 32), rain < 5, rain < 15]
+            labels += ["SECA EXTREMA", "CALOR + SECA", "SECA LEVE", "ATENÇÃO"]
+            scores += [100, 70, 40, 20]
+        conditions.append(rain > 180)
+        labels.append("EXCESSO CHUVA")
+        scores.append(100)
+        if region_type == 'chokepoint':
+            conditions.append(rain < 5)
+            labels.append("BAIXO NÍVEL")
+            scores.append(10)
+
+        status = np.select(conditions, np.array(labels, dtype=object), default="NORMAL")
+        score = np.select(conditions, scores, default=0)
+        return status.astype(object), score
+
+    async def _fetch_cells(self, client, cells, deadline=None, on_batch=None):
+        """
+        Previsão de cada célula, em lotes multi-coordenada de até `batch_size` locais.
+        Ao fim do prazo (`deadline`, relógio monotônico) as células pendentes recebem o fallback sintético.
+        `on_batch({célula: previsão})` é chamado a cada lote concluído (gravação incremental do cache).
+        """
+        keys, regions = list(cells), list(cells.values())
+        batch_size = self.batch_size
+        batches = [regions[i:i + batch_size] for i in range(0, len(regions), batch_size)]
+        logger.info(f"📡 {len(regions)} células em {len(batches)} requisições multi-coordenada")
+        limiters = self._new_limiters()
+        partials = [[None] * len(batch) for batch in batches]
+
+        async def fetch(start, batch, partial):
+            await self._fetch_batch(client, batch, limiters, partial, deadline)
+            if on_batch is not None:
+                on_batch(dict(zip(keys[start:start + len(batch)], partial)))
+
+        tasks = [
+            asyncio.ensure_future(fetch(i * batch_size, batch, partial))
+            for i, (batch, partial) in enumerate(zip(batches, partials))
+        ]
+        if tasks:
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0.0)
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+                missing = sum(data is None for partial in partials for data in partial)
+                logger.warning(f"⏰ Prazo do scan climático esgotado: {missing} células com fallback sintético")
+
+        month = datetime.now().month
+        weather = [
+            data if data is not None else self._get_synthetic_fallback(region, month)
+            for batch, partial in zip(batches, partials) for region, data in zip(batch, partial)
+        ]
+        return dict(zip(cells, weather))
+
+    def _new_client(self):
+        max_connections = max(p.get("max_concurrency", 16) for p in self.fetch_config["providers"].values())
+        limits = httpx.Limits(max_keepalive_connections=max_connections, max_connections=max_connections)
+        return httpx.AsyncClient(limits=limits, timeout=self.fetch_config["request_timeout_seconds"])
+
+    def _deadline(self):
+        seconds = self.fetch_config.get("scan_deadline_seconds")
+        return time.monotonic() + seconds if seconds else None
+
+    def _revalidate_in_background(self, cells):
+        """
+        Stale-while-revalidate: rebaixa as células velhas numa thread própria (loop asyncio
+        independente do scan) e atualiza o cache para as próximas execuções.
+        Cada lote é gravado ao chegar, numa transação própria: se o processo sair antes do fim
+        (thread daemon abandonada), os lotes já gravados ficam e o resto segue velho para o próximo ciclo.
+        """
+        if self._refresh_thread is not None and self._refresh_thread.is_alive():
+            logger.info("🔁 Revalidação do cache climático já em andamento.")
+            return
+
+        stored = []
+
+        def store_batch(batch):
+            stored.append(self.cache.store(batch))
+
+        async def refresh():
+            async with self._new_client() as client:
+                await self._fetch_cells(client, cells, self._deadline(), on_batch=store_batch)
+
+        def run():
+            try:
+                asyncio.run(refresh())
+                logger.info(f"🔁 Cache climático revalidado: {sum(stored)}/{len(cells)} células atualizadas")
+            except Exception as e:
+                logger.error(f"⚠️ Falha na revalidação do cache climático (não bloqueante): {e}")
+
+        self._refresh_thread = threading.Thread(target=run, name="forecast-revalidate", daemon=True)
+        self._refresh_thread.start()
+
+    def wait_for_refresh(self, timeout=None) -> bool:
+        """
+        Aguarda a revalidação em background por até `timeout` segundos (fim do processo, testes).
+        Retorna False se ela ainda estiver em andamento (a thread é abandonada na saída).
+        """
+        if self._refresh_thread is None:
+            return True
+        self._refresh_thread.join(timeout)
+        return not self._refresh_thread.is_alive()
+
+    async def run_full_scan_async(self, locations=None, client=None):
         """
         Perform a full climate risk scan. If `locations` is provided, it overrides `self.regions`.
+        `client` (httpx.AsyncClient) is optional; by default a rate-limited client is created.
         """
         results = []
         current_month = datetime.now().month
         logger.info(f"🌍 Iniciando Scan Climático (Controlado)...")
+        # Prazo total: o que não chegar até aqui entra com fallback sintético
+        deadline = self._deadline()
         
         # Use provided locations or default to self.regions
         regions_to_scan = locations if locations else self.regions
         
-        # --- SEMÁFORO: Permite apenas 2 requisições simultâneas ---
-        semaphore = asyncio.Semaphore(2) 
-        
-        limits = httpx.Limits(max_keepalive_connections=2, max_connections=4)
-        
-        async with httpx.AsyncClient(limits=limits, timeout=30.0) as client:
-            tasks = [self._fetch_single_forecast(client, region, semaphore) for region in regions_to_scan]
-            weather_results = await asyncio.gather(*tasks)
+        # Uma requisição por célula da grade; o resultado é replicado para cada contrato/região
+        cells, region_cells = self._group_by_cell(regions_to_scan)
+        logger.info(f"📍 {len(regions_to_scan)} locais -> {len(cells)} células únicas da grade ({self.grid_resolution}°)")
+
+        # Cache: frescas e velhas são servidas na hora; só as expiradas bloqueiam na rede
+        weather_by_cell, stale = self.cache.lookup(cells) if self.cache is not None else ({}, [])
+        to_fetch = {cell: region for cell, region in cells.items() if cell not in weather_by_cell}
+        if self.cache is not None:
+            logger.info(f"🗄️ Cache de previsões: {len(weather_by_cell) - len(stale)} frescas, {len(stale)} velhas (revalidando), {len(to_fetch)} a baixar")
+
+        if to_fetch:
+            if client is not None:
+                fetched = await self._fetch_cells(client, to_fetch, deadline)
+            else:
+                async with self._new_client() as client:
+                    fetched = await self._fetch_cells(client, to_fetch, deadline)
+            weather_by_cell.update(fetched)
+            if self.cache is not None:
+                self.cache.store(fetched)
+        if stale:
+            self._revalidate_in_background({cell: cells[cell] for cell in stale})
+        weather_results = [weather_by_cell[cell] for cell in region_cells]
+
+        for region, data in zip(regions_to_scan, weather_results):
+            status, score = self.analyze_risk(
+                data, 
+                region.get('type', 'production'), 
+                region.get('hemisphere', 'S'), 
+                current_month
+            )
             
-            for region, data in zip(regions_to_scan, weather_results):
-                status, score = self.analyze_risk(
-                    data, 
-                    region.get('type', 'production'), 
-                    region.get('hemisphere', 'S'), 
-                    current_month
-                )
-                
-                results.append({
-                    'Location': region['name'],
-                    'Group': 'BR' if region.get('hemisphere', 'S') == 'S' else ('US' if region.get('hemisphere', 'S') == 'N' and 'China' not in region['name'] else 'GLOBAL'),
-                    'Risk_Status': status,
-                    'Risk_Score': score,
-                    'Rain_7d': data['rain_7d'],
-                    'Temp_Max': data['temp_max']
-                })
-                
-        return pd.DataFrame(results)
+            results.append({
+                'Location': region['name'],
+                'Group': 'BR' if region.get('hemisphere', 'S') == 'S' else ('US' if region.get('hemisphere', 'S') == 'N' and 'China' not in region['name'] else 'GLOBAL'),
+                'Risk_Status': status,
+                'Risk_Score': score,
+                'Rain_7d': data['rain_7d'],
+                'Temp_Max': data['temp_max']
+            })
+
+        # Índice por Location (e pelo id do contrato, quando informado) para busca O(1)
+        aliases = {r.get('id'): r['name'] for r in regions_to_scan if r.get('id') is not None}
+        return ClimateIndex(pd.DataFrame(results), aliases)
 
     def run_full_scan(self, locations=None):
         """
@@ -1,4 +1,5 @@
 from collections import defaultdict
+import numpy as np
 from core.seasonality import RiskAnalyzer
 
 class RiskContext:
@@ -109,6 +110,19 @@ class RiskContext:
         if collateral_status in ['WARNING', 'CRITICAL_UNCOVERED'] or pd_score > 70:
             self.exposure_at_critical_risk += loan_amount
 
+    def update_portfolio_metrics_batch(self, pd_scores, loan_amounts, collateral_statuses):
+        """
+        Versão em lote de `update_portfolio_metrics` (carteira já ordenada pelo executor).
+        """
+        pd_scores = np.asarray(pd_scores, dtype=float)
+        loan_amounts = np.asarray(loan_amounts, dtype=float)
+        critical = np.isin(np.asarray(collateral_statuses, dtype=object), ['WARNING', 'CRITICAL_UNCOVERED']) | (pd_scores > 70)
+
+        self.contract_count += len(pd_scores)
+        self.total_exposure_brl += float(loan_amounts.sum())
+        self.weighted_pd_sum += float((pd_scores * loan_amounts).sum())
+        self.exposure_at_critical_risk += float(loan_amounts[critical].sum())
+
     def get_portfolio_summary(self):
         avg_pd = self.weighted_pd_sum / self.total_exposure_brl if self.total_exposure_brl > 0 else 0
         return {
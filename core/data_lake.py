@@ -0,0 +1,268 @@
+# core/data_lake.py
+import json
+import os
+import shutil
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from core.logger import get_logger
+
+logger = get_logger("DataLake")
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Sem pyarrow as partições viram colunas .npy (também lidas via mmap)
+    pa = pq = None
+
+
+class LocalDataLake:
+    """
+    Data lake colunar local para backtests offline.
+
+    Layout particionado (Hive):
+        market/ticker=<ticker>/year=<ano>/      -> date, close
+        climate/cell=<lat>_<lon>/year=<ano>/    -> date, precipitation, temp_max
+        alerts/year=<ano>/                      -> created_at, category, risk_level, headline
+
+    Cada partição é um `part.parquet` (pyarrow) ou um `.npy` por coluna; a leitura é sempre
+    memory-mapped. O `manifest.json` guarda as marcas d'água do sync incremental.
+    """
+
+    MARKET_COLUMNS = ["date", "close"]
+    CLIMATE_COLUMNS = ["date", "precipitation", "temp_max"]
+    ALERT_COLUMNS = ["created_at", "category", "risk_level", "headline"]
+
+    def __init__(self, root: str = ".cache/data_lake"):
+        self.root = Path(root)
+        self.manifest_path = self.root / "manifest.json"
+        self.manifest = self._read_manifest()
+
+    @classmethod
+    def from_config(cls, config: dict):
+        """Lake da seção `data_lake` do settings.yaml (None se desabilitado)."""
+        params = (config or {}).get('data_lake', {}) or {}
+        if not params.get('enabled', False):
+            return None
+        return cls(params.get('path', '.cache/data_lake'))
+
+    # --- Manifest ---
+    def _read_manifest(self) -> dict:
+        try:
+            return json.loads(self.manifest_path.read_text())
+        except (OSError, ValueError):
+            return {"market": {}, "climate": {}, "alerts": {}}
+
+    def save_manifest(self):
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.manifest, indent=2, default=str))
+        os.replace(tmp_path, self.manifest_path)
+
+    @property
+    def has_market(self) -> bool:
+        return bool(self.manifest.get("market"))
+
+    # --- Partições ---
+    @staticmethod
+    def _cell_name(lat, lon) -> str:
+        return f"{float(lat):.6f}_{float(lon):.6f}"
+
+    def _write_partition(self, directory: Path, frame: pd.DataFrame):
+        """Grava a partição inteira de forma atômica (diretório temporário + rename)."""
+        tmp_dir = directory.with_name(directory.name + ".tmp")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+        if pq is not None:
+            pq.write_table(pa.Table.from_pandas(frame, preserve_index=False), tmp_dir / "part.parquet")
+        else:
+            for column in frame.columns:
+                series = frame[column]
+                if isinstance(series.dtype, pd.DatetimeTZDtype):
+                    series = series.dt.tz_convert('UTC').dt.tz_localize(None)
+                values = series.to_numpy()
+                if values.dtype == object:
+                    values = values.astype(str)
+                np.save(tmp_dir / f"{column}.npy", values, allow_pickle=False)
+        shutil.rmtree(directory, ignore_errors=True)
+        os.replace(tmp_dir, directory)
+
+    @staticmethod
+    def _read_partition(directory: Path, columns) -> pd.DataFrame:
+        parquet = directory / "part.parquet"
+        if parquet.exists():
+            if pq is None:
+                raise ImportError(
+                    f"Partição {directory} está em Parquet e o pyarrow não está instalado "
+                    "(pip install 'agro-risk-engine[parquet]' ou refaça o lake com sync(full=True))"
+                )
+            return pq.read_table(parquet, columns=columns, memory_map=True).to_pandas()
+        if not (directory / f"{columns[0]}.npy").exists():
+            return pd.DataFrame(columns=columns)
+        return pd.DataFrame({c: np.load(directory / f"{c}.npy", mmap_mode='r') for c in columns})
+
+    def _merge_partitions(self, base: Path, frame: pd.DataFrame, key: str, columns, unique=None):
+        """Upsert por ano: lê só as partições tocadas, substitui as chaves repetidas e regrava."""
+        years = frame[key].dt.year
+        for year, new_rows in frame.groupby(years):
+            directory = base / f"year={year}"
+            existing = self._read_partition(directory, columns)
+            merged = pd.concat([existing, new_rows[columns]], ignore_index=True) if not existing.empty else new_rows[columns].copy()
+            merged[key] = pd.to_datetime(merged[key], utc=True)
+            merged = merged.drop_duplicates(subset=unique or [key], keep='last').sort_values(key, kind='stable')
+            self._write_partition(directory, merged.reset_index(drop=True))
+
+    # --- Escrita (usada pelo sync) ---
+    def upsert_market(self, ticker: str, frame: pd.DataFrame):
+        frame = frame.assign(date=pd.to_datetime(frame['date'], utc=True), close=frame['close'].astype(float))
+        self._merge_partitions(self.root / "market" / f"ticker={ticker}", frame, "date", self.MARKET_COLUMNS)
+        last = frame['date'].max().strftime('%Y-%m-%d')
+        self.manifest["market"][ticker] = max(last, self.manifest["market"].get(ticker, last))
+
+    def upsert_climate(self, lat, lon, frame: pd.DataFrame, versions: dict = None):
+        frame = frame.assign(date=pd.to_datetime(frame['date'], utc=True))
+        for column in ("precipitation", "temp_max"):
+            frame[column] = pd.to_numeric(frame[column], errors='coerce').astype(float)
+        name = self._cell_name(lat, lon)
+        self._merge_partitions(self.root / "climate" / f"cell={name}", frame, "date", self.CLIMATE_COLUMNS)
+        cell = self.manifest["climate"].setdefault(name, {"latitude": lat, "longitude": lon, "versions": {}})
+        # Versões = coordinate_hash -> updated_at das linhas do cache já incorporadas
+        cell["versions"].update(versions or {})
+
+    def upsert_alerts(self, frame: pd.DataFrame):
+        frame = frame.assign(created_at=pd.to_datetime(frame['created_at'], utc=True))
+        for column in ("category", "risk_level", "headline"):
+            frame[column] = frame[column].fillna("").astype(str) if column in frame else ""
+        self._merge_partitions(self.root / "alerts", frame, "created_at", self.ALERT_COLUMNS, self.ALERT_COLUMNS)
+        last = frame['created_at'].max().isoformat()
+        self.manifest["alerts"]["last_created_at"] = max(last, self.manifest["alerts"].get("last_created_at", last))
+
+    # --- Leitura (backtest) ---
+    def _read_range(self, base: Path, columns, key, start, end) -> pd.DataFrame:
+        start, end = pd.Timestamp(start), pd.Timestamp(end)
+        start = start.tz_localize('UTC') if start.tzinfo is None else start
+        end = end.tz_localize('UTC') if end.tzinfo is None else end
+        parts = [
+            self._read_partition(base / f"year={year}", columns)
+            for year in range(start.year, end.year + 1) if (base / f"year={year}").exists()
+        ]
+        if not parts:
+            return pd.DataFrame(columns=columns)
+        frame = pd.concat(parts, ignore_index=True)
+        frame[key] = pd.to_datetime(frame[key], utc=True)
+        return frame[(frame[key] >= start) & (frame[key] <= end)].reset_index(drop=True)
+
+    def read_market(self, start, end, tickers=None) -> pd.DataFrame:
+        """Preços em formato longo (ticker, close, date), como a consulta ao `market_prices`."""
+        frames = []
+        for ticker in tickers or list(self.manifest.get("market", {})):
+            frame = self._read_range(self.root / "market" / f"ticker={ticker}", self.MARKET_COLUMNS, "date",
+                                     pd.Timestamp(start).normalize(), pd.Timestamp(end).normalize())
+            frames.append(frame.assign(ticker=ticker))
+        if not frames:
+            return pd.DataFrame(columns=["ticker", "close", "date"])
+        return pd.concat(frames, ignore_index=True)[["ticker", "close", "date"]]
+
+    def read_climate_map(self, contracts) -> dict:
+        """
+        Histórico diário completo por coordenada dos contratos (mesmo formato do `data_json`
+        do cache: as janelas do backtest podem começar antes da data inicial).
+        """
+        cells = self.manifest.get("climate", {})
+        climate_map = {}
+        for lat, lon in set((c['latitude'], c['longitude']) for c in contracts):
+            name = self._cell_name(lat, lon)
+            if name not in cells:
+                continue
+            base = self.root / "climate" / f"cell={name}"
+            parts = [
+                self._read_partition(path, self.CLIMATE_COLUMNS)
+                for path in sorted(base.glob("year=*")) if not path.name.endswith(".tmp")
+            ]
+            frame = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(columns=self.CLIMATE_COLUMNS)
+            frame['date'] = pd.to_datetime(frame['date'], utc=True).dt.strftime('%Y-%m-%d')
+            climate_map[(lat, lon)] = frame
+        return climate_map
+
+    def read_alerts(self, start, end, risk_levels=("CRÍTICO", "ALERTA")) -> list:
+        frame = self._read_range(self.root / "alerts", self.ALERT_COLUMNS, "created_at", start, end)
+        frame = frame[frame['risk_level'].isin(risk_levels)]
+        frame['created_at'] = frame['created_at'].map(lambda ts: ts.isoformat())
+        return frame.to_dict('records')
+
+    # --- Sync incremental com o Supabase ---
+    def sync(self, client, full: bool = False, page_size: int = 1000) -> dict:
+        """
+        Traz para o lake apenas o que mudou desde o último sync (marcas d'água no manifest):
+        preços a partir da última data de cada ticker (histórico completo para tickers novos), linhas do cache climático com `updated_at`
+        novo (os blobs JSON só dessas linhas) e alertas posteriores ao último `created_at`.
+        """
+        if full:
+            shutil.rmtree(self.root, ignore_errors=True)
+            self.manifest = {"market": {}, "climate": {}, "alerts": {}}
+        stats = {"market_rows": 0, "climate_cells": 0, "alerts": 0}
+
+        # 1. Mercado: marca d'água por ticker (a última data é relida: o fechamento do dia pode ter sido corrigido)
+        watermarks = dict(self.manifest["market"])
+        def market_query(ticker=None):
+            query = client.table("market_prices").select("ticker, close, date")
+            if ticker is not None:
+                return query.eq("ticker", ticker).gte("date", watermarks[ticker])
+            # Tickers fora do manifest (novos na tabela) vêm com o histórico completo
+            return query.not_.in_("ticker", list(watermarks)) if watermarks else query
+        rows = []
+        for ticker in [*watermarks, None]:
+            rows.extend(self._fetch_all(lambda t=ticker: market_query(t), "date", page_size))
+        if rows:
+            prices = pd.DataFrame(rows).dropna(subset=["close"])
+            for ticker, frame in prices.groupby("ticker"):
+                self.upsert_market(ticker, frame)
+            stats["market_rows"] = len(prices)
+
+        # 2. Clima: compara versões sem baixar os blobs
+        versions = self._fetch_all(
+            lambda: client.table("climate_historical_cache").select("coordinate_hash, latitude, longitude, updated_at"),
+            "coordinate_hash", page_size
+        )
+        known = {h: v for cell in self.manifest["climate"].values() for h, v in cell["versions"].items()}
+        changed = [v for v in versions if known.get(v["coordinate_hash"]) != str(v.get("updated_at"))]
+        for start in range(0, len(changed), 50):
+            batch = {v["coordinate_hash"]: v for v in changed[start:start + 50]}
+            res = client.table("climate_historical_cache")\
+                .select("coordinate_hash, latitude, longitude, data_json")\
+                .in_("coordinate_hash", list(batch))\
+                .execute()
+            for row in res.data or []:
+                frame = pd.DataFrame(row["data_json"])
+                if frame.empty:
+                    continue
+                self.upsert_climate(row["latitude"], row["longitude"], frame,
+                                    {row["coordinate_hash"]: str(batch[row["coordinate_hash"]].get("updated_at"))})
+                stats["climate_cells"] += 1
+
+        # 3. Alertas geopolíticos (news flow do backtest)
+        last_alert = self.manifest["alerts"].get("last_created_at")
+        def alerts_query():
+            query = client.table("geopolitical_alerts").select("created_at, category, risk_level, headline")
+            return query.gt("created_at", last_alert) if last_alert else query
+        alerts = self._fetch_all(alerts_query, "created_at", page_size)
+        if alerts:
+            self.upsert_alerts(pd.DataFrame(alerts))
+            stats["alerts"] = len(alerts)
+
+        self.save_manifest()
+        logger.info(f"🗄️ Data lake sincronizado: {stats}")
+        return stats
+
+    @staticmethod
+    def _fetch_all(query_factory, order_by: str, page_size: int) -> list:
+        rows, offset = [], 0
+        while True:
+            res = query_factory().order(order_by).range(offset, offset + page_size - 1).execute()
+            if not res.data:
+                break
+            rows.extend(res.data)
+            if len(res.data) < page_size:
+                break
+            offset += page_size
+        return rows
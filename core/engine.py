@@ -1,16 +1,23 @@
 import pandas as pd
 import numpy as np
 import math
-from datetime import datetime
-from core.indicators.technical import TechnicalIndicators as Tech
 from core.indicators.fundamental import FundamentalIndicators as Fund
-from core.indicators.macro import MacroIndicators as Macro
+from core.alert_timeline import AlertCounts
+from core.climate_index import ClimateIndex
+from core.market_snapshot import MarketFeatureSnapshot, get_indicator_matrix, get_market_snapshot
 from core.seasonality import SeasonalityManager
 import logging
 
 logger = logging.getLogger(__name__)
 
 class RiskEngine:
+    # Colunas devolvidas por `score_portfolio`
+    PORTFOLIO_COLUMNS = [
+        "pd_score", "raw_combined_score", "climate_score", "productive_score", "behavioral_score",
+        "geopolitical_penalty", "ltv", "collateral_value_brl", "collateral_status", "yield_loss_factor",
+        "pheno_weight_applied", "lgd", "basis_status"
+    ]
+
     def __init__(self):
         from core.seasonality import SeasonalityManager
         self.seasonality = SeasonalityManager()
@@ -21,90 +28,43 @@ class RiskEngine:
             return 0.0 if np.isnan(data) or np.isinf(data) else round(data, 4)
         return data
 
-    def _is_data_stale(self, df: pd.DataFrame) -> bool:
-        if df.empty: return True
-        if len(df) >= 3:
-            if df['ZS=F'].tail(3).std() == 0 or df['USDBRL=X'].tail(3).std() == 0:
-                return True
-        last_update = pd.to_datetime(df.index[-1])
-        return (datetime.now() - last_update.replace(tzinfo=None)).days > 2
-
-    def _calculate_calibrated_market_score(self, soy_series, usd_series):
-        """
-        [CORRIGIDO] Lógica calibrada: Queda de preço não é Risco 80.
-        """
-        # 1. Volatilidade
-        soy_vol = Tech.calculate_volatility(soy_series)
-        vol_score = min((soy_vol * 100) * 3, 100)
-        
-        # 2. Tendência (CORRIGIDO AQUI)
-        trend = Tech.analyze_trend(soy_series)
-        # Reduzimos drasticamente as pontuações. Queda de preço é normal.
-        if trend == "STRONG_DOWN": price_risk = 40 # Antes era 80
-        elif trend == "DOWN": price_risk = 25      # Antes era 60
-        elif trend == "NEUTRAL": price_risk = 10   # Antes era 40
-        else: price_risk = 5 
-        
-        # 3. Câmbio
-        usd_trend = Tech.analyze_trend(usd_series)
-        fx_hedge = -20 if "UP" in usd_trend else 0
-        
-        final_score = (vol_score * 0.3) + (price_risk * 0.7) + fx_hedge
-        return max(0, min(final_score, 100))
+    def market_snapshot(self, market) -> MarketFeatureSnapshot:
+        """Features de mercado do df_market (calculadas uma vez por frame e cacheadas)."""
+        return get_market_snapshot(market)
 
     def calculate_full_analysis(self, df_market, loc_name, df_climate=None, month=None):
+        # Features de mercado: iguais para todos os contratos (cache por fingerprint do frame)
+        snapshot = self.market_snapshot(df_market)
+
         # Verificação de integridade de colunas
-        if 'ZS=F' not in df_market.columns or 'USDBRL=X' not in df_market.columns:
+        if not snapshot.is_complete:
             logger.warning("⚠️ Dados de mercado incompletos. Retornando análise neutra.")
             return self._get_empty_analysis()  # Retorna scores neutros em vez de quebrar
 
-        stale = self._is_data_stale(df_market)
-        soy = df_market['ZS=F']
-        usd = df_market['USDBRL=X']
-        
-        trend = Tech.analyze_trend(soy) 
-        geo = Macro.calculate_geopolitical_risk(df_market.get('GC=F', soy), df_market.get('CL=F', soy))
-        stress = Macro.calculate_currency_stress(usd)
-        
-        raw_basis = Fund.calculate_basis_proxy(
-            Tech.calculate_volatility(soy), 
-            usd.pct_change().iloc[-1], 
-            "NEUTRO", 
-            stale,
-            trend 
-        )
-
-        seasonality_factor = 0.8 if month in [3, 4] else 0.2
-        score_logistica = min(100, raw_basis * (1 + (seasonality_factor ** 2)))
-
-        china = Fund.calculate_china_demand(soy, df_market.get('HE=F'))
+        score_logistica = snapshot.logistics_score(month)
         
         climate_score = 10 
         climate_lvl = "NORMAL"
         
-        if df_climate is not None and not df_climate.empty:
-            loc_climate = df_climate[df_climate['Location'] == loc_name]
-            if not loc_climate.empty:
-                climate_score = float(loc_climate.iloc[0]['Risk_Score'])
-                climate_lvl = loc_climate.iloc[0]['Risk_Status']
-
-        # Usa a nova função calibrada
-        market_score = self._calculate_calibrated_market_score(soy, usd)
-        
-        washout = Fund.calculate_washout_probability(climate_lvl, trend, soy.pct_change(30).iloc[-1])
+        loc_climate = ClimateIndex.coerce(df_climate).get(loc_name)
+        if loc_climate is not None:
+            climate_score = float(loc_climate['Risk_Score'])
+            climate_lvl = loc_climate['Risk_Status']
+
+        washout = Fund.calculate_washout_probability(climate_lvl, snapshot.soy_trend, snapshot.soy_change_30d)
         
         results = {
-            "Mercado": market_score,
-            "Câmbio": min(100, (Tech.calculate_rsi(usd)*0.5) + (stress['score']*0.5)),
+            "Mercado": snapshot.market_score,
+            "Câmbio": snapshot.fx_score,
             "Logística": score_logistica,
             "Clima": climate_score 
         }
         
         metrics = {
             "washout_risk": washout,
-            "china_demand": china,
-            "geopolitics": geo,
-            "is_stale": stale,
+            "china_demand": dict(snapshot.china_demand),
+            "geopolitics": dict(snapshot.geopolitics),
+            "is_stale": snapshot.is_stale,
             "basis_status": f"Basis {loc_name}: {'Estressado' if score_logistica > 60 else 'Normal'}"
         }
         
@@ -116,10 +76,11 @@ class RiskEngine:
             opportunities = []
             if "OPORTUNIDADE" in str(fai_status).upper():
                 opportunities.append("💰 BARTER: Relação de troca favorável.")
-            soy_rsi = Tech.calculate_rsi(df_market['ZS=F'])
+            snapshot = get_market_snapshot(df_market)
+            soy_rsi = snapshot.soy_rsi
             if soy_rsi < 30:
                 opportunities.append(f"📈 TÉCNICO: Soja em sobrevenda (RSI {soy_rsi:.0f}).")
-            usd_rsi = Tech.calculate_rsi(df_market['USDBRL=X'])
+            usd_rsi = snapshot.usd_rsi
             if usd_rsi < 30:
                 opportunities.append("🚢 LOGÍSTICA: Dólar em baixa.")
             return opportunities
@@ -129,12 +90,8 @@ class RiskEngine:
         Calculate the market risk score for a given ticker.
         """
         try:
-            if ticker not in df_market.columns:
-                raise ValueError(f"Ticker {ticker} not found in market data.")
-
-            # Calculate volatility
-            vol_30d = df_market[ticker].pct_change().rolling(window=30).std() * np.sqrt(252) * 100
-            current_vol = vol_30d.iloc[-1]
+            # Calculate volatility (matriz de indicadores compartilhada por todos os tickers)
+            current_vol = get_indicator_matrix(df_market).latest_volatility(ticker, window=30) * 100
 
             # Soybean-specific logic (e.g., Crush Margin)
             if ticker in ["ZS=F", "ZM=F", "ZL=F"]:  # Soybean, Soybean Meal, Soybean Oil
@@ -265,6 +222,193 @@ class RiskEngine:
         
         return round(final_pd, 2), metrics
 
+    def score_portfolio(self, contracts_frame: pd.DataFrame, market: pd.DataFrame, climate=None, month=None, alerts=None) -> pd.DataFrame:
+        """
+        Versão vetorizada de `calculate_pd_metrics` para a carteira inteira.
+
+        Os pilares de mercado são calculados uma única vez e os pilares por contrato
+        (produtivo, comportamental, veto climático, sigmoid, LTV e LGD) em passadas NumPy.
+        Os números são os mesmos do caminho escalar.
+
+        Args:
+            contracts_frame: Carteira colunar. Usa 'name' (chave do clima), 'state_code',
+                'credit_score_serasa', 'debt_to_income_ratio', 'loan_amount',
+                'area_hectares' e 'estimated_yield_kg_ha' (colunas ausentes usam os defaults do escalar).
+            market: DataFrame pivotado de preços (df_market) ou seu MarketFeatureSnapshot.
+            climate: ClimateIndex (ou DataFrame) do scan climático, ou array de Risk_Score alinhado aos contratos.
+            month: Mês de referência (sazonalidade e peso fenológico).
+            alerts: Alertas geopolíticos ativos.
+
+        Returns:
+            DataFrame alinhado ao índice de `contracts_frame`.
+        """
+        index = contracts_frame.index
+        if len(contracts_frame) == 0:
+            return pd.DataFrame(columns=self.PORTFOLIO_COLUMNS, index=index)
+
+        contract = self.contract_arrays(contracts_frame, alerts)
+        names = contract['names']
+
+        # 1. Pilares de mercado: idênticos para todos os contratos
+        snapshot = self.market_snapshot(market)
+        market_complete = snapshot.is_complete
+        raw_scores, _ = self.calculate_full_analysis(snapshot, None, None, month)
+
+        # 2. Pilar climático por contrato (mesma regra de fallback do escalar)
+        if market_complete:
+            climate_score = self._lookup_climate_scores(names, climate)
+        else:
+            climate_score = np.zeros(len(contracts_frame))
+
+        # 3. Penalidade geopolítica (calculada por estado em `contract_arrays`)
+        geo_penalty = contract['geo_penalty']
+
+        productive_score = (
+            (climate_score * 0.45) +
+            (raw_scores.get('Logística', 0) * 0.25) +
+            (raw_scores.get('Mercado', 0) * 0.20) +
+            (raw_scores.get('Câmbio', 0) * 0.10)
+        )
+        productive_score_with_geo = productive_score + geo_penalty
+
+        # 4. Risco Comportamental
+        behavioral_score = contract['behavioral_score']
+
+        # 5. Veto Climático + Sigmoid
+        combined_score = self._combine_scores(climate_score, productive_score_with_geo, behavioral_score)
+        final_pd = np.minimum(self._sigmoid_array(combined_score, midpoint=65.0, steepness=0.15), 99.9)
+
+        # 6. LTV Estressado e LGD (mesmo preço default do caminho escalar)
+        credit = self._calculate_ltv_exposure_array(
+            contract['loan_amount'],
+            contract['area_hectares'],
+            contract['estimated_yield_kg_ha'],
+            climate_score,
+            self.pheno_weights(contract['ltv_states'], month),
+            120.0
+        )
+
+        basis_label = 'Estressado' if raw_scores.get('Logística', 0) > 60 else 'Normal'
+        scored = pd.DataFrame({
+            "pd_score": np.round(final_pd, 2),
+            "raw_combined_score": np.round(combined_score, 2),
+            "climate_score": climate_score,
+            "productive_score": productive_score,
+            "behavioral_score": behavioral_score,
+            "geopolitical_penalty": geo_penalty,
+            **credit,
+            "basis_status": ("Basis " + names.astype(str) + f": {basis_label}").to_numpy() if market_complete else "N/A"
+        }, index=index)
+        return scored[self.PORTFOLIO_COLUMNS]
+
+    def contract_arrays(self, contracts_frame: pd.DataFrame, alerts=None) -> dict:
+        """
+        Colunas por contrato que não dependem do mercado nem do clima (arrays NumPy):
+        penalidade geopolítica, risco comportamental e dados de garantia.
+        Compartilhado por `score_portfolio` e pelo stress test.
+        """
+        # Alertas contados uma vez por (categoria, nível); cada estratégia só aplica seus pesos
+        alerts = alerts if isinstance(alerts, AlertCounts) else AlertCounts.from_alerts(alerts)
+        names = self._frame_column(contracts_frame, 'name', None)
+        states = self._frame_column(contracts_frame, 'state_code', 'DEFAULT').astype(str)
+
+        # Penalidade geopolítica: uma estratégia por estado, não por contrato
+        from core.factory import RegionalEngineFactory
+        geo_by_state = {
+            state: RegionalEngineFactory.get_strategy({'state_code': state}).calculate_geopolitical_risk(alerts)
+            for state in states.unique()
+        }
+
+        serasa = self._numeric_column(contracts_frame, 'credit_score_serasa', 700)
+        dti = self._numeric_column(contracts_frame, 'debt_to_income_ratio', 0.3)
+        behavioral_score = (1000 - serasa) / 10
+        behavioral_score = np.where(dti > 0.5, behavioral_score + (dti * 40), behavioral_score)
+
+        return {
+            "names": names,
+            "states": states,
+            "geo_penalty": states.map(geo_by_state).to_numpy(dtype=float),
+            "behavioral_score": behavioral_score,
+            "ltv_states": self._frame_column(contracts_frame, 'state_code', 'MT').astype(str),
+            "loan_amount": self._numeric_column(contracts_frame, 'loan_amount', 0),
+            "area_hectares": self._numeric_column(contracts_frame, 'area_hectares', 0),
+            "estimated_yield_kg_ha": self._numeric_column(contracts_frame, 'estimated_yield_kg_ha', 3600),
+        }
+
+    def pheno_weights(self, states: pd.Series, month) -> np.ndarray:
+        """Peso fenológico de cada contrato (gather na tabela compilada do calendário)."""
+        return self.seasonality.get_state_weights(month, states.to_numpy())
+
+    def portfolio_row_metrics(self, row: dict) -> dict:
+        """
+        Converte uma linha de `score_portfolio` no dicionário de métricas do caminho escalar
+        (formato consumido pelo RiskAdvisor).
+        """
+        metrics = {
+            "ltv": row['ltv'],
+            "collateral_status": row['collateral_status'],
+            "basis_status": row['basis_status'],
+            "geopolitical_penalty": row['geopolitical_penalty'],
+            "raw_combined_score": row['raw_combined_score'],
+        }
+        if row['collateral_status'] != "DATA_MISSING":
+            metrics.update({
+                "collateral_value_brl": row['collateral_value_brl'],
+                "yield_loss_est": f"{row['yield_loss_factor']:.1%}",
+                "pheno_weight_applied": row['pheno_weight_applied'],
+            })
+        return metrics
+
+    @staticmethod
+    def _frame_column(frame: pd.DataFrame, column: str, default) -> pd.Series:
+        if column not in frame.columns:
+            return pd.Series(default, index=frame.index)
+        if default is None:
+            return frame[column]
+        return frame[column].fillna(default)
+
+    @staticmethod
+    def _numeric_column(frame: pd.DataFrame, column: str, default: float) -> np.ndarray:
+        """
+        Coluna numérica como float: valores não numéricos (cadastro malformado) viram o default
+        do caminho escalar em vez de derrubar o scoring da carteira inteira.
+        """
+        if column not in frame.columns:
+            return np.full(len(frame), float(default))
+        raw = frame[column]
+        values = pd.to_numeric(raw, errors='coerce')
+        invalid = values.isna() & raw.notna()
+        if invalid.any():
+            logger.warning(f"⚠️ {int(invalid.sum())} contrato(s) com '{column}' não numérico; usando o default {default}")
+        return values.fillna(default).to_numpy(dtype=float)
+
+    @staticmethod
+    def _lookup_climate_scores(names: pd.Series, df_climate) -> np.ndarray:
+        """
+        Busca o Risk_Score de cada contrato (primeira linha por Location; 10.0 se ausente).
+        Aceita também um array já alinhado aos contratos (usado pelos workers do ScoringExecutor).
+        """
+        if isinstance(df_climate, np.ndarray):
+            scores = df_climate.astype(float)
+        else:
+            scores = ClimateIndex.coerce(df_climate).scores(names.tolist())
+        # Mesma sanitização de `_sanitize_metrics`
+        return np.round(np.where(np.isfinite(scores), scores, 0.0), 4)
+
+    @staticmethod
+    def _combine_scores(climate_score, productive_score_with_geo, behavioral_score, catastrophe_threshold=80, alert_threshold=50):
+        """Regra de Veto Climático vetorizada (ver `calculate_pd_metrics`). Os limiares aceitam arrays (calibração)."""
+        catastrophe = ((np.maximum(productive_score_with_geo, 90) * 0.9) + (behavioral_score * 0.1)) * 1.2
+        moderate = (productive_score_with_geo * 0.7) + (behavioral_score * 0.3)
+        normal = (productive_score_with_geo * 0.4) + (behavioral_score * 0.6)
+        return np.select([climate_score > catastrophe_threshold, climate_score > alert_threshold], [catastrophe, moderate], normal)
+
+    @staticmethod
+    def _sigmoid_array(x, midpoint: float = 50.0, steepness: float = 0.1):
+        """Versão NumPy de `_sigmoid` (overflow do exp leva o PD a 0, como no escalar)."""
+        with np.errstate(over='ignore'):
+            return 100 / (1 + np.exp(-steepness * (x - midpoint)))
+
     def _calculate_dynamic_lgd(self, exposure, collateral_value):
         """
         Calcula a Loss Given Default baseada na cobertura de garantia.
@@ -325,7 +469,42 @@ class RiskEngine:
             "yield_loss_est": f"{yield_reduction_factor:.1%}",
             "pheno_weight_applied": pheno_weight
         }
-    
+
+    def _calculate_ltv_exposure_array(self, loan_amount, area, initial_yield, climate_score, pheno_weight, current_price_brl):
+        """
+        Versão NumPy de `_calculate_ltv_exposure` + `_calculate_dynamic_lgd` para arrays de contratos.
+        """
+        valid = (loan_amount > 0) & (area > 0)
+
+        yield_reduction_factor = (climate_score * 0.005) * pheno_weight
+        stressed_yield = initial_yield * (1 - yield_reduction_factor)
+        total_collateral_value = (stressed_yield * area) * (current_price_brl / 60)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ltv = np.where(total_collateral_value > 0, loan_amount / total_collateral_value, 999)
+
+        status = np.where(ltv > 1.0, "CRITICAL_UNCOVERED", np.where(ltv > 0.85, "WARNING", "HEALTHY"))
+        status = np.where(valid, status, "DATA_MISSING")
+        collateral_value = np.where(valid, np.round(total_collateral_value, 2), np.nan)
+
+        return {
+            "ltv": np.where(valid, np.round(ltv, 4), 0.0),
+            "collateral_value_brl": collateral_value,
+            "collateral_status": status,
+            "yield_loss_factor": np.where(valid, yield_reduction_factor, np.nan),
+            "pheno_weight_applied": np.where(valid, pheno_weight, np.nan),
+            "lgd": self._calculate_dynamic_lgd_array(loan_amount, np.nan_to_num(collateral_value))
+        }
+
+    @staticmethod
+    def _calculate_dynamic_lgd_array(exposure, collateral_value):
+        """Versão NumPy de `_calculate_dynamic_lgd` (mesmo haircut de 25% e piso de 5%)."""
+        recoverable_amount = collateral_value * (1 - 0.25)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            lgd = np.minimum((exposure - recoverable_amount) / exposure, 1.0)
+        lgd = np.where(recoverable_amount >= exposure, 0.05, lgd)
+        return np.where(exposure <= 0, 0.0, lgd)
+
     def _get_empty_analysis(self):
         """Retorna uma análise neutra para evitar falhas."""
         results = {
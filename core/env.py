@@ -34,6 +34,17 @@ def load_config():
 
     return config
 
+# Configuração já parseada (carregada uma única vez por processo)
+_CONFIG_CACHE = {}
+
+def get_config():
+    """
+    Retorna a configuração do projeto, lendo o YAML do disco apenas na primeira chamada.
+    """
+    if "config" not in _CONFIG_CACHE:
+        _CONFIG_CACHE["config"] = load_config()
+    return _CONFIG_CACHE["config"]
+
 # ==============================================================================
 # 2. GERENCIAMENTO DE E-MAIL (Sua Lógica Original Preservada)
 # ==============================================================================
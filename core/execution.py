@@ -0,0 +1,164 @@
+# core/execution.py
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from multiprocessing import shared_memory
+import numpy as np
+import pandas as pd
+from core.logger import get_logger
+
+logger = get_logger("ScoringExecutor")
+
+# Colunas numéricas da carteira enviadas aos workers via memória compartilhada
+NUMERIC_COLUMNS = ("loan_amount", "area_hectares", "estimated_yield_kg_ha", "credit_score_serasa", "debt_to_income_ratio")
+# Colunas de texto (chave do clima e UF): enviadas uma única vez por worker
+OBJECT_COLUMNS = ("name", "state_code")
+
+# Estado de cada processo worker (preenchido pelo initializer)
+_WORKER = {}
+
+
+class SharedArrays:
+    """
+    Blocos de memória compartilhada para arrays NumPy (um SharedMemory por array).
+    O processo pai cria e libera; os workers apenas anexam pelo `spec`.
+    """
+
+    def __init__(self, blocks: dict, arrays: dict):
+        self.blocks = blocks
+        self.arrays = arrays
+
+    @classmethod
+    def create(cls, arrays: dict):
+        blocks, views = {}, {}
+        for key, array in arrays.items():
+            array = np.ascontiguousarray(array)
+            block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            view = np.ndarray(array.shape, dtype=array.dtype, buffer=block.buf)
+            view[...] = array
+            blocks[key], views[key] = block, view
+        return cls(blocks, views)
+
+    @classmethod
+    def attach(cls, spec: dict):
+        blocks, views = {}, {}
+        for key, (name, dtype, shape) in spec.items():
+            block = shared_memory.SharedMemory(name=name)
+            blocks[key] = block
+            views[key] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        return cls(blocks, views)
+
+    @property
+    def spec(self) -> dict:
+        return {key: (self.blocks[key].name, view.dtype.str, view.shape) for key, view in self.arrays.items()}
+
+    def close(self):
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+
+    def unlink(self):
+        for block in self.blocks.values():
+            block.unlink()
+
+
+class ScoringExecutor:
+    """
+    Backend de execução do scoring da carteira: 'serial', 'thread' ou 'process'.
+
+    A carteira é fatiada em blocos de contratos e cada bloco passa por `RiskEngine.score_portfolio`.
+    No modo 'process', o snapshot de mercado (pequeno e imutável) e as colunas de texto vão uma vez
+    por worker no initializer; as colunas numéricas e o Risk_Score já resolvido de cada contrato
+    ficam em memória compartilhada e cada tarefa recebe apenas (início, fim).
+    Os blocos são reunidos na ordem da carteira, independente da ordem de conclusão.
+    """
+
+    BACKENDS = ("serial", "thread", "process")
+
+    def __init__(self, backend: str = "serial", workers: int = None, chunk_size: int = None):
+        if backend not in self.BACKENDS:
+            raise ValueError(f"Backend de scoring inválido: {backend}")
+        self.backend = backend
+        self.workers = workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+
+    @classmethod
+    def from_config(cls, config: dict):
+        """Lê a seção `scoring_backend` do settings.yaml."""
+        params = (config or {}).get("scoring_backend", {}) or {}
+        return cls(params.get("mode", "serial"), params.get("workers"), params.get("chunk_size"))
+
+    def score(self, engine, portfolio: pd.DataFrame, market, climate=None, month=None, alerts=None) -> pd.DataFrame:
+        """Mesmo contrato de `RiskEngine.score_portfolio`, distribuído pelo backend configurado."""
+        snapshot = engine.market_snapshot(market)
+        if self.backend == "serial" or len(portfolio) == 0:
+            return engine.score_portfolio(portfolio, snapshot, climate, month, alerts)
+
+        # Clima resolvido uma vez no pai (hash lookup); os workers recebem só o array alinhado
+        names = engine._frame_column(portfolio, "name", None)
+        climate_scores = engine._lookup_climate_scores(names, climate)
+        ranges = self._ranges(len(portfolio))
+        logger.info(f"⚙️ Scoring '{self.backend}': {len(portfolio)} contratos em {len(ranges)} blocos ({self.workers} workers)")
+
+        if self.backend == "thread":
+            def score_range(bounds):
+                start, stop = bounds
+                return engine.score_portfolio(portfolio.iloc[start:stop], snapshot, climate_scores[start:stop], month, alerts)
+
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                parts = list(pool.map(score_range, ranges))
+        else:
+            parts = self._score_processes(portfolio, snapshot, climate_scores, month, alerts, ranges)
+
+        scored = pd.concat(parts)
+        scored.index = portfolio.index
+        return scored
+
+    def _ranges(self, n_contracts: int) -> list:
+        # Padrão: ~4 blocos por worker para balancear carteiras heterogêneas
+        chunk = self.chunk_size or max(1, -(-n_contracts // (self.workers * 4)))
+        return [(start, min(start + chunk, n_contracts)) for start in range(0, n_contracts, chunk)]
+
+    def _score_processes(self, portfolio, snapshot, climate_scores, month, alerts, ranges):
+        numeric = {
+            column: pd.to_numeric(portfolio[column], errors="coerce").to_numpy(dtype=float)
+            for column in NUMERIC_COLUMNS if column in portfolio.columns
+        }
+        numeric["__climate_score__"] = climate_scores
+        objects = {column: portfolio[column].tolist() for column in OBJECT_COLUMNS if column in portfolio.columns}
+
+        shared = SharedArrays.create(numeric)
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.workers,
+                initializer=_init_worker,
+                initargs=(shared.spec, objects, snapshot, month, alerts or [])
+            ) as pool:
+                # map preserva a ordem de submissão (merge determinístico)
+                return list(pool.map(_score_range, ranges))
+        finally:
+            shared.close()
+            shared.unlink()
+
+
+def _init_worker(spec, objects, snapshot, month, alerts):
+    from core.engine import RiskEngine
+    _WORKER.update({
+        "shared": SharedArrays.attach(spec),
+        "objects": objects,
+        "snapshot": snapshot,
+        "month": month,
+        "alerts": alerts,
+        "engine": RiskEngine(),
+    })
+
+
+def _score_range(bounds):
+    start, stop = bounds
+    arrays = _WORKER["shared"].arrays
+    frame = pd.DataFrame({column: values[start:stop] for column, values in _WORKER["objects"].items()})
+    for column, values in arrays.items():
+        if column != "__climate_score__":
+            frame[column] = values[start:stop].copy()
+    return _WORKER["engine"].score_portfolio(
+        frame, _WORKER["snapshot"], arrays["__climate_score__"][start:stop].copy(), _WORKER["month"], _WORKER["alerts"]
+    )
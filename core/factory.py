@@ -1,17 +1,41 @@
 # core/factory.py
+from core.env import get_config
 from core.strategies.mt_strategy import MatoGrossoStrategy
 from core.strategies.pr_strategy import ParanaStrategy
 
 class RegionalEngineFactory:
-    @staticmethod
-    def get_strategy(loc_data):
+    """
+    Registro de estratégias regionais (Flyweight).
+    Cada estado recebe uma única instância imutável, construída a partir da configuração
+    já parseada e servida do cache nas chamadas seguintes.
+    """
+    _REGISTRY = {
+        'MT': MatoGrossoStrategy,
+        'PR': ParanaStrategy,
+    }
+    # Fallback ou outras regiões futuras
+    _DEFAULT_STRATEGY = ParanaStrategy
+
+    _settings = None
+    _instances = {}
+
+    @classmethod
+    def configure(cls, settings: dict):
+        """Define a configuração compartilhada e descarta as instâncias já criadas."""
+        cls._settings = settings
+        cls._instances = {}
+
+    @classmethod
+    def get_strategy(cls, loc_data):
         state = loc_data.get('state_code', 'DEFAULT')
-        if state == 'MT':
-            return MatoGrossoStrategy()
-        elif state == 'PR':
-            return ParanaStrategy()
-        # Fallback ou outras regiões futuras
-        return ParanaStrategy() 
+        strategy = cls._instances.get(state)
+        if strategy is None:
+            if cls._settings is None:
+                cls._settings = get_config()
+            strategy_cls = cls._REGISTRY.get(state, cls._DEFAULT_STRATEGY)
+            strategy = strategy_cls(cls._settings).freeze()
+            cls._instances[state] = strategy
+        return strategy
 
 # core/pipeline.py (Refatorado)
 class RiskPipeline:
@@ -0,0 +1,165 @@
+# core/feature_store.py
+import numpy as np
+import pandas as pd
+from core.indicators.fundamental import FundamentalIndicators as Fund
+from core.indicators.macro import MacroIndicators as Macro
+from core.market_snapshot import (
+    MarketFeatureSnapshot, build_market_snapshot, fingerprint_market, get_indicator_matrix,
+    _calibrated_market_score, _has_flat_prices, _last_update
+)
+
+
+class LookAheadError(Exception):
+    """Snapshot leria dado de mercado posterior à sua data (vazamento de dado futuro)."""
+    pass
+
+
+class BacktestFeatureStore:
+    """
+    Feature store indexado por data para o walk-forward.
+
+    Cada indicador é calculado uma única vez sobre a janela inteira (aquecimento + teste);
+    o snapshot de uma data lê a linha daquela data em vez de recalcular tudo sobre o
+    prefixo `full_market.loc[:data]` (custo quadrático no tamanho do histórico).
+    Todos os indicadores usados são causais (janelas móveis, EMAs e variações que olham
+    apenas para trás), então o valor na linha t é igual ao calculado sobre o prefixo até t.
+    """
+
+    SOY, USD = 'ZS=F', 'USDBRL=X'
+
+    def __init__(self, full_market: pd.DataFrame):
+        self.market = full_market
+        self.index = pd.DatetimeIndex(full_market.index)
+        if not self.index.is_monotonic_increasing:
+            raise LookAheadError("Índice do mercado fora de ordem: a busca por data leria linhas futuras")
+        self.fingerprint = fingerprint_market(full_market)
+        self.is_complete = self.SOY in full_market.columns and self.USD in full_market.columns
+        if not self.is_complete:
+            return
+
+        soy = full_market[self.SOY]
+        usd = full_market[self.USD]
+        self.matrix = get_indicator_matrix(full_market, self.fingerprint)
+        self.soy_change_30d = soy.pct_change(30).to_numpy()
+        self.soy_brl_price = ((soy / 100) * usd * 2.2046).round(2).to_numpy()
+
+        # Razão de estresse cambial alinhada ao índice do mercado (última razão conhecida até a data)
+        ratio = Macro.currency_stress_ratio_series(usd)
+        self.currency_ratio = ratio.reindex(self.index, method='ffill').to_numpy() if len(ratio) else np.full(len(self.index), np.nan)
+
+        self._gold = full_market.get('GC=F', soy)
+        self._oil = full_market.get('CL=F', soy)
+        self._hogs = full_market.get('HE=F')
+        self._cache = {}
+
+    def positions(self, dates) -> np.ndarray:
+        """
+        Última linha com data <= cada data, em uma única busca binária.
+        Com o índice ordenado (verificado no construtor) nenhuma posição aponta para o futuro;
+        aqui só se rejeita data anterior ao início do mercado.
+        """
+        dates = pd.DatetimeIndex(dates)
+        pos = self.index.searchsorted(dates, side='right') - 1
+        if len(pos) and pos.min() < 0:
+            raise ValueError(f"Sem dados de mercado até {dates[int(np.argmin(pos))]}")
+        return pos
+
+    def position(self, as_of) -> int:
+        """Última linha com data <= as_of (nunca uma linha futura)."""
+        return int(self.positions([pd.Timestamp(as_of)])[0])
+
+    def snapshot_at(self, as_of) -> MarketFeatureSnapshot:
+        """Snapshot point-in-time equivalente a `build_market_snapshot(full_market.loc[:as_of])`."""
+        pos = self.position(as_of)
+        fingerprint = f"{self.fingerprint}@{pos}"
+        if not self.is_complete:
+            return MarketFeatureSnapshot(fingerprint=fingerprint, is_complete=False)
+        if pos in self._cache:
+            return self._cache[pos]
+
+        matrix = self.matrix
+        soy_col, usd_col = matrix.column(self.SOY), matrix.column(self.USD)
+        soy_trend = matrix.TREND_LABELS[int(matrix.trend[pos, soy_col])]
+        usd_trend = matrix.TREND_LABELS[int(matrix.trend[pos, usd_col])]
+        soy_vol = float(matrix.volatility[pos, soy_col])
+        usd_last_return = float(matrix.returns[pos, usd_col])
+
+        # Janelas curtas lidas por fatia (O(janela), não O(histórico))
+        recent = self.market.iloc[max(0, pos - 2):pos + 1]
+        if matrix.has('CL=F'):
+            diesel_change = float(matrix.returns[pos, matrix.column('CL=F')]) if pos > 0 else 0
+        else:
+            diesel_change = np.nan
+
+        snapshot = MarketFeatureSnapshot(
+            fingerprint=fingerprint,
+            is_complete=True,
+            flat_prices=_has_flat_prices(recent),
+            last_update=_last_update(recent),
+            soy_trend=soy_trend,
+            usd_trend=usd_trend,
+            soy_rsi=float(matrix.rsi[pos, soy_col]),
+            usd_rsi=float(matrix.rsi[pos, usd_col]),
+            soy_volatility=soy_vol,
+            usd_last_return=usd_last_return,
+            soy_change_30d=self.soy_change_30d[pos],
+            diesel_change=diesel_change,
+            soy_brl_price=float(self.soy_brl_price[pos]),
+            market_score=_calibrated_market_score(soy_vol, soy_trend, usd_trend),
+            currency_stress=tuple(self._currency_stress(pos).items()),
+            geopolitics=tuple(Macro.calculate_geopolitical_risk(
+                self._gold.iloc[max(0, pos - 19):pos + 1], self._oil.iloc[max(0, pos - 19):pos + 1]
+            ).items()),
+            china_demand=tuple(self._china_demand(pos).items())
+        )
+        self._cache[pos] = snapshot
+        return snapshot
+
+    def assert_point_in_time(self, as_of):
+        """
+        Confere o snapshot indexado contra o recálculo sobre o prefixo `loc[:as_of]`.
+        Qualquer divergência indica vazamento de dado futuro (ou indicador não causal).
+        """
+        indexed = self.snapshot_at(as_of)
+        reference = build_market_snapshot(self.market.loc[:pd.Timestamp(as_of)])
+        for field in MarketFeatureSnapshot.__dataclass_fields__:
+            if field == 'fingerprint':
+                continue
+            if not _same_value(getattr(indexed, field), getattr(reference, field)):
+                raise LookAheadError(f"Look-ahead em '{field}' ({as_of})")
+
+    def assert_point_in_time_sample(self, dates, n_samples: int = 8):
+        """
+        Confere `assert_point_in_time` em até `n_samples` datas espaçadas uniformemente
+        (sempre a primeira e a última): cada conferência recalcula o prefixo inteiro.
+        """
+        dates = pd.DatetimeIndex(dates)
+        if len(dates) == 0:
+            return
+        picks = np.unique(np.linspace(0, len(dates) - 1, num=min(max(2, n_samples), len(dates))).round().astype(int))
+        for i in picks:
+            self.assert_point_in_time(dates[i])
+
+    def _currency_stress(self, pos: int) -> dict:
+        try:
+            return Macro.currency_stress_from_ratio(self.currency_ratio[pos])
+        except Exception:
+            return {"score": 0, "status": "NEUTRO"}
+
+    def _china_demand(self, pos: int) -> dict:
+        # A base usa as 20 primeiras linhas e a margem usa a linha da data
+        rows = list(range(min(20, pos + 1))) + ([pos] if pos >= 20 else [])
+        soy = self.market[self.SOY].iloc[rows]
+        hogs = self._hogs.iloc[rows] if self._hogs is not None else None
+        return Fund.calculate_china_demand(soy, hogs)
+
+
+def _same_value(got, expected) -> bool:
+    """Igualdade tolerante a NaN e a ruído de ponto flutuante (inclusive dentro das tuplas)."""
+    if isinstance(expected, tuple):
+        return isinstance(got, tuple) and len(got) == len(expected) and all(_same_value(g, e) for g, e in zip(got, expected))
+    if isinstance(expected, (float, np.floating)) and not isinstance(expected, bool):
+        if np.isnan(expected):
+            return np.isnan(got)
+        return bool(np.isclose(got, expected, rtol=1e-9, atol=1e-12))
+    return got == expected
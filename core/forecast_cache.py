@@ -0,0 +1,111 @@
+# core/forecast_cache.py
+import json
+import sqlite3
+import time
+from contextlib import closing
+from datetime import datetime, timezone
+from pathlib import Path
+from core.logger import get_logger
+
+logger = get_logger("ForecastCache")
+
+
+class ForecastCache:
+    """
+    Cache persistente (SQLite) das previsões do scan climático, por célula da grade e rodada do modelo.
+
+    Pela idade, cada entrada está:
+        fresca   -> mesma rodada do modelo e mais nova que o TTL: servida sem rede
+        velha    -> mais nova que `max_stale_seconds`: servida, e a célula é revalidada em background
+        expirada -> busca bloqueante no provedor
+    Fallbacks sintéticos (`is_estimated`) nunca entram no cache.
+    """
+
+    def __init__(self, path: str = ".cache/forecast_cache.sqlite", ttl_seconds: float = 3600,
+                 max_stale_seconds: float = 6 * 3600, model_update_seconds: float = 3600, clock=time.time):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max(max_stale_seconds, ttl_seconds)
+        self.model_update_seconds = model_update_seconds
+        self._clock = clock
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL") # Leitura do scan não bloqueia a revalidação
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS forecasts ("
+                " cell TEXT NOT NULL, model_run TEXT NOT NULL, fetched_at REAL NOT NULL, payload TEXT NOT NULL,"
+                " PRIMARY KEY (cell, model_run))"
+            )
+
+    @classmethod
+    def from_config(cls, config: dict):
+        """Cache da seção `forecast_cache` do settings.yaml (None se desabilitado)."""
+        params = (config or {}).get('forecast_cache', {}) or {}
+        if not params.get('enabled', False):
+            return None
+        return cls(
+            params.get('path', '.cache/forecast_cache.sqlite'),
+            ttl_seconds=params.get('ttl_seconds', 3600),
+            max_stale_seconds=params.get('max_stale_seconds', 6 * 3600),
+            model_update_seconds=params.get('model_update_seconds', 3600)
+        )
+
+    def _connect(self):
+        # Uma conexão por operação: o cache é usado também pela thread de revalidação
+        return sqlite3.connect(self.path, timeout=30)
+
+    @staticmethod
+    def _key(cell) -> str:
+        return f"{cell[0]:.4f}_{cell[1]:.4f}"
+
+    def model_run(self, timestamp=None) -> str:
+        """Rodada do modelo vigente (início do ciclo de atualização, em UTC)."""
+        timestamp = self._clock() if timestamp is None else timestamp
+        start = timestamp - timestamp % self.model_update_seconds
+        return datetime.fromtimestamp(start, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M')
+
+    def lookup(self, cells):
+        """
+        Entradas servíveis das células pedidas.
+        Retorna ({célula: previsão} com frescas e velhas, [células velhas a revalidar]).
+        """
+        cells = list(cells)
+        keys = {self._key(cell): cell for cell in cells}
+        latest = {}
+        with closing(self._connect()) as conn:
+            names = list(keys)
+            for start in range(0, len(names), 500):
+                chunk = names[start:start + 500]
+                rows = conn.execute(
+                    f"SELECT cell, model_run, fetched_at, payload FROM forecasts WHERE cell IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                for key, run, fetched_at, payload in rows:
+                    if key not in latest or fetched_at > latest[key][1]:
+                        latest[key] = (run, fetched_at, payload)
+
+        now, current_run = self._clock(), self.model_run()
+        served, stale = {}, []
+        for key, (run, fetched_at, payload) in latest.items():
+            age = now - fetched_at
+            if age >= self.max_stale_seconds:
+                continue
+            served[keys[key]] = json.loads(payload)
+            if run != current_run or age >= self.ttl_seconds:
+                stale.append(keys[key])
+        return served, stale
+
+    def store(self, results: dict):
+        """Grava as previsões reais ({célula: previsão}) e descarta rodadas antigas das mesmas células."""
+        now = self._clock()
+        run = self.model_run(now)
+        rows = [
+            (self._key(cell), run, now, json.dumps(data))
+            for cell, data in results.items() if data is not None and not data.get('is_estimated', False)
+        ]
+        if not rows:
+            return 0
+        with closing(self._connect()) as conn, conn:
+            conn.executemany("INSERT OR REPLACE INTO forecasts VALUES (?, ?, ?, ?)", rows)
+            conn.executemany("DELETE FROM forecasts WHERE cell = ? AND model_run < ?", [(r[0], run) for r in rows])
+        return len(rows)
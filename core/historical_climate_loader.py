@@ -16,6 +16,8 @@ class HistoricalClimateLoader:
     
     # API de Arquivo (Dados passados reais, não previsão)
     ARCHIVE_URL = "https://archive-api.open-meteo.com/v1/archive"
+    # Coordenadas por requisição multi-local (cada local traz a série diária inteira do período)
+    BATCH_SIZE = 50
 
     def __init__(self, db_manager):
         self.db = db_manager
@@ -98,6 +100,109 @@ class HistoricalClimateLoader:
                     logger.error(f"❌ Erro API Clima: {e}")
                     return pd.DataFrame()
 
+    def _read_cache(self, hashes) -> dict:
+        """Linhas do cache para vários hashes de uma vez (consultas `in` em blocos)."""
+        cached = {}
+        for start in range(0, len(hashes), 100):
+            res = self.db.client.table("climate_historical_cache")\
+                .select("coordinate_hash, data_json")\
+                .in_("coordinate_hash", hashes[start:start + 100])\
+                .execute()
+            for row in res.data or []:
+                cached[row['coordinate_hash']] = pd.DataFrame(row['data_json'])
+        return cached
+
+    @staticmethod
+    def _parse_archive(data):
+        """Série diária de um local da resposta do Archive (None se vier sem `daily`)."""
+        if not isinstance(data, dict) or 'daily' not in data:
+            return None
+        return pd.DataFrame({
+            'date': data['daily']['time'],
+            'precipitation': data['daily']['precipitation_sum'],
+            'temp_max': data['daily']['temperature_2m_max']
+        })
+
+    async def _fetch_archive_batch(self, client, coords, s_date, e_date):
+        """Uma requisição para o lote (latitude/longitude separadas por vírgula), na ordem de entrada."""
+        params = {
+            "latitude": ",".join(f"{lat}" for lat, _ in coords),
+            "longitude": ",".join(f"{lon}" for _, lon in coords),
+            "start_date": s_date,
+            "end_date": e_date,
+            "daily": ["precipitation_sum", "temperature_2m_max"],
+            "timezone": "America/Sao_Paulo"
+        }
+        async with self.semaphore:
+            try:
+                resp = await client.get(self.ARCHIVE_URL, params=params)
+                if resp.status_code != 200:
+                    logger.warning(f"⚠️ Falha Open-Meteo ({resp.status_code}) no lote de {len(coords)} locais")
+                    return [None] * len(coords)
+                data = resp.json()
+                # Com um único local a API devolve o objeto em vez da lista
+                items = data if isinstance(data, list) else [data]
+                if len(items) != len(coords):
+                    logger.warning(f"⚠️ Lote Open-Meteo devolveu {len(items)} de {len(coords)} locais")
+                    return [None] * len(coords)
+                return [self._parse_archive(item) for item in items]
+            except Exception as e:
+                logger.error(f"❌ Erro API Clima (lote de {len(coords)} locais): {e}")
+                return [None] * len(coords)
+
+    async def fetch_real_history_batch(self, coords, start_date, end_date, client=None):
+        """
+        Versão em lote do `fetch_real_history`: um `in` no cache para todas as coordenadas,
+        requisições multi-coordenada para as ausentes e um único upsert no cache.
+        Itens que falharem no lote caem na requisição individual. Retorna {(lat, lon): DataFrame}.
+        """
+        s_date = start_date.strftime('%Y-%m-%d') if isinstance(start_date, datetime) else start_date
+        e_date = end_date.strftime('%Y-%m-%d') if isinstance(end_date, datetime) else end_date
+
+        hashes = {coord: self._generate_hash(coord[0], coord[1], s_date, e_date) for coord in coords}
+        cached = self._read_cache(list(hashes.values()))
+        results = {coord: cached[h] for coord, h in hashes.items() if h in cached}
+        missing = [coord for coord in hashes if coord not in results]
+        logger.info(f"📦 Cache Hit Clima: {len(results)}/{len(hashes)} locais")
+        if not missing:
+            return results
+
+        batches = [missing[i:i + self.BATCH_SIZE] for i in range(0, len(missing), self.BATCH_SIZE)]
+        if client is not None:
+            frames = await asyncio.gather(*(self._fetch_archive_batch(client, b, s_date, e_date) for b in batches))
+        else:
+            async with httpx.AsyncClient(timeout=60.0) as client:
+                frames = await asyncio.gather(*(self._fetch_archive_batch(client, b, s_date, e_date) for b in batches))
+
+        rows, failed = [], []
+        for batch, batch_frames in zip(batches, frames):
+            for (lat, lon), df in zip(batch, batch_frames):
+                if df is None:
+                    failed.append((lat, lon))
+                    continue
+                results[(lat, lon)] = df
+                rows.append({
+                    "coordinate_hash": hashes[(lat, lon)],
+                    "latitude": lat,
+                    "longitude": lon,
+                    "data_json": df.to_dict(orient='records')
+                })
+
+        # Persistência (Cache) de todos os locais baixados
+        if rows:
+            try:
+                self.db.client.table("climate_historical_cache").upsert(rows, on_conflict="coordinate_hash").execute()
+            except Exception as e:
+                logger.error(f"❌ Erro ao salvar cache de clima ({len(rows)} locais): {e}")
+            logger.info(f"✅ Clima Real Baixado: {len(rows)} locais em {len(batches)} requisições")
+
+        # Fallback por item: requisição individual (mesmo caminho do ponto único)
+        if failed:
+            logger.warning(f"🔄 {len(failed)} locais sem dados no lote. Tentando individualmente...")
+            frames = await asyncio.gather(*(self.fetch_real_history(lat, lon, s_date, e_date) for lat, lon in failed))
+            results.update(zip(failed, frames))
+        return results
+
     async def batch_load(self, contracts, start_date, end_date):
         """
         Método exigido pelo run_backtest.py.
@@ -115,11 +220,6 @@ class HistoricalClimateLoader:
             
         logger.info(f"📍 Locais únicos identificados: {len(unique_coords)}")
 
-        # 2. Criação das Tarefas Assíncronas
-        tasks = []
-        for lat, lon in unique_coords:
-            tasks.append(self.fetch_real_history(lat, lon, start_date, end_date))
-            
-        # 3. Execução Paralela
-        await asyncio.gather(*tasks)
-        logger.info("✅ Carga de Clima Histórico concluída.")
\ No newline at end of file
+        # 2. Requisições multi-coordenada (em vez de uma por local)
+        await self.fetch_real_history_batch(sorted(unique_coords), start_date, end_date)
+        logger.info("✅ Carga de Clima Histórico concluída.")
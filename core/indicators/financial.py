@@ -1,4 +1,5 @@
 import pandas as pd
+from .technical import TechnicalIndicators
 
 class FinancialIndicators:
     """
@@ -89,11 +90,7 @@ class FinancialIndicators:
         ratio = cost / rev # Quanto maior, pior (custo pesa mais que receita)
         
         # RSI do Ratio (Velocidade da mudança de custo)
-        delta = ratio.diff()
-        gain = (delta.where(delta > 0, 0)).rolling(14).mean()
-        loss = (-delta.where(delta < 0, 0)).rolling(14).mean()
-        rs = gain / loss.replace(0, 0.001)
-        ratio_rsi = 100 - (100 / (1 + rs)).iloc[-1]
+        ratio_rsi = TechnicalIndicators.calculate_rsi(ratio, 14)
         
         return {
             "current_ratio": ratio.iloc[-1],
@@ -9,14 +9,28 @@ class MacroIndicators:
             returns = usd_series.pct_change().dropna()
             current_vol = returns.tail(21).std() * np.sqrt(252)
             hist_vol = returns.rolling(252).std().mean() * np.sqrt(252)
-            ratio = current_vol / hist_vol
-            
-            score = 80 if ratio > 1.5 else (40 if ratio > 1.2 else 0)
-            status = "CRÍTICO" if ratio > 1.5 else ("ALERTA" if ratio > 1.2 else "ESTÁVEL")
-            return {"score": score, "status": status, "ratio": round(ratio, 2)}
+            return MacroIndicators.currency_stress_from_ratio(current_vol / hist_vol)
         except:
             return {"score": 0, "status": "NEUTRO"}
 
+    @staticmethod
+    def currency_stress_from_ratio(ratio) -> dict:
+        """Classificação do estresse cambial a partir da razão Vol Atual / Vol Histórica."""
+        score = 80 if ratio > 1.5 else (40 if ratio > 1.2 else 0)
+        status = "CRÍTICO" if ratio > 1.5 else ("ALERTA" if ratio > 1.2 else "ESTÁVEL")
+        return {"score": score, "status": status, "ratio": round(ratio, 2)}
+
+    @staticmethod
+    def currency_stress_ratio_series(usd_series: pd.Series) -> pd.Series:
+        """
+        Série temporal da razão usada em `calculate_currency_stress` (um valor por retorno).
+        O valor na data t é o que a função retornaria sobre o histórico até t.
+        """
+        returns = usd_series.pct_change().dropna()
+        current_vol = returns.rolling(21, min_periods=1).std() * np.sqrt(252)
+        hist_vol = returns.rolling(252).std().expanding().mean() * np.sqrt(252)
+        return current_vol / hist_vol
+
     @staticmethod
     def calculate_geopolitical_risk(gold_series: pd.Series, oil_series: pd.Series) -> dict:
         """[RECUPERADO v2.8.2] Detector de Cisne Negro (Divergência Ouro/Oil)."""
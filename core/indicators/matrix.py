@@ -0,0 +1,72 @@
+# core/indicators/matrix.py
+import numpy as np
+import pandas as pd
+from .technical import TechnicalIndicators as Tech
+
+
+class IndicatorMatrix:
+    """
+    Motor de indicadores em lote para o df_market pivotado (todos os tickers de uma vez).
+    Cada indicador é uma matriz 2-D NumPy (datas x tickers), calculada em uma única passada
+    coluna a coluna pelo pandas, com os mesmos números de `TechnicalIndicators`.
+    """
+
+    TREND_LABELS = {1: "ALTA", -1: "BAIXA", 0: "LATERAL"}
+
+    def __init__(self, df_market: pd.DataFrame, rsi_window: int = 14, vol_window: int = 21,
+                 short_window: int = 9, long_window: int = 21):
+        prices = df_market.astype(float)
+        self.tickers = list(prices.columns)
+        self.index = prices.index
+        self._columns = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.vol_window = vol_window
+
+        returns = prices.pct_change(fill_method=None)
+        self._returns_frame = returns
+        self.returns = returns.to_numpy()
+        self.rsi = Tech.rsi_series(prices, rsi_window).to_numpy()
+        self._volatility = {vol_window: Tech.volatility_series(prices, vol_window).to_numpy()}
+
+        # Tendência via cruzamento de EMAs: 1 = ALTA, -1 = BAIXA, 0 = LATERAL
+        ema_short = prices.ewm(span=short_window, adjust=False).mean().to_numpy()
+        ema_long = prices.ewm(span=long_window, adjust=False).mean().to_numpy()
+        self.trend = np.where(ema_short > ema_long, 1, np.where(ema_short < ema_long, -1, 0)).astype(np.int8)
+
+    @property
+    def volatility(self) -> np.ndarray:
+        """Volatilidade anualizada na janela padrão (fração, não %)."""
+        return self._volatility[self.vol_window]
+
+    def volatility_window(self, window: int) -> np.ndarray:
+        """Volatilidade anualizada em outra janela (calculada uma vez para todos os tickers)."""
+        if window not in self._volatility:
+            self._volatility[window] = (self._returns_frame.rolling(window).std() * np.sqrt(252)).to_numpy()
+        return self._volatility[window]
+
+    def has(self, ticker: str) -> bool:
+        return ticker in self._columns
+
+    def column(self, ticker: str) -> int:
+        if ticker not in self._columns:
+            raise ValueError(f"Ticker {ticker} not found in market data.")
+        return self._columns[ticker]
+
+    def latest(self, field: str, ticker: str) -> float:
+        """Último valor de um indicador ('rsi', 'volatility', 'returns') para o ticker."""
+        return float(getattr(self, field)[-1, self.column(ticker)])
+
+    def latest_volatility(self, ticker: str, window: int = None) -> float:
+        matrix = self.volatility_window(window) if window else self.volatility
+        return float(matrix[-1, self.column(ticker)])
+
+    def latest_trend(self, ticker: str) -> str:
+        return self.TREND_LABELS[int(self.trend[-1, self.column(ticker)])]
+
+    def latest_frame(self) -> pd.DataFrame:
+        """Visão tabular do último ponto de todos os tickers (para logs e relatórios)."""
+        return pd.DataFrame({
+            "rsi": self.rsi[-1],
+            "volatility": self.volatility[-1],
+            "trend": [self.TREND_LABELS[int(t)] for t in self.trend[-1]],
+            "return": self.returns[-1]
+        }, index=self.tickers)
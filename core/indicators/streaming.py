@@ -0,0 +1,340 @@
+# core/indicators/streaming.py
+import json
+import math
+import os
+from collections import deque
+import numpy as np
+import pandas as pd
+
+
+class IncrementalRSI:
+    """
+    RSI incremental (O(1) por barra).
+    method='sma' reproduz `TechnicalIndicators.calculate_rsi` (médias móveis simples);
+    method='wilder' usa a suavização clássica de Wilder.
+    """
+
+    def __init__(self, window: int = 14, method: str = "sma"):
+        if method not in ("sma", "wilder"):
+            raise ValueError(f"Método de RSI inválido: {method}")
+        self.window = window
+        self.method = method
+        self.prev_close = None
+        self.count = 0
+        # SMA: janela de ganhos/perdas com somas correntes
+        self.gains = deque(maxlen=window)
+        self.losses = deque(maxlen=window)
+        self.gain_sum = 0.0
+        self.loss_sum = 0.0
+        self.nonzero_gains = 0
+        self.nonzero_losses = 0
+        # Wilder: médias suavizadas
+        self.avg_gain = 0.0
+        self.avg_loss = 0.0
+
+    def update(self, close: float) -> float:
+        if self.prev_close is None:
+            # Primeira barra: o diff é NaN, tratado como ganho/perda zero (igual ao pandas)
+            gain = loss = 0.0
+        else:
+            delta = close - self.prev_close
+            gain = delta if delta > 0 else 0.0
+            loss = -delta if delta < 0 else 0.0
+        self.prev_close = close
+        self.count += 1
+
+        if self.method == "sma":
+            if len(self.gains) == self.window:
+                self.gain_sum -= self.gains[0]
+                self.loss_sum -= self.losses[0]
+                self.nonzero_gains -= self.gains[0] != 0
+                self.nonzero_losses -= self.losses[0] != 0
+            self.gains.append(gain)
+            self.losses.append(loss)
+            self.gain_sum += gain
+            self.loss_sum += loss
+            self.nonzero_gains += gain != 0
+            self.nonzero_losses += loss != 0
+            # Reancora as somas quando a janela só tem zeros (evita resíduo de ponto flutuante)
+            if not self.nonzero_gains: self.gain_sum = 0.0
+            if not self.nonzero_losses: self.loss_sum = 0.0
+        elif self.count <= self.window:
+            self.avg_gain += gain / self.window
+            self.avg_loss += loss / self.window
+        else:
+            self.avg_gain = (self.avg_gain * (self.window - 1) + gain) / self.window
+            self.avg_loss = (self.avg_loss * (self.window - 1) + loss) / self.window
+        return self.value
+
+    @property
+    def value(self) -> float:
+        if self.count < self.window:
+            return np.nan
+        if self.method == "sma":
+            avg_gain = self.gain_sum / self.window
+            avg_loss = self.loss_sum / self.window
+        else:
+            avg_gain, avg_loss = self.avg_gain, self.avg_loss
+        rs = avg_gain / (avg_loss if avg_loss != 0 else 0.001)
+        return 100 - (100 / (1 + rs))
+
+    def to_state(self) -> dict:
+        return {
+            "window": self.window, "method": self.method, "prev_close": self.prev_close, "count": self.count,
+            "gains": list(self.gains), "losses": list(self.losses),
+            "avg_gain": self.avg_gain, "avg_loss": self.avg_loss
+        }
+
+    @classmethod
+    def from_state(cls, state: dict):
+        obj = cls(state["window"], state["method"])
+        obj.prev_close = state["prev_close"]
+        obj.count = state["count"]
+        obj.gains.extend(state["gains"])
+        obj.losses.extend(state["losses"])
+        obj.gain_sum = float(sum(obj.gains))
+        obj.loss_sum = float(sum(obj.losses))
+        obj.nonzero_gains = sum(1 for g in obj.gains if g != 0)
+        obj.nonzero_losses = sum(1 for l in obj.losses if l != 0)
+        obj.avg_gain = state["avg_gain"]
+        obj.avg_loss = state["avg_loss"]
+        return obj
+
+
+class IncrementalEMA:
+    """EMA incremental equivalente a `series.ewm(span=span, adjust=False).mean()`."""
+
+    def __init__(self, span: int):
+        self.span = span
+        self.alpha = 2 / (span + 1)
+        self.value = np.nan
+
+    def update(self, x: float) -> float:
+        if math.isnan(self.value):
+            self.value = x
+        else:
+            self.value = (1 - self.alpha) * self.value + self.alpha * x
+        return self.value
+
+    def to_state(self) -> dict:
+        return {"span": self.span, "value": self.value}
+
+    @classmethod
+    def from_state(cls, state: dict):
+        obj = cls(state["span"])
+        obj.value = state["value"]
+        return obj
+
+
+class EmaCrossover:
+    """Par de EMAs para tendência (mesma regra de `TechnicalIndicators.analyze_trend`)."""
+
+    def __init__(self, short_window: int = 9, long_window: int = 21):
+        self.short = IncrementalEMA(short_window)
+        self.long = IncrementalEMA(long_window)
+
+    def update(self, close: float) -> str:
+        self.short.update(close)
+        self.long.update(close)
+        return self.trend
+
+    @property
+    def trend(self) -> str:
+        if self.short.value > self.long.value: return "ALTA"
+        elif self.short.value < self.long.value: return "BAIXA"
+        return "LATERAL"
+
+    def to_state(self) -> dict:
+        return {"short": self.short.to_state(), "long": self.long.to_state()}
+
+    @classmethod
+    def from_state(cls, state: dict):
+        obj = cls()
+        obj.short = IncrementalEMA.from_state(state["short"])
+        obj.long = IncrementalEMA.from_state(state["long"])
+        return obj
+
+
+class RollingVolatility:
+    """
+    Volatilidade anualizada em janela móvel via Welford (add/remove em O(1)).
+    Equivalente a `TechnicalIndicators.calculate_volatility` (desvio amostral dos retornos).
+    """
+
+    def __init__(self, window: int = 21, periods_per_year: int = 252):
+        self.window = window
+        self.periods_per_year = periods_per_year
+        self.prev_close = None
+        self.returns = deque(maxlen=window)
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def update(self, close: float) -> float:
+        if self.prev_close is not None:
+            self._push((close / self.prev_close) - 1)
+        self.prev_close = close
+        return self.value
+
+    def _push(self, x: float):
+        if len(self.returns) < self.window:
+            n = len(self.returns) + 1
+            delta = x - self.mean
+            self.mean += delta / n
+            self.m2 += delta * (x - self.mean)
+        else:
+            # Janela cheia: substitui o retorno mais antigo sem recalcular a janela
+            old = self.returns[0]
+            old_mean = self.mean
+            self.mean += (x - old) / self.window
+            self.m2 += (x - old) * (x - self.mean + old - old_mean)
+        self.returns.append(x)
+
+    @property
+    def value(self) -> float:
+        if len(self.returns) < self.window:
+            return np.nan
+        return math.sqrt(max(self.m2, 0.0) / (self.window - 1)) * math.sqrt(self.periods_per_year)
+
+    def to_state(self) -> dict:
+        return {
+            "window": self.window, "periods_per_year": self.periods_per_year, "prev_close": self.prev_close,
+            "returns": list(self.returns), "mean": self.mean, "m2": self.m2
+        }
+
+    @classmethod
+    def from_state(cls, state: dict):
+        obj = cls(state["window"], state["periods_per_year"])
+        obj.prev_close = state["prev_close"]
+        obj.returns.extend(state["returns"])
+        obj.mean = state["mean"]
+        obj.m2 = state["m2"]
+        return obj
+
+
+class TickerIndicatorState:
+    """
+    Estado incremental (RSI, Volatilidade e Tendência) de um ticker.
+    Guarda também o estado anterior à última barra: durante o pregão o yfinance revisa o
+    fechamento da barra corrente sob o mesmo timestamp, e a revisão é reaplicada sobre ele.
+    """
+
+    def __init__(self, ticker: str):
+        self.ticker = ticker
+        self.rsi = IncrementalRSI()
+        self.volatility = RollingVolatility()
+        self.trend = EmaCrossover()
+        self.last_timestamp = None
+        self.bars = 0
+        self.previous = None # Estado dos indicadores antes da última barra
+
+    def update(self, close: float, timestamp=None, replace_last: bool = False) -> dict:
+        """Aplica uma barra nova ou, com `replace_last`, substitui o fechamento da última barra."""
+        if replace_last:
+            if self.previous is None:
+                raise ValueError(f"Sem barra anterior para revisar em {self.ticker}")
+            self._restore_indicators(self.previous)
+        else:
+            self.previous = self._indicators_state()
+            self.bars += 1
+        self.rsi.update(close)
+        self.volatility.update(close)
+        self.trend.update(close)
+        if timestamp is not None:
+            self.last_timestamp = pd.Timestamp(timestamp).isoformat()
+        return self.latest()
+
+    def latest(self) -> dict:
+        return {
+            "rsi": self.rsi.value,
+            "volatility": self.volatility.value,
+            "trend": self.trend.trend,
+            "last_close": self.rsi.prev_close,
+            "as_of": self.last_timestamp
+        }
+
+    def _indicators_state(self) -> dict:
+        return {"rsi": self.rsi.to_state(), "volatility": self.volatility.to_state(), "trend": self.trend.to_state()}
+
+    def _restore_indicators(self, state: dict):
+        self.rsi = IncrementalRSI.from_state(state["rsi"])
+        self.volatility = RollingVolatility.from_state(state["volatility"])
+        self.trend = EmaCrossover.from_state(state["trend"])
+
+    def to_state(self) -> dict:
+        return {
+            "ticker": self.ticker, "last_timestamp": self.last_timestamp, "bars": self.bars,
+            **self._indicators_state(), "previous": self.previous
+        }
+
+    @classmethod
+    def from_state(cls, state: dict):
+        obj = cls(state["ticker"])
+        obj.last_timestamp = state["last_timestamp"]
+        obj.bars = state["bars"]
+        obj._restore_indicators(state)
+        obj.previous = state.get("previous")
+        return obj
+
+
+class StreamingIndicatorBank:
+    """
+    Conjunto de estados incrementais por ticker, persistido entre execuções.
+    No modo 'watch', cada ciclo processa apenas as barras novas do df_market.
+    """
+
+    def __init__(self):
+        self.states = {}
+
+    def ingest(self, df_market: pd.DataFrame) -> int:
+        """
+        Alimenta as barras posteriores ao último timestamp de cada ticker e reaplica a última
+        barra quando o fechamento dela foi revisado. Retorna o nº de barras novas ou revisadas.
+        """
+        new_bars = 0
+        timestamps = pd.to_datetime(df_market.index)
+        for ticker in df_market.columns:
+            state = self.states.setdefault(ticker, TickerIndicatorState(ticker))
+            closes = df_market[ticker].to_numpy(dtype=float)
+            start = 0
+            if state.last_timestamp is not None:
+                last_ts = pd.Timestamp(state.last_timestamp)
+                start = int(timestamps.searchsorted(last_ts, side='left'))
+                if start < len(timestamps) and timestamps[start] == last_ts:
+                    # Barra corrente (intraday): mesmo timestamp, fechamento possivelmente novo
+                    close = closes[start]
+                    if not np.isnan(close) and close != state.rsi.prev_close and state.previous is not None:
+                        state.update(close, last_ts, replace_last=True)
+                        new_bars += 1
+                    start += 1
+            for ts, close in zip(timestamps[start:], closes[start:]):
+                if np.isnan(close): continue
+                state.update(close, ts)
+                new_bars += 1
+        return new_bars
+
+    def latest(self) -> dict:
+        return {ticker: state.latest() for ticker, state in self.states.items()}
+
+    def to_state(self) -> dict:
+        return {ticker: state.to_state() for ticker, state in self.states.items()}
+
+    @classmethod
+    def from_state(cls, state: dict):
+        bank = cls()
+        bank.states = {ticker: TickerIndicatorState.from_state(s) for ticker, s in state.items()}
+        return bank
+
+    def save(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_state(), f)
+        os.replace(tmp_path, path) # Escrita atômica
+
+    @classmethod
+    def load(cls, path: str):
+        """Restaura o estado salvo (ou um banco vazio se o arquivo não existir)."""
+        if not os.path.exists(path):
+            return cls()
+        with open(path, "r") as f:
+            return cls.from_state(json.load(f))
@@ -7,18 +7,28 @@ class TechnicalIndicators:
     """
 
     @staticmethod
-    def calculate_rsi(series: pd.Series, window: int = 14) -> float:
-        """Calcula RSI (Índice de Força Relativa)."""
-        delta = series.diff()
+    def rsi_series(data, window: int = 14):
+        """RSI completo no tempo (Series, ou DataFrame com um ticker por coluna)."""
+        delta = data.diff()
         gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
         loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
         rs = gain / loss.replace(0, 0.001)
-        return 100 - (100 / (1 + rs)).iloc[-1]
+        return 100 - (100 / (1 + rs))
+
+    @staticmethod
+    def volatility_series(data, window: int = 21):
+        """Volatilidade anualizada no tempo (Series, ou DataFrame com um ticker por coluna)."""
+        return data.pct_change(fill_method=None).rolling(window).std() * np.sqrt(252)
+
+    @staticmethod
+    def calculate_rsi(series: pd.Series, window: int = 14) -> float:
+        """Calcula RSI (Índice de Força Relativa)."""
+        return TechnicalIndicators.rsi_series(series, window).iloc[-1]
 
     @staticmethod
     def calculate_volatility(series: pd.Series, window: int = 21) -> float:
         """Volatilidade anualizada (Janela de 21 dias úteis)."""
-        return series.pct_change(fill_method=None).rolling(window).std().iloc[-1] * np.sqrt(252)
+        return TechnicalIndicators.volatility_series(series, window).iloc[-1]
 
     @staticmethod
     def analyze_trend(series: pd.Series, short_window=9, long_window=21) -> str:
@@ -0,0 +1,240 @@
+# core/market_snapshot.py
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from core.indicators.matrix import IndicatorMatrix
+from core.indicators.fundamental import FundamentalIndicators as Fund
+from core.indicators.macro import MacroIndicators as Macro
+
+# --- CACHE GLOBAL DE SNAPSHOTS ---
+# Chaveado pelo fingerprint do df_market: cada frame é processado uma única vez por execução
+_SNAPSHOT_CACHE = OrderedDict()
+_SNAPSHOT_CACHE_SIZE = 64
+_MATRIX_CACHE = OrderedDict()
+_MATRIX_CACHE_SIZE = 8
+
+
+@dataclass(frozen=True)
+class MarketFeatureSnapshot:
+    """
+    Features de mercado que não dependem do contrato (Imutável).
+    Calculadas uma vez por df_market e lidas pelo Engine e pelas Estratégias.
+    Campos dict são guardados como tuplas de pares para manter o snapshot imutável e serializável.
+    A staleness depende do relógio: guarda-se a data da última barra e `is_stale`/`raw_basis`
+    são avaliados na leitura (o snapshot cacheado não "congela" como fresco no watch).
+    """
+    fingerprint: str
+    is_complete: bool
+    flat_prices: bool = False
+    last_update: object = None # pd.Timestamp (sem fuso) da última barra
+    soy_trend: str = "LATERAL"
+    usd_trend: str = "LATERAL"
+    soy_rsi: float = np.nan
+    usd_rsi: float = np.nan
+    soy_volatility: float = np.nan
+    usd_last_return: float = np.nan
+    soy_change_30d: float = np.nan
+    diesel_change: float = np.nan
+    soy_brl_price: float = 0.0
+    market_score: float = 0.0
+    currency_stress: tuple = ()
+    geopolitics: tuple = ()
+    china_demand: tuple = ()
+
+    @property
+    def is_stale(self) -> bool:
+        """Preços travados nas últimas barras ou última barra com mais de 2 dias (avaliado agora)."""
+        return _is_stale_at(self.flat_prices, self.last_update)
+
+    @property
+    def raw_basis(self) -> float:
+        """Basis sintético (depende de `is_stale`, então também é avaliado na leitura)."""
+        if not self.is_complete:
+            return 0.0
+        return Fund.calculate_basis_proxy(self.soy_volatility, self.usd_last_return, "NEUTRO", self.is_stale, self.soy_trend)
+
+    @property
+    def fx_score(self) -> float:
+        """Pilar Câmbio: RSI do Dólar + Estresse Cambial."""
+        return min(100, (self.usd_rsi * 0.5) + (dict(self.currency_stress).get('score', 0) * 0.5))
+
+    def logistics_score(self, month) -> float:
+        """Pilar Logística (Basis) com sazonalidade de escoamento (Mar/Abr)."""
+        seasonality_factor = 0.8 if month in [3, 4] else 0.2
+        return min(100, self.raw_basis * (1 + (seasonality_factor ** 2)))
+
+
+def fingerprint_market(df_market: pd.DataFrame) -> str:
+    """Hash estável de índice, colunas e valores do frame (muda se qualquer preço mudar)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(tuple(df_market.columns)).encode())
+    digest.update(pd.util.hash_pandas_object(df_market, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def get_market_snapshot(market, fingerprint: str = None) -> MarketFeatureSnapshot:
+    """
+    Retorna o snapshot do df_market, calculando-o apenas na primeira vez (cache por fingerprint).
+    Aceita um snapshot já pronto (retornado como está). O fingerprint hasheia o frame inteiro:
+    o pipeline resolve o snapshot uma vez por ciclo e repassa o snapshot às estratégias.
+    """
+    if isinstance(market, MarketFeatureSnapshot):
+        return market
+
+    key = fingerprint or fingerprint_market(market)
+    snapshot = _SNAPSHOT_CACHE.get(key)
+    if snapshot is None:
+        snapshot = build_market_snapshot(market, key)
+        _SNAPSHOT_CACHE[key] = snapshot
+        if len(_SNAPSHOT_CACHE) > _SNAPSHOT_CACHE_SIZE:
+            _SNAPSHOT_CACHE.popitem(last=False)
+    else:
+        _SNAPSHOT_CACHE.move_to_end(key)
+    return snapshot
+
+
+def get_indicator_matrix(df_market: pd.DataFrame, fingerprint: str = None) -> IndicatorMatrix:
+    """Matriz de indicadores de todos os tickers do frame (cache por fingerprint)."""
+    key = fingerprint or fingerprint_market(df_market)
+    matrix = _MATRIX_CACHE.get(key)
+    if matrix is None:
+        matrix = IndicatorMatrix(df_market)
+        _MATRIX_CACHE[key] = matrix
+        if len(_MATRIX_CACHE) > _MATRIX_CACHE_SIZE:
+            _MATRIX_CACHE.popitem(last=False)
+    else:
+        _MATRIX_CACHE.move_to_end(key)
+    return matrix
+
+
+def build_market_snapshot(df_market: pd.DataFrame, fingerprint: str = None, indicators: dict = None) -> MarketFeatureSnapshot:
+    """
+    Calcula todas as features de mercado do frame (sem cache).
+    Com `indicators` (saída de `StreamingIndicatorBank.latest()`), RSI, Volatilidade e Tendência
+    vêm do estado incremental do modo watch em vez da matriz sobre o histórico inteiro.
+    """
+    use_streaming = indicators is not None and 'ZS=F' in indicators and 'USDBRL=X' in indicators
+    if use_streaming:
+        fingerprint = fingerprint or _streaming_fingerprint(indicators)
+    fingerprint = fingerprint or fingerprint_market(df_market)
+    if 'ZS=F' not in df_market.columns or 'USDBRL=X' not in df_market.columns:
+        return MarketFeatureSnapshot(fingerprint=fingerprint, is_complete=False)
+
+    soy = df_market['ZS=F']
+    usd = df_market['USDBRL=X']
+
+    if use_streaming:
+        soy_state, usd_state = indicators['ZS=F'], indicators['USDBRL=X']
+        soy_trend, usd_trend = soy_state['trend'], usd_state['trend']
+        soy_vol = soy_state['volatility']
+        soy_rsi, usd_rsi = soy_state['rsi'], usd_state['rsi']
+        usd_last_return = _last_return(usd)
+        has_diesel = 'CL=F' in df_market.columns
+        diesel_return = _last_return(df_market['CL=F']) if has_diesel else np.nan
+    else:
+        # RSI, Volatilidade, Tendência e Retornos de todos os tickers em uma passada
+        matrix = get_indicator_matrix(df_market, fingerprint)
+        soy_trend = matrix.latest_trend('ZS=F')
+        usd_trend = matrix.latest_trend('USDBRL=X')
+        soy_vol = matrix.latest_volatility('ZS=F')
+        soy_rsi, usd_rsi = matrix.latest('rsi', 'ZS=F'), matrix.latest('rsi', 'USDBRL=X')
+        usd_last_return = matrix.latest('returns', 'USDBRL=X')
+        has_diesel = matrix.has('CL=F')
+        diesel_return = matrix.latest('returns', 'CL=F') if has_diesel else np.nan
+
+    if has_diesel:
+        diesel_change = diesel_return if len(df_market) > 1 else 0
+    else:
+        diesel_change = np.nan
+
+    return MarketFeatureSnapshot(
+        fingerprint=fingerprint,
+        is_complete=True,
+        flat_prices=_has_flat_prices(df_market),
+        last_update=_last_update(df_market),
+        soy_trend=soy_trend,
+        usd_trend=usd_trend,
+        soy_rsi=soy_rsi,
+        usd_rsi=usd_rsi,
+        soy_volatility=soy_vol,
+        usd_last_return=usd_last_return,
+        soy_change_30d=soy.pct_change(30).iloc[-1],
+        diesel_change=diesel_change,
+        soy_brl_price=_soy_brl_price(df_market),
+        market_score=_calibrated_market_score(soy_vol, soy_trend, usd_trend),
+        currency_stress=tuple(Macro.calculate_currency_stress(usd).items()),
+        geopolitics=tuple(Macro.calculate_geopolitical_risk(df_market.get('GC=F', soy), df_market.get('CL=F', soy)).items()),
+        china_demand=tuple(Fund.calculate_china_demand(soy, df_market.get('HE=F')).items())
+    )
+
+
+def _streaming_fingerprint(indicators: dict) -> str:
+    """Identifica o snapshot pelo estado incremental (sem hashear o frame)."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr(sorted(indicators.items())).encode())
+    return f"stream:{digest.hexdigest()}"
+
+
+def _last_return(series: pd.Series) -> float:
+    """Retorno da última barra (mesma regra de `pct_change(fill_method=None)`)."""
+    if len(series) < 2:
+        return np.nan
+    return float(series.iloc[-1] / series.iloc[-2] - 1)
+
+
+def _has_flat_prices(df: pd.DataFrame) -> bool:
+    """Soja ou Dólar sem variação nas últimas 3 barras (feed travado)."""
+    if len(df) >= 3:
+        return bool(df['ZS=F'].tail(3).std() == 0 or df['USDBRL=X'].tail(3).std() == 0)
+    return False
+
+
+def _last_update(df: pd.DataFrame):
+    if df.empty: return None
+    return pd.to_datetime(df.index[-1]).replace(tzinfo=None)
+
+
+def _is_stale_at(flat_prices: bool, last_update, now: datetime = None) -> bool:
+    if last_update is None or flat_prices:
+        return True
+    return ((now or datetime.now()) - last_update).days > 2
+
+
+def _is_data_stale(df: pd.DataFrame) -> bool:
+    return _is_stale_at(_has_flat_prices(df), _last_update(df))
+
+
+def _calibrated_market_score(soy_vol, trend, usd_trend):
+    """
+    [CORRIGIDO] Lógica calibrada: Queda de preço não é Risco 80.
+    """
+    # 1. Volatilidade
+    vol_score = min((soy_vol * 100) * 3, 100)
+
+    # 2. Tendência: Queda de preço é normal.
+    if trend == "STRONG_DOWN": price_risk = 40 # Antes era 80
+    elif trend == "DOWN": price_risk = 25      # Antes era 60
+    elif trend == "NEUTRAL": price_risk = 10   # Antes era 40
+    else: price_risk = 5
+
+    # 3. Câmbio
+    fx_hedge = -20 if "UP" in usd_trend else 0
+
+    final_score = (vol_score * 0.3) + (price_risk * 0.7) + fx_hedge
+    return max(0, min(final_score, 100))
+
+
+def _soy_brl_price(df_market: pd.DataFrame) -> float:
+    """Preço da saca de 60kg em BRL (ver BaseRiskStrategy.get_soy_brl_price)."""
+    try:
+        soy_chicago = df_market['ZS=F'].iloc[-1]
+        usd_brl = df_market['USDBRL=X'].iloc[-1]
+
+        # Conversão: (Cents/Bushel / 100) * USD * 2.2046 (Bushels to 60kg Bag)
+        price_saca = (soy_chicago / 100) * usd_brl * 2.2046
+        return round(float(price_saca), 2)
+    except (KeyError, IndexError, TypeError, ValueError):
+        return 0.0
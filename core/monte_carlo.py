@@ -0,0 +1,171 @@
+# core/monte_carlo.py
+from concurrent.futures import ThreadPoolExecutor
+from statistics import NormalDist
+import numpy as np
+import pandas as pd
+from core.logger import get_logger
+
+logger = get_logger("MonteCarlo")
+
+
+class LossDistribution:
+    """Distribuição simulada de perdas da carteira (uma perda por caminho)."""
+
+    def __init__(self, losses: np.ndarray, expected_loss: float, exposure: float, confidence_levels):
+        self.losses = losses
+        self.expected_loss = expected_loss # Analítico: soma de PD * LGD * EAD
+        self.exposure = exposure
+        self.confidence_levels = tuple(confidence_levels)
+
+    @property
+    def n_paths(self) -> int:
+        return len(self.losses)
+
+    @property
+    def simulated_mean(self) -> float:
+        return float(self.losses.mean()) if self.n_paths else 0.0
+
+    def var(self, level: float) -> float:
+        """Value at Risk: quantil da perda no nível de confiança."""
+        return float(np.quantile(self.losses, level)) if self.n_paths else 0.0
+
+    def expected_shortfall(self, level: float) -> float:
+        """Expected Shortfall: perda média nos caminhos a partir do VaR."""
+        if not self.n_paths:
+            return 0.0
+        tail = self.losses[self.losses >= self.var(level)]
+        return float(tail.mean())
+
+    def to_dict(self) -> dict:
+        report = {
+            "n_paths": self.n_paths,
+            "exposure": float(self.exposure),
+            "expected_loss": float(self.expected_loss),
+            "simulated_mean_loss": self.simulated_mean,
+        }
+        for level in self.confidence_levels:
+            tag = f"{level * 100:g}"
+            report[f"var_{tag}"] = self.var(level)
+            report[f"es_{tag}"] = self.expected_shortfall(level)
+        return report
+
+
+class MonteCarloLossSimulator:
+    """
+    Simulador de perdas da carteira por Monte Carlo.
+
+    Cada caminho sorteia o default de cada contrato a partir do seu PD e soma LGD * EAD dos
+    inadimplentes. Os caminhos são divididos em blocos lógicos fixos de `BLOCK_PATHS`, cada um
+    com seu próprio gerador derivado da semente; o orçamento de memória só decide em quantas
+    fatias de linhas (matriz caminhos x contratos em float32) cada bloco é sorteado, e o fluxo
+    do gerador é o mesmo com qualquer fatiamento. Assim o resultado não depende de
+    `max_chunk_mb`, da ordem de execução nem do número de threads
+    (o NumPy libera o GIL no sorteio e no produto matricial).
+
+    Com `correlation` > 0 usa o modelo de um fator (Vasicek): o default ocorre quando
+    sqrt(rho) * Z + sqrt(1 - rho) * e < Phi^-1(PD), com Z comum ao caminho.
+    """
+
+    # Caminhos por bloco lógico (uma semente filha por bloco, independente da memória)
+    BLOCK_PATHS = 4096
+
+    def __init__(self, n_paths: int = 100_000, seed: int = 42, confidence_levels=(0.95, 0.99),
+                 correlation: float = 0.0, max_chunk_mb: int = 256, n_workers: int = 1):
+        if not 0.0 <= correlation < 1.0:
+            raise ValueError(f"Correlação inválida: {correlation}")
+        self.n_paths = int(n_paths)
+        self.seed = seed
+        self.confidence_levels = tuple(confidence_levels)
+        self.correlation = correlation
+        self.max_chunk_mb = max_chunk_mb
+        self.n_workers = max(1, int(n_workers))
+
+    @classmethod
+    def from_config(cls, config: dict):
+        """Cria o simulador a partir da seção `monte_carlo` do settings.yaml."""
+        params = (config or {}).get('monte_carlo', {}) or {}
+        return cls(
+            n_paths=params.get('paths', 100_000),
+            seed=params.get('seed', 42),
+            confidence_levels=params.get('confidence_levels', (0.95, 0.99)),
+            correlation=params.get('correlation', 0.0),
+            max_chunk_mb=params.get('max_chunk_mb', 256),
+            n_workers=params.get('workers', 1)
+        )
+
+    def simulate(self, pd_scores, lgd, exposure) -> LossDistribution:
+        """
+        Args:
+            pd_scores: PD de cada contrato em % (escala do `pd_score`, 0-100).
+            lgd: LGD de cada contrato (fração, ver `RiskEngine._calculate_dynamic_lgd`).
+            exposure: EAD de cada contrato (loan_amount).
+        """
+        pd_prob = np.clip(np.asarray(pd_scores, dtype=float) / 100.0, 0.0, 1.0)
+        loss_given_default = np.asarray(lgd, dtype=float) * np.asarray(exposure, dtype=float)
+        expected_loss = float((pd_prob * loss_given_default).sum())
+        n_contracts = len(pd_prob)
+
+        losses = np.zeros(self.n_paths)
+        if n_contracts == 0 or self.n_paths == 0:
+            return LossDistribution(losses, expected_loss, float(np.sum(exposure)), self.confidence_levels)
+
+        block = self.BLOCK_PATHS
+        n_blocks = -(-self.n_paths // block)
+        seeds = np.random.SeedSequence(self.seed).spawn(n_blocks)
+        rows = min(block, self._chunk_paths(n_contracts))
+        logger.info(f"🎲 Monte Carlo: {self.n_paths:,} caminhos x {n_contracts:,} contratos ({n_blocks} blocos de {block}, fatias de {rows})")
+
+        threshold, lgd_ead = self._default_thresholds(pd_prob), loss_given_default.astype(np.float32)
+
+        def run_block(i):
+            start = i * block
+            stop = min(start + block, self.n_paths)
+            losses[start:stop] = self._simulate_block(np.random.default_rng(seeds[i]), stop - start, rows, threshold, lgd_ead)
+
+        if self.n_workers > 1:
+            # Cada bloco escreve na sua própria fatia de `losses`
+            with ThreadPoolExecutor(max_workers=self.n_workers) as pool:
+                list(pool.map(run_block, range(n_blocks)))
+        else:
+            for i in range(n_blocks):
+                run_block(i)
+
+        return LossDistribution(losses, expected_loss, float(np.sum(exposure)), self.confidence_levels)
+
+    def simulate_portfolio(self, scored: pd.DataFrame, exposure) -> LossDistribution:
+        """Atalho para a saída de `RiskEngine.score_portfolio` (colunas 'pd_score' e 'lgd')."""
+        return self.simulate(scored['pd_score'].to_numpy(dtype=float), scored['lgd'].to_numpy(dtype=float), exposure)
+
+    def _chunk_paths(self, n_contracts: int) -> int:
+        budget = self.max_chunk_mb * 1024 * 1024
+        return int(max(1, min(self.n_paths, budget // (n_contracts * 4))))
+
+    def _default_thresholds(self, pd_prob: np.ndarray) -> np.ndarray:
+        """Limiar de default por contrato: o próprio PD (uniforme) ou Phi^-1(PD) (um fator)."""
+        if not self.correlation:
+            return pd_prob.astype(np.float32)
+        inv_cdf = NormalDist().inv_cdf
+        clipped = np.clip(pd_prob, 1e-12, 1 - 1e-12)
+        threshold = np.array([inv_cdf(p) for p in clipped])
+        threshold[pd_prob <= 0] = -np.inf
+        threshold[pd_prob >= 1] = np.inf
+        return threshold.astype(np.float32)
+
+    def _simulate_block(self, rng, n_paths: int, rows: int, threshold: np.ndarray, lgd_ead: np.ndarray) -> np.ndarray:
+        """Perdas de um bloco lógico, sorteado em fatias de até `rows` caminhos (mesmo fluxo do gerador)."""
+        n_contracts = len(threshold)
+        # Fator comum do bloco inteiro sorteado antes das fatias (não depende do fatiamento)
+        factor = rng.standard_normal((n_paths, 1), dtype=np.float32) if self.correlation else None
+        losses = np.empty(n_paths, dtype=np.float32)
+        for start in range(0, n_paths, rows):
+            stop = min(start + rows, n_paths)
+            if factor is None:
+                draws = rng.random((stop - start, n_contracts), dtype=np.float32)
+            else:
+                draws = rng.standard_normal((stop - start, n_contracts), dtype=np.float32)
+                draws *= np.float32(np.sqrt(1 - self.correlation))
+                draws += np.float32(np.sqrt(self.correlation)) * factor[start:stop]
+            defaults = draws < threshold
+            # Perda do caminho = defaults (0/1) @ LGD*EAD
+            losses[start:stop] = defaults.astype(np.float32) @ lgd_ead
+        return losses
@@ -13,6 +13,9 @@ from core.climate_risk import ClimateIntelligence
 from core.scout import NewsScout
 from core.logger import get_logger
 from core.advisor import RiskAdvisor # 1. Certifique-se de que o import existe
+from core.indicators.streaming import StreamingIndicatorBank
+from core.market_snapshot import build_market_snapshot, get_indicator_matrix, get_market_snapshot
+from core.execution import ScoringExecutor
 
 # Componentes Refatorados
 from core.context import RiskContext
@@ -30,7 +33,8 @@ class RiskPipeline:
         # Infraestrutura
         self.db = DatabaseManager(use_service_role=True)
         self.engine = RiskEngine()
-        self.climate_intel = ClimateIntelligence()
+        self.executor = ScoringExecutor.from_config(self.config)
+        self.climate_intel = ClimateIntelligence.from_config(self.config)
         self.scout = NewsScout(use_service_role=True)
         
         # 2. INICIALIZAÇÃO DO ADVISOR (O que estava faltando)
@@ -44,6 +48,8 @@ class RiskPipeline:
         self.now_br = datetime.now(self.br_tz)
         
         self.macro_corr = 0.0 
+        self.market = None # MarketFeatureSnapshot do ciclo
+        self.streaming_indicators = {}
         # Puxa o mapa de tickers diretamente da config já carregada
         self.ticker_map = self.config.get("ticker_map", {})
 
@@ -83,6 +89,13 @@ class RiskPipeline:
 
         if not self._load_data(): return
 
+        # Modo watch: indicadores incrementais reagem apenas às barras novas
+        if self.mode == "watch":
+            self._update_streaming_indicators()
+
+        # Snapshot de mercado resolvido uma vez por ciclo e repassado ao scoring e às estratégias
+        self.market = self._resolve_market_snapshot()
+
         # Chama a versão inteligente do cálculo de correlação
         self.macro_corr = self._calculate_macro_correlation()
 
@@ -93,8 +106,41 @@ class RiskPipeline:
             admin_email = os.getenv("EMAIL_TO")
             self.notifier.check_and_send(self.mode, self.context, self.df_market, recipient_email=admin_email)
 
+        # Revalidação do cache climático roda em paralelo ao scoring; o ciclo não espera a rede além
+        # de uma folga curta (a entrada velha já foi servida e os lotes gravados ficam para o próximo ciclo)
+        refresh_wait = (self.config.get("forecast_cache") or {}).get("refresh_wait_seconds", 5)
+        if not self.climate_intel.wait_for_refresh(timeout=refresh_wait):
+            logger.info(f"🔁 Revalidação climática ainda em andamento após {refresh_wait}s; o próximo ciclo completa o cache.")
+
         logger.info("✅ Pipeline finalizado com sucesso.")
 
+    def _update_streaming_indicators(self):
+        """
+        Atualiza o estado incremental (RSI/Vol/Tendência) com as barras novas do df_market
+        e persiste o estado para o próximo ciclo do watch.
+        """
+        state_path = self.config.get("streaming_state_path", ".cache/indicator_state.json")
+        self.streaming_indicators = {}
+        try:
+            bank = StreamingIndicatorBank.load(state_path)
+            new_bars = bank.ingest(self.df_market)
+            bank.save(state_path)
+            self.streaming_indicators = bank.latest()
+
+            soy = self.streaming_indicators.get("ZS=F", {})
+            logger.info(f"📡 Indicadores incrementais: {new_bars} barras novas | Soja RSI {soy.get('rsi', float('nan')):.1f} ({soy.get('trend', 'N/A')})")
+        except Exception as e:
+            logger.error(f"⚠️ Falha ao atualizar indicadores incrementais (não bloqueante): {e}")
+
+    def _resolve_market_snapshot(self):
+        """
+        No watch, RSI/Vol/Tendência vêm do estado incremental (sem a matriz sobre o histórico);
+        nos demais modos (ou se o estado falhou) o snapshot completo é calculado a partir do df_market.
+        """
+        if self.streaming_indicators:
+            return build_market_snapshot(self.df_market, indicators=self.streaming_indicators)
+        return get_market_snapshot(self.df_market)
+
     def _calculate_macro_correlation(self) -> float:
         """Calcula correlação entre a commodity principal da carteira e o Dólar."""
         try:
@@ -122,17 +168,13 @@ class RiskPipeline:
     def _calculate_backtest_benchmark(self, ticker: str) -> float:
         try:
             # Garante que o ticker existe no DF, senão usa Soja
-            active_ticker = ticker if ticker in self.df_market.columns else 'ZS=F'
-            series = self.df_market[active_ticker]
-            
-            delta = series.diff()
-            gain = (delta.where(delta > 0, 0)).rolling(window=14).mean()
-            loss = (-delta.where(delta < 0, 0)).rolling(window=14).mean()
-            rsi = 100 - (100 / (1 + (gain / loss.replace(0, 0.001))))
-            
-            vol = series.pct_change().rolling(window=30).std() * np.sqrt(252) * 100
+            matrix = get_indicator_matrix(self.df_market)
+            active_ticker = ticker if matrix.has(ticker) else 'ZS=F'
+
+            rsi = matrix.latest('rsi', active_ticker)
+            vol = matrix.latest_volatility(active_ticker, window=30) * 100
             
-            if rsi.iloc[-1] > 70 and vol.iloc[-1] > 40:
+            if rsi > 70 and vol > 40:
                 return 100.0
             return 30.0
         except Exception as e:
@@ -141,49 +183,57 @@ class RiskPipeline:
 
     def _process_contracts(self):
         logger.info(f"🔄 Processando {len(self.contracts)} contratos...")
-        updates = []
         current_month = self.now_br.month
 
-        for raw_contract in self.contracts:
-            try:
-                # 1. Mapeamento de Dados
-                contract = {
-                    "id": raw_contract.get("id"),
-                    "name": raw_contract.get("client_name"),
-                    "state_code": raw_contract.get("state_code", "MT"),
-                    "loan_amount": raw_contract.get("loan_amount", 0),
-                    "area_hectares": raw_contract.get("area_hectares", 0),
-                    "estimated_yield_kg_ha": raw_contract.get("estimated_yield_kg_ha", 3600),
-                    "commodity": (raw_contract.get("culture") or "soja").lower(),
-                    # --- FIX: Mantemos lat/lon para o upsert não quebrar ---
-                    "latitude": raw_contract.get("latitude"),
-                    "longitude": raw_contract.get("longitude")
-                }
+        # 1. Mapeamento de Dados (Carteira Colunar)
+        contracts = [self._map_contract(raw_contract) for raw_contract in self.contracts]
+        portfolio = pd.DataFrame(contracts)
 
-                # 2. Execução do Motor
-                strategy = RegionalEngineFactory.get_strategy(raw_contract)
-                current_price_brl = strategy.get_soy_brl_price(self.df_market)
-                
-                pd_score, metrics = self.engine.calculate_pd_metrics(
-                    self.df_market, 
-                    contract['name'], 
-                    self.df_climate, 
-                    contract, 
-                    current_month,
-                    active_alerts=self.active_alerts # <--- PASSANDO ALERTAS AQUI
-                )
-                
-                metrics['market_price_brl'] = current_price_brl
-                risk_justification = self.advisor.generate_credit_narrative(pd_score, metrics)
+        # 2. Execução do Motor (Vetorizado, distribuído pelo backend configurado)
+        try:
+            scored = self.executor.score(
+                self.engine,
+                portfolio,
+                self.market,
+                self.df_climate,
+                current_month,
+                alerts=self.active_alerts # <--- PASSANDO ALERTAS AQUI
+            )
+        except Exception as e:
+            logger.critical(f"❌ Falha no scoring vetorizado da carteira: {e}", exc_info=True)
+            scored = None
+
+        if scored is not None:
+            self._save_scored_portfolio(contracts, portfolio, scored)
+
+        # Salva métricas globais
+        self.persister.save_market_metrics(self.df_market, self.context)
+
+    def _save_scored_portfolio(self, contracts, portfolio, scored):
+        """Atualiza o contexto em memória e grava o resultado do scoring em lote."""
+        updates = []
 
-                # 3. Atualiza Contexto em Memória
-                self.context.update_portfolio_metrics(
-                    pd_score, 
-                    contract['loan_amount'], 
-                    metrics.get('collateral_status')
-                )
+        # O preço da saca depende apenas do mercado (igual para todas as estratégias)
+        current_price_brl = RegionalEngineFactory.get_strategy({}).get_soy_brl_price(self.market)
 
-                # 4. Prepara o Objeto para Salvar (CORREÇÃO AQUI)
+        # 3. Atualiza Contexto em Memória (lote, na ordem da carteira)
+        self.context.update_portfolio_metrics_batch(
+            scored['pd_score'].to_numpy(),
+            pd.to_numeric(portfolio['loan_amount'], errors='coerce').fillna(0).to_numpy(),
+            scored['collateral_status'].to_numpy()
+        )
+
+        # Vetor de features da narrativa; o texto (memoizado por faixa) segue em risk_justification
+        # porque dashboards e exportações ainda leem a coluna
+        narrative_features = self.advisor.narrative_features_batch(scored)
+
+        for contract, row, risk_features in zip(contracts, scored.to_dict('records'), narrative_features):
+            try:
+                pd_score = row['pd_score']
+                metrics = self.engine.portfolio_row_metrics(row)
+                metrics['market_price_brl'] = current_price_brl
+
+                # 4. Prepara o Objeto para Salvar
                 # O upsert precisa dos campos obrigatórios (lat/lon) mesmo que não tenham mudado
                 record_to_save = {
                     "id": contract['id'],
@@ -194,13 +244,13 @@ class RiskPipeline:
                     "last_pd_score": pd_score,
                     "current_ltv": metrics.get('ltv'),
                     "collateral_status": metrics.get('collateral_status'),
-                    "risk_justification": risk_justification
+                    "risk_features": risk_features,
+                    "risk_justification": self.advisor.render_narrative(risk_features)
                 }
                 updates.append(record_to_save)
 
             except Exception as e:
-                # Agora o logger estará definido aqui
-                logger.error(f"❌ Erro Crítico no Contrato {raw_contract.get('id')}: {e}")
+                logger.error(f"❌ Erro Crítico no Contrato {contract.get('id')}: {e}")
 
         # Salva TUDO de uma vez fora do loop
         if updates:
@@ -211,14 +261,27 @@ class RiskPipeline:
             except Exception as e:
                 logger.critical(f"❌ Falha ao salvar lote no banco: {e}")
 
-        # Salva métricas globais
-        self.persister.save_market_metrics(self.df_market, self.context)
+    @staticmethod
+    def _map_contract(raw_contract: dict) -> dict:
+        """Mapeia o registro do banco para o formato de contrato do motor."""
+        return {
+            "id": raw_contract.get("id"),
+            "name": raw_contract.get("client_name"),
+            "state_code": raw_contract.get("state_code", "MT"),
+            "loan_amount": raw_contract.get("loan_amount", 0),
+            "area_hectares": raw_contract.get("area_hectares", 0),
+            "estimated_yield_kg_ha": raw_contract.get("estimated_yield_kg_ha", 3600),
+            "commodity": (raw_contract.get("culture") or "soja").lower(),
+            # --- FIX: Mantemos lat/lon para o upsert não quebrar ---
+            "latitude": raw_contract.get("latitude"),
+            "longitude": raw_contract.get("longitude")
+        }
 
     def _load_data(self) -> bool:
         try:
             symbols = self.config.get('tickers', [])
             self.df_market = MarketLoader.get_market_data(symbols)
-            dynamic_locations = [{'name': c['client_name'], 'lat': float(c['latitude']), 'lon': float(c['longitude'])} for c in self.contracts]
+            dynamic_locations = [{'id': c.get('id'), 'name': c['client_name'], 'lat': float(c['latitude']), 'lon': float(c['longitude'])} for c in self.contracts]
             self.df_climate = self.climate_intel.run_full_scan(locations=dynamic_locations)
             return True
         except Exception as e:
@@ -227,8 +290,7 @@ class RiskPipeline:
 
     def _extract_climate_context(self, loc_name):
         ctx = {"status_desc": "N/A", "rain_7d": 0.0, "temp_max": 0.0}
-        if not self.df_climate.empty:
-            c_row = self.df_climate[self.df_climate['Location'] == loc_name]
-            if not c_row.empty:
-                ctx = {"status_desc": str(c_row.iloc[0]['Risk_Status']), "rain_7d": float(c_row.iloc[0]['Rain_7d']), "temp_max": float(c_row.iloc[0].get('Temp_Max', 0.0))}
+        c_row = self.df_climate.get(loc_name)
+        if c_row is not None:
+            ctx = {"status_desc": str(c_row['Risk_Status']), "rain_7d": float(c_row['Rain_7d']), "temp_max": float(c_row.get('Temp_Max', 0.0))}
         return ctx
\ No newline at end of file
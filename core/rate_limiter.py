@@ -0,0 +1,116 @@
+# core/rate_limiter.py
+import asyncio
+import time
+from collections import deque
+import numpy as np
+
+
+class AdaptiveRateLimiter:
+    """
+    Limitador de requisições de um provedor, compartilhado por todas as tarefas do scan.
+
+    - Token bucket: respeita a taxa real da API (`rate_per_second`, rajada de `burst`).
+      Cada chamada reserva um token e dorme exatamente até a sua vez (sem sleeps fixos).
+    - Concorrência AIMD: o limite de requisições simultâneas sobe +1 por janela enquanto
+      as respostas chegam abaixo de `latency_target` e cai pela metade em 429/timeout.
+    - `Retry-After` de um 429 pausa o bucket para todos os chamadores.
+
+    Uso:
+        async with limiter:
+            response = await client.get(...)
+        limiter.on_success(latency) | limiter.on_throttle(retry_after)
+    """
+
+    def __init__(self, rate_per_second: float = 10.0, burst: float = None, initial_concurrency: int = 2,
+                 min_concurrency: int = 1, max_concurrency: int = 16, latency_target: float = 2.0,
+                 clock=time.monotonic):
+        self.rate = float(rate_per_second)
+        self.burst = float(burst or max(1.0, self.rate))
+        self.min_concurrency = max(1, int(min_concurrency))
+        self.max_concurrency = max(self.min_concurrency, int(max_concurrency))
+        self.concurrency = float(min(max(initial_concurrency, self.min_concurrency), self.max_concurrency))
+        self.latency_target = latency_target
+        self._clock = clock
+        self.tokens = self.burst
+        self._updated = clock()
+        self._paused_until = 0.0
+        self.in_flight = 0
+        self._condition = None # Criada no primeiro uso (loop do scan)
+
+    @classmethod
+    def from_config(cls, params: dict):
+        params = params or {}
+        return cls(
+            rate_per_second=params.get('rate_per_second', 10.0),
+            burst=params.get('burst'),
+            initial_concurrency=params.get('initial_concurrency', 2),
+            min_concurrency=params.get('min_concurrency', 1),
+            max_concurrency=params.get('max_concurrency', 16),
+            latency_target=params.get('latency_target_seconds', 2.0)
+        )
+
+    def _reserve_token(self) -> float:
+        """Reserva um token (saldo pode ficar negativo) e devolve a espera até ele existir."""
+        now = self._clock()
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        self.tokens -= 1.0
+        return max(self._paused_until - now, -self.tokens / self.rate, 0.0)
+
+    async def acquire(self):
+        if self._condition is None:
+            self._condition = asyncio.Condition()
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_flight < int(self.concurrency))
+            self.in_flight += 1
+        try:
+            wait = self._reserve_token()
+            if wait > 0:
+                await asyncio.sleep(wait)
+        except BaseException:
+            await self.release()
+            raise
+
+    async def release(self):
+        async with self._condition:
+            self.in_flight -= 1
+            self._condition.notify_all()
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+    def on_success(self, latency: float):
+        """Resposta válida: aumento aditivo enquanto a latência estiver abaixo do alvo."""
+        if latency <= self.latency_target:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1.0 / self.concurrency)
+
+    def on_throttle(self, retry_after: float = None):
+        """429/timeout: redução multiplicativa e pausa pelo `Retry-After`, se informado."""
+        self.concurrency = max(self.min_concurrency, self.concurrency / 2.0)
+        if retry_after:
+            self._paused_until = max(self._paused_until, self._clock() + retry_after)
+
+
+class LatencyStats:
+    """Latências recentes de um provedor (janela deslizante em memória), base do hedging."""
+
+    def __init__(self, window: int = 500, min_samples: int = 20):
+        self._samples = deque(maxlen=max(1, int(window)))
+        self.min_samples = max(1, int(min_samples))
+
+    def __len__(self):
+        return len(self._samples)
+
+    def record(self, latency: float):
+        self._samples.append(float(latency))
+
+    def percentile(self, q: float):
+        """Percentil observado (None enquanto houver menos de `min_samples` amostras)."""
+        samples = list(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        return float(np.percentile(samples, q))
@@ -0,0 +1,190 @@
+# core/result_writer.py
+import json
+import os
+import time
+from pathlib import Path
+import pandas as pd
+from core.logger import get_logger
+
+logger = get_logger("BacktestResultWriter")
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # Parquet é opcional: sem pyarrow o spool vira JSONL
+    pa = pq = None
+
+
+class BacktestWriteError(Exception):
+    """Falha persistente ao gravar um snapshot no banco (esgotadas as tentativas)."""
+    pass
+
+
+class BacktestResultWriter:
+    """
+    Gravação dos resultados do walk-forward em streaming e com retomada.
+
+    Para cada data do snapshot:
+    1. As linhas vão primeiro para o spool local (append-only: uma parte Parquet por data,
+       ou JSONL se o pyarrow não estiver instalado). Nada calculado se perde.
+    2. O insert no Supabase é feito em blocos de tamanho limitado, com retry e backoff exponencial.
+    3. Só então a data entra no checkpoint (escrita atômica). Um run interrompido retoma
+       a partir da última data confirmada.
+    """
+
+    TABLE = "backtest_results"
+
+    def __init__(self, client, sim_id, spool_dir: str = ".cache/backtest_spool", chunk_size: int = 500,
+                 max_retries: int = 5, backoff_seconds: float = 1.0, sleep=time.sleep):
+        self.client = client
+        self.sim_id = sim_id
+        self.chunk_size = max(1, int(chunk_size))
+        self.max_retries = max(1, int(max_retries))
+        self.backoff_seconds = backoff_seconds
+        self._sleep = sleep
+        self.directory = Path(spool_dir) / f"sim_{sim_id}"
+        self.checkpoint_path = self.directory / "checkpoint.json"
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    @classmethod
+    def from_config(cls, client, sim_id, config: dict):
+        """Cria o writer a partir da seção `backtest_writer` do settings.yaml."""
+        params = (config or {}).get('backtest_writer', {}) or {}
+        return cls(
+            client,
+            sim_id,
+            spool_dir=params.get('spool_dir', '.cache/backtest_spool'),
+            chunk_size=params.get('chunk_size', 500),
+            max_retries=params.get('max_retries', 5),
+            backoff_seconds=params.get('backoff_seconds', 1.0)
+        )
+
+    # --- Checkpoint ---
+    def last_committed_date(self):
+        """Última data de snapshot confirmada no banco (None = nada gravado)."""
+        if not self.checkpoint_path.exists():
+            return None
+        try:
+            state = json.loads(self.checkpoint_path.read_text())
+        except (OSError, ValueError):
+            return None
+        if state.get("sim_id") != self.sim_id:
+            return None
+        return state.get("last_date")
+
+    def _commit_checkpoint(self, sim_date: str, rows: int):
+        state = {"sim_id": self.sim_id, "last_date": sim_date, "rows": rows}
+        tmp_path = self.checkpoint_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(state))
+        os.replace(tmp_path, self.checkpoint_path) # Atômico: nunca fica um checkpoint pela metade
+
+    def resume(self):
+        """
+        Prepara a retomada: remove do banco as linhas de datas posteriores ao checkpoint
+        (inserts parciais do snapshot que falhou). Retorna a última data confirmada.
+        """
+        last_date = self.last_committed_date()
+        if self.client is not None:
+            query = self.client.table(self.TABLE).delete().eq("simulation_id", self.sim_id)
+            if last_date is not None:
+                query = query.gt("sim_date", last_date)
+            self._with_retry(query.execute, f"limpeza pós-checkpoint ({last_date})")
+        self._trim_spool(last_date)
+        return last_date
+
+    def reset(self):
+        """Início do zero: descarta checkpoint e spool da simulação."""
+        for path in self.directory.iterdir():
+            if path.is_file():
+                path.unlink()
+
+    # --- Escrita ---
+    def write(self, sim_date: str, rows: list):
+        """Grava o snapshot de uma data (spool -> banco em blocos -> checkpoint)."""
+        if rows:
+            self._spool(sim_date, rows)
+            # Sem cliente (backtest offline) o spool local é o destino final
+            for start in range(0, len(rows) if self.client is not None else 0, self.chunk_size):
+                chunk = rows[start:start + self.chunk_size]
+                self._with_retry(
+                    self.client.table(self.TABLE).insert(chunk).execute,
+                    f"{sim_date} [{start}:{start + len(chunk)}]"
+                )
+        self._commit_checkpoint(sim_date, len(rows))
+
+    def _with_retry(self, operation, label: str):
+        for attempt in range(self.max_retries):
+            try:
+                return operation()
+            except Exception as e:
+                if attempt == self.max_retries - 1:
+                    logger.error(f"❌ Falha ao gravar {label} após {self.max_retries} tentativas: {e}")
+                    raise BacktestWriteError(f"Falha ao gravar {label}: {e}") from e
+                wait_time = self.backoff_seconds * (2 ** attempt)
+                logger.warning(f"⏳ Erro no Supabase ({label}, tentativa {attempt+1}/{self.max_retries}). Esperando {wait_time:.1f}s... Erro: {e}")
+                self._sleep(wait_time)
+
+    # --- Spool local ---
+    def _spool(self, sim_date: str, rows: list):
+        if pq is not None:
+            # Uma parte por data: o diretório inteiro é lido como um dataset Parquet
+            part = self.directory / f"part_{sim_date}.parquet"
+            tmp_path = part.with_suffix(".tmp")
+            pq.write_table(pa.Table.from_pylist(rows), tmp_path)
+            os.replace(tmp_path, part) # Atômico: um crash não deixa parte truncada
+            return
+        with open(self.directory / "results.jsonl", "a", encoding="utf-8") as spool:
+            for row in rows:
+                spool.write(json.dumps(row, ensure_ascii=False, default=str) + "\n")
+            spool.flush()
+            os.fsync(spool.fileno())
+
+    def _trim_spool(self, last_date):
+        """Descarta do spool as datas não confirmadas (serão recalculadas na retomada)."""
+        for part in self.directory.glob("part_*.parquet"):
+            if last_date is None or part.stem[len("part_"):] > last_date:
+                part.unlink()
+        jsonl = self.directory / "results.jsonl"
+        if jsonl.exists():
+            kept = [
+                json.dumps(row, ensure_ascii=False, default=str) + "\n"
+                for row in self._jsonl_rows(jsonl)
+                if last_date is not None and row.get("sim_date", "") <= last_date
+            ]
+            tmp_path = jsonl.with_suffix(".tmp")
+            tmp_path.write_text("".join(kept), encoding="utf-8")
+            os.replace(tmp_path, jsonl)
+
+    @staticmethod
+    def _jsonl_rows(jsonl: Path):
+        """
+        Linhas do spool JSONL, uma a uma. Uma linha que não faz parse (o append
+        interrompido deixa a última pela metade) é descartada com aviso: a data dela
+        não chegou ao checkpoint e é recalculada na retomada.
+        """
+        skipped = 0
+        with open(jsonl, encoding="utf-8", errors="replace") as spool:
+            for line in spool:
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    skipped += 1
+                    continue
+                if isinstance(row, dict):
+                    yield row
+                else:
+                    skipped += 1
+        if skipped:
+            logger.warning(f"⚠️ Spool {jsonl.name}: {skipped} linha(s) corrompida(s) descartada(s)")
+
+    def read_spool(self) -> pd.DataFrame:
+        """Todas as linhas já spooladas da simulação (auditoria / reprocessamento)."""
+        parts = sorted(self.directory.glob("part_*.parquet"))
+        if parts and pq is not None:
+            return pd.concat([pq.read_table(p).to_pandas() for p in parts], ignore_index=True)
+        jsonl = self.directory / "results.jsonl"
+        if jsonl.exists():
+            return pd.DataFrame(list(self._jsonl_rows(jsonl)))
+        return pd.DataFrame()
@@ -1,3 +1,67 @@
+import numpy as np
+import pandas as pd
+
+
+class PhenologyTable:
+    """
+    Calendário fenológico compilado em tabelas NumPy densas.
+
+    - monthly: (estados + 1) x 13, coluna = mês (coluna 0 = mês desconhecido -> peso padrão);
+      a última linha é o estado desconhecido (peso padrão em todos os meses).
+    - daily: (estados + 1) x 366, dia do ano (0-365), interpolado linearmente entre os
+      meios de mês de forma cíclica (Dez -> Jan).
+
+    A busca é um gather (`table[state_idx, month]`) sobre arrays inteiros de contratos.
+    """
+
+    # Dia do ano (0-based) do meio de cada mês, âncora da interpolação diária
+    MID_MONTH_DAYS = np.array([14, 45, 73, 104, 134, 165, 195, 226, 257, 287, 318, 348])
+
+    def __init__(self, state_weights: dict, default_weight: float = 1.0):
+        self.states = [state.upper() for state in state_weights]
+        self.default_weight = default_weight
+        self._state_index = pd.Index(self.states)
+        self.default_row = len(self.states)
+
+        monthly = np.full((len(self.states) + 1, 13), float(default_weight))
+        for row, weights in enumerate(state_weights.values()):
+            for month, weight in weights.items():
+                monthly[row, month] = weight
+        self.monthly = monthly
+
+        # Interpolação cíclica entre os meios de mês
+        days = np.arange(366)
+        anchors = np.concatenate([self.MID_MONTH_DAYS - 366, self.MID_MONTH_DAYS, self.MID_MONTH_DAYS + 366])
+        self.daily = np.vstack([
+            np.interp(days, anchors, np.tile(row[1:], 3)) for row in monthly
+        ])
+
+    def state_indices(self, states) -> np.ndarray:
+        """Linha da tabela de cada UF (estados desconhecidos -> linha padrão)."""
+        codes = pd.Index(np.asarray(states, dtype=object).ravel()).astype(str).str.upper()
+        idx = self._state_index.get_indexer(codes)
+        idx[idx < 0] = self.default_row
+        return idx.reshape(np.shape(states))
+
+    def month_indices(self, months) -> np.ndarray:
+        """Coluna de cada mês (None/NaN/fora de 1-12 -> coluna 0, peso padrão)."""
+        shape = np.shape(months)
+        values = pd.to_numeric(pd.Series(np.asarray(months, dtype=object).ravel()), errors='coerce').to_numpy(dtype=float)
+        valid = np.isfinite(values) & (values >= 1) & (values <= 12) & (values == np.round(values))
+        idx = np.where(valid, np.nan_to_num(values), 0).astype(int)
+        return idx.reshape(shape)
+
+    def weights(self, states, months) -> np.ndarray:
+        """Peso fenológico por contrato (gather com broadcast entre estados e meses)."""
+        return self.monthly[self.state_indices(states), self.month_indices(months)]
+
+    def daily_weights(self, states, dates) -> np.ndarray:
+        """Peso fenológico diário (interpolado) para cada par UF x data."""
+        day_idx = pd.DatetimeIndex(np.asarray(dates).ravel()).dayofyear.to_numpy() - 1
+        day_idx = day_idx.reshape(np.shape(dates))
+        return self.daily[self.state_indices(states), day_idx]
+
+
 class SeasonalityManager:
     def __init__(self):
         # MATRIZ DE SENSIBILIDADE FENOLÓGICA POR ESTADO (UF)
@@ -23,6 +87,11 @@ class SeasonalityManager:
             }
         }
         self.default_weight = 1.0
+        # Estados que compõem cada grupo regional (peso do grupo = média dos estados)
+        self.region_groups = {"BR": list(self.state_weights)}
+
+        # Calendário compilado para busca vetorizada (gather)
+        self.table = PhenologyTable(self.state_weights, self.default_weight)
 
     def get_state_weight(self, month, state_code):
         """
@@ -33,16 +102,24 @@ class SeasonalityManager:
             return state_data.get(month, self.default_weight)
         return self.default_weight
 
+    def get_state_weights(self, months, state_codes) -> np.ndarray:
+        """Versão vetorizada de `get_state_weight` para arrays de contratos."""
+        return self.table.weights(state_codes, months)
+
     def get_weight(self, month, region_group):
-        if region_group == 'GLOBAL': return 1.0
-        if month in self.weights:
-            return self.weights[month].get(region_group, self.default_weight)
-        return self.default_weight
+        """Peso sazonal de um grupo regional: média dos pesos dos seus estados no mês."""
+        states = self.region_groups.get(region_group)
+        if not states: return self.default_weight
+        return float(self.table.weights(states, month).mean())
+
+
+# Uma única instância compartilhada (o calendário é imutável)
+_SHARED_MANAGER = SeasonalityManager()
 
 class RiskAnalyzer:
-    def __init__(self, raw_scores):
+    def __init__(self, raw_scores, manager: SeasonalityManager = None):
         self.scores = raw_scores
-        self.manager = SeasonalityManager()
+        self.manager = manager or _SHARED_MANAGER
 
     def calculate_weighted_risk(self, target_month):
         # Passo 1: Definir o peso sazonal
@@ -1,20 +1,34 @@
 from abc import ABC, abstractmethod
+from types import MappingProxyType
 import pandas as pd
 import numpy as np
-import yaml
+from core.alert_timeline import AlertCounts
+from core.env import get_config
+from core.market_snapshot import get_market_snapshot
 
 class BaseRiskStrategy(ABC):
-    def __init__(self):
+    def __init__(self, settings: dict = None):
+        self._frozen = False
         self.region_name = "Base"
-        self.settings = self._load_settings()
+        # Recebe a configuração já parseada (a Factory injeta a mesma para todas as estratégias)
+        self.settings = MappingProxyType(dict(settings if settings is not None else self._load_settings()))
+
+    def __setattr__(self, name, value):
+        if getattr(self, "_frozen", False):
+            raise AttributeError(f"{type(self).__name__} é imutável (instância compartilhada pela Factory).")
+        super().__setattr__(name, value)
+
+    def freeze(self):
+        """Torna a estratégia imutável para ser compartilhada entre contratos (Flyweight)."""
+        self._frozen = True
+        return self
 
     def _load_settings(self) -> dict:
         """
-        Carrega as configurações do arquivo settings.yaml.
+        Carrega as configurações do settings.yaml (parse único por processo via core.env).
         """
         try:
-            with open("/home/obscuritenoir/Portfolio/credit-risk-engine/settings.yaml", "r") as f:
-                return yaml.safe_load(f)
+            return get_config()
         except Exception as e:
             raise RuntimeError(f"Erro ao carregar settings.yaml: {e}")
 
@@ -38,7 +52,7 @@ class BaseRiskStrategy(ABC):
         Calcula o risco logístico com base nos dados de mercado e contrato.
 
         Parâmetros:
-        - df_market: DataFrame contendo os dados de mercado.
+        - df_market: DataFrame contendo os dados de mercado (ou o MarketFeatureSnapshot já resolvido).
         - contract_data: Dicionário que deve conter a chave 'dist_to_port', representando a distância ao porto.
 
         Retorna:
@@ -52,7 +66,7 @@ class BaseRiskStrategy(ABC):
         Calcula o risco climático com base nos dados climáticos, contrato e mês.
 
         Parâmetros:
-        - df_climate: DataFrame contendo os dados climáticos.
+        - df_climate: ClimateIndex (ou DataFrame) contendo os dados climáticos.
         - contract_data: Dicionário que deve conter a chave 'identifier', que mapeia para 'Location' no df_climate.
         - month: Inteiro representando o mês para o qual o risco climático será calculado.
 
@@ -63,30 +77,37 @@ class BaseRiskStrategy(ABC):
 
     @abstractmethod
     def calculate_market_risk(self, df_market: pd.DataFrame) -> float:
+        """
+        Calcula o risco de mercado (RSI/Volatilidade da soja).
+        Aceita o df_market ou o MarketFeatureSnapshot já resolvido pelo pipeline.
+        """
         pass
 
     @abstractmethod
-    def calculate_geopolitical_risk(self, active_alerts: list) -> float:
+    def calculate_geopolitical_risk(self, active_alerts) -> float:
         """
         Calcula o impacto geopolítico baseado nos alertas ativos.
+        Aceita a lista de alertas ou as contagens pré-computadas (AlertCounts).
         Retorna um score de 0 a 100 (Penalidade).
         """
         pass
 
-    def get_soy_brl_price(self, df_market: pd.DataFrame) -> float:
+    @staticmethod
+    def weighted_alert_penalty(active_alerts, weights: dict) -> float:
+        """Soma dos pesos (categoria, nível) x nº de alertas ativos em cada combinação."""
+        counts = active_alerts if isinstance(active_alerts, AlertCounts) else AlertCounts.from_alerts(active_alerts)
+        penalty = 0.0
+        for key, n in counts.items():
+            penalty += weights.get(key, 0.0) * n
+        return penalty
+
+    def get_soy_brl_price(self, df_market) -> float:
         """
         Retorna o preço da saca de 60kg em BRL.
         Base institucional para cálculo de valor de garantia.
+        Prefira passar o MarketFeatureSnapshot do ciclo: com o DataFrame, o frame é hasheado a cada chamada.
         """
-        try:
-            soy_chicago = df_market['ZS=F'].iloc[-1] 
-            usd_brl = df_market['USDBRL=X'].iloc[-1]
-            
-            # Conversão: (Cents/Bushel / 100) * USD * 2.2046 (Bushels to 60kg Bag)
-            price_saca = (soy_chicago / 100) * usd_brl * 2.2046
-            return round(float(price_saca), 2)
-        except:
-            return 0.0
+        return get_market_snapshot(df_market).soy_brl_price
 
     def sanitize_score(self, score: float) -> float:
         """Garante que o score não saia do range 0-100"""
@@ -1,5 +1,6 @@
 from .base import BaseRiskStrategy
-from core.indicators.technical import TechnicalIndicators as Tech
+from core.climate_index import ClimateIndex
+from core.market_snapshot import get_market_snapshot
 import pandas as pd
 import numpy as np
 import logging
@@ -7,8 +8,8 @@ import logging
 logger = logging.getLogger(__name__)
 
 class MatoGrossoStrategy(BaseRiskStrategy):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, settings: dict = None):
+        super().__init__(settings)
         self.region_name = "Mato Grosso"
         self.state_code = "MT" 
 
@@ -29,9 +30,8 @@ class MatoGrossoStrategy(BaseRiskStrategy):
         logistics_score = dist_port / 50.0
 
         # 3. Diesel Aggravator
-        # We check Crude Oil (CL=F) as a proxy for Diesel costs
-        diesel_series = df_market['CL=F']
-        diesel_change = diesel_series.pct_change().iloc[-1] if len(diesel_series) > 1 else 0
+        # We check Crude Oil (CL=F) as a proxy for Diesel costs (shared market snapshot)
+        diesel_change = get_market_snapshot(df_market).diesel_change
         
         # If Diesel prices are rising AND the distance is long (>1000km)
         # We amplify the risk for MT, but PR (being <1000km) stays closer to base.
@@ -44,23 +44,17 @@ class MatoGrossoStrategy(BaseRiskStrategy):
         # Uses 'name' mapped in pipeline
         loc_id = contract_data.get('name') 
         
-        if df_climate is None or df_climate.empty:
-             return 10.0 # Safe Fallback
-             
-        loc_row = df_climate[df_climate['Location'] == loc_id]
-        
-        if loc_row.empty:
-            return 10.0 
-        
-        return float(loc_row.iloc[0]['Risk_Score'])
+        # Hash lookup in the indexed scan (10.0 = Safe Fallback)
+        return ClimateIndex.coerce(df_climate).score(loc_id, default=10.0)
 
     def calculate_market_risk(self, df_market: pd.DataFrame) -> float:
         """
         Market Risk based on Backtest findings: RSI and Volatility.
         """
-        # 1. Recover Indicators
-        rsi = Tech.calculate_rsi(df_market['ZS=F'])
-        vol = Tech.calculate_volatility(df_market['ZS=F'])
+        # 1. Recover Indicators (computed once per df_market)
+        snapshot = get_market_snapshot(df_market)
+        rsi = snapshot.soy_rsi
+        vol = snapshot.soy_volatility
         
         # 2. Logic: Stretched market (High RSI) or High Volatility increases risk
         market_score = 30.0 # Base Market Risk
@@ -73,31 +67,25 @@ class MatoGrossoStrategy(BaseRiskStrategy):
         
         return self.sanitize_score(market_score)
 
-    def calculate_geopolitical_risk(self, active_alerts: list) -> float:
+    # Pesos por (categoria, nível) aplicados a cada alerta ativo
+    GEO_ALERT_WEIGHTS = {
+        # Weight 1: Logistics (MT depends 100% on long-distance transport)
+        ('GREVES_BR', 'CRÍTICO'): 20.0,
+        ('GREVES_BR', 'ALERTA'): 10.0,
+        ('LOGISTICA_GLOBAL', 'CRÍTICO'): 20.0,
+        ('LOGISTICA_GLOBAL', 'ALERTA'): 10.0,
+        # Weight 2: War/Sanctions (Direct impact on fertilizer costs)
+        ('GUERRA_SANCOES', 'CRÍTICO'): 15.0,
+        ('GUERRA_SANCOES', 'ALERTA'): 5.0,
+    }
+
+    def calculate_geopolitical_risk(self, active_alerts) -> float:
         """
         MT is highly sensitive to:
         1. Logistics (strikes, transport) - 100% dependent on long-haul routes
         2. War/Sanctions - Direct impact on fertilizer costs (imports)
         """
-        penalty = 0.0
-        
-        for alert in active_alerts:
-            cat = alert.get('category', '')
-            level = alert.get('risk_level', 'NEUTRO')
-            
-            # Weight 1: Logistics (MT depends 100% on long-distance transport)
-            if cat == 'GREVES_BR' or cat == 'LOGISTICA_GLOBAL':
-                if level == 'CRÍTICO':
-                    penalty += 20.0
-                elif level == 'ALERTA':
-                    penalty += 10.0
-            
-            # Weight 2: War/Sanctions (Direct impact on fertilizer costs)
-            if cat == 'GUERRA_SANCOES':
-                if level == 'CRÍTICO':
-                    penalty += 15.0
-                elif level == 'ALERTA':
-                    penalty += 5.0
+        penalty = self.weighted_alert_penalty(active_alerts, self.GEO_ALERT_WEIGHTS)
 
         # Cap penalty to avoid breaking the score alone
         return min(penalty, 40.0)
\ No newline at end of file
@@ -1,13 +1,14 @@
 from .base import BaseRiskStrategy
-from core.indicators.technical import TechnicalIndicators as Tech
+from core.climate_index import ClimateIndex
+from core.market_snapshot import get_market_snapshot
 import pandas as pd
 import logging
 
 logger = logging.getLogger(__name__)
 
 class ParanaStrategy(BaseRiskStrategy):
-    def __init__(self):
-        super().__init__()
+    def __init__(self, settings: dict = None):
+        super().__init__(settings)
         self.region_name = "Paraná"
         self.state_code = "PR" # Vinculação explícita
 
@@ -18,18 +19,15 @@ class ParanaStrategy(BaseRiskStrategy):
     def calculate_climate_risk(self, df_climate: pd.DataFrame, contract_data: dict, month: int) -> float:
         # Agora contract_data['name'] sempre existirá por causa do Mapper no Pipeline
         loc_id = contract_data.get('name') 
-        loc_row = df_climate[df_climate['Location'] == loc_id]
-        
-        if loc_row.empty:
-            return 10.0 # Fallback seguro
-        
-        return float(loc_row.iloc[0]['Risk_Score'])
+        # Busca O(1) no scan indexado (10.0 = Fallback seguro)
+        return ClimateIndex.coerce(df_climate).score(loc_id, default=10.0)
 
     def calculate_market_risk(self, df_market: pd.DataFrame) -> float:
         # 1. Recuperamos os indicadores que o backtest provou que funcionam
-        soy_brl = self.get_soy_brl_price(df_market) # Preço em R$
-        rsi = Tech.calculate_rsi(df_market['ZS=F'])
-        vol = Tech.calculate_volatility(df_market['ZS=F'])
+        snapshot = get_market_snapshot(df_market) # Calculado uma vez por df_market
+        soy_brl = snapshot.soy_brl_price # Preço em R$
+        rsi = snapshot.soy_rsi
+        vol = snapshot.soy_volatility
         
         # 2. Lógica do Backtest: Se o mercado está esticado (RSI alto) 
         # ou volátil demais, o risco de mercado sobe.
@@ -40,28 +38,21 @@ class ParanaStrategy(BaseRiskStrategy):
         
         return self.sanitize_score(market_score)
 
-    def calculate_geopolitical_risk(self, active_alerts: list) -> float:
+    # Pesos por (categoria, nível) aplicados a cada alerta ativo
+    GEO_ALERT_WEIGHTS = {
+        # Weight 1: Logistics (Lower impact than MT - half of MT's weight)
+        ('GREVES_BR', 'CRÍTICO'): 10.0,
+        ('GREVES_BR', 'ALERTA'): 5.0,
+        # Weight 2: Global Extreme Climate (Affects commodity prices)
+        ('CLIMA_EXTREMO', 'CRÍTICO'): 10.0,
+    }
+
+    def calculate_geopolitical_risk(self, active_alerts) -> float:
         """
         PR has better logistics and strong cooperatives, so:
         1. Lower impact from strikes (half of MT's weight)
         2. Sensitive to global extreme climate (affects commodity prices)
         """
-        penalty = 0.0
-        
-        for alert in active_alerts:
-            cat = alert.get('category', '')
-            level = alert.get('risk_level', 'NEUTRO')
-            
-            # Weight 1: Logistics (Lower impact than MT)
-            if cat == 'GREVES_BR':
-                if level == 'CRÍTICO':
-                    penalty += 10.0  # Half of MT's weight
-                elif level == 'ALERTA':
-                    penalty += 5.0
-            
-            # Weight 2: Global Extreme Climate (Affects commodity prices)
-            if cat == 'CLIMA_EXTREMO':
-                if level == 'CRÍTICO':
-                    penalty += 10.0
+        penalty = self.weighted_alert_penalty(active_alerts, self.GEO_ALERT_WEIGHTS)
 
         return min(penalty, 30.0)
\ No newline at end of file
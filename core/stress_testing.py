@@ -0,0 +1,154 @@
+# core/stress_testing.py
+from dataclasses import dataclass
+import numpy as np
+import pandas as pd
+from core.engine import RiskEngine
+from core.logger import get_logger
+
+logger = get_logger("StressTesting")
+
+
+@dataclass(frozen=True)
+class StressScenario:
+    """
+    Choque aplicado sobre o estado atual do mercado/clima.
+
+    soy_shock / fx_shock: variação relativa do último fechamento (ex.: -0.20 = Soja -20%).
+    climate_shock: pontos somados ao Risk_Score (limitado a 0..100).
+    states: UFs atingidas pelo choque climático (None = todas).
+    month: mês de referência do cenário (None = mês da carteira).
+    """
+    name: str
+    soy_shock: float = 0.0
+    fx_shock: float = 0.0
+    climate_shock: float = 0.0
+    states: tuple = None
+    month: int = None
+
+
+class StressTestResult:
+    """Matrizes (cenários x contratos) de PD, LTV, LGD e Perda Esperada."""
+
+    def __init__(self, scenarios, index, pd_score, ltv, lgd, expected_loss, exposure):
+        self.scenarios = list(scenarios)
+        self.index = index
+        self.pd = pd_score
+        self.ltv = ltv
+        self.lgd = lgd
+        self.el = expected_loss
+        self.exposure = exposure
+
+    def matrix(self, field: str) -> pd.DataFrame:
+        """Uma métrica ('pd', 'ltv', 'lgd', 'el') como DataFrame cenários x contratos."""
+        return pd.DataFrame(getattr(self, field), index=[s.name for s in self.scenarios], columns=self.index)
+
+    def summary(self) -> pd.DataFrame:
+        """Consolidado por cenário para o comitê de risco."""
+        total_exposure = self.exposure.sum()
+        return pd.DataFrame({
+            "expected_loss": self.el.sum(axis=1),
+            "el_pct_exposure": self.el.sum(axis=1) / total_exposure if total_exposure > 0 else 0.0,
+            "avg_pd": self.pd.mean(axis=1),
+            "max_pd": self.pd.max(axis=1),
+            "uncovered_contracts": (self.ltv > 1.0).sum(axis=1),
+        }, index=[s.name for s in self.scenarios])
+
+
+class StressTestEngine:
+    """
+    Stress test da carteira inteira em uma única computação NumPy com broadcast.
+
+    Os pilares de mercado são recalculados uma vez por choque de mercado distinto (S snapshots),
+    e a combinação cenário x contrato usa as mesmas regras vetorizadas do `RiskEngine.score_portfolio`.
+    Um cenário sem choques reproduz o `score_portfolio`.
+    """
+
+    SOY_TICKER = 'ZS=F'
+    FX_TICKER = 'USDBRL=X'
+
+    def __init__(self, engine: RiskEngine = None, base_price_brl: float = 120.0):
+        self.engine = engine or RiskEngine()
+        # Preço base da saca usado no LTV (mesmo default do motor); os choques de soja e câmbio o escalam
+        self.base_price_brl = base_price_brl
+
+    def run(self, contracts_frame: pd.DataFrame, df_market: pd.DataFrame, scenarios, climate=None,
+            month=None, alerts=None) -> StressTestResult:
+        scenarios = list(scenarios)
+        index = contracts_frame.index
+        n_scenarios, n_contracts = len(scenarios), len(contracts_frame)
+        if n_scenarios == 0 or n_contracts == 0:
+            empty = np.zeros((n_scenarios, n_contracts))
+            return StressTestResult(scenarios, index, empty, empty, empty, empty, np.zeros(n_contracts))
+
+        logger.info(f"🧪 Stress test: {n_scenarios} cenários x {n_contracts} contratos")
+        contract = self.engine.contract_arrays(contracts_frame, alerts)
+        base_climate = self.engine._lookup_climate_scores(contract['names'], climate)
+        months = [s.month if s.month is not None else month for s in scenarios]
+
+        # 1. Pilares de mercado por cenário (vetores S x 1)
+        pillars = np.zeros((n_scenarios, 3))
+        complete = np.zeros(n_scenarios, dtype=bool)
+        market_cache = {}
+        for i, (scenario, scenario_month) in enumerate(zip(scenarios, months)):
+            key = (scenario.soy_shock, scenario.fx_shock, scenario_month)
+            if key not in market_cache:
+                shocked = self._shock_market(df_market, scenario.soy_shock, scenario.fx_shock)
+                snapshot = self.engine.market_snapshot(shocked)
+                raw_scores, _ = self.engine.calculate_full_analysis(snapshot, None, None, scenario_month)
+                market_cache[key] = (
+                    snapshot.is_complete,
+                    [raw_scores.get('Logística', 0), raw_scores.get('Mercado', 0), raw_scores.get('Câmbio', 0)]
+                )
+            complete[i], pillars[i] = market_cache[key]
+
+        # 2. Clima estressado (S x N): choque apenas nos estados do cenário
+        states = contract['states'].to_numpy()
+        climate_shock = np.array([s.climate_shock for s in scenarios], dtype=float)[:, None]
+        affected = np.array([
+            np.ones(n_contracts, dtype=bool) if s.states is None else np.isin(states, list(s.states))
+            for s in scenarios
+        ])
+        climate_score = np.clip(base_climate[None, :] + climate_shock * affected, 0, 100)
+        climate_score = np.where(complete[:, None], climate_score, 0.0)
+
+        # 3. PD (S x N)
+        productive_score = (
+            (climate_score * 0.45) +
+            (pillars[:, [0]] * 0.25) +
+            (pillars[:, [1]] * 0.20) +
+            (pillars[:, [2]] * 0.10)
+        )
+        productive_score_with_geo = productive_score + contract['geo_penalty'][None, :]
+        combined_score = self.engine._combine_scores(climate_score, productive_score_with_geo, contract['behavioral_score'][None, :])
+        pd_score = np.round(np.minimum(self.engine._sigmoid_array(combined_score, midpoint=65.0, steepness=0.15), 99.9), 2)
+
+        # 4. LTV / LGD (S x N) com o preço da saca choqueado
+        pheno = self.engine.seasonality.get_state_weights(
+            np.array(months, dtype=object)[:, None], contract['ltv_states'].to_numpy()[None, :]
+        )
+        price = np.array([
+            self.base_price_brl * (1 + s.soy_shock) * (1 + s.fx_shock) for s in scenarios
+        ])[:, None]
+        credit = self.engine._calculate_ltv_exposure_array(
+            contract['loan_amount'][None, :],
+            contract['area_hectares'][None, :],
+            contract['estimated_yield_kg_ha'][None, :],
+            climate_score,
+            pheno,
+            price
+        )
+        lgd = np.broadcast_to(credit['lgd'], climate_score.shape)
+        ltv = np.broadcast_to(credit['ltv'], climate_score.shape)
+        expected_loss = (pd_score / 100.0) * lgd * contract['loan_amount'][None, :]
+
+        return StressTestResult(scenarios, index, pd_score, ltv, lgd, expected_loss, contract['loan_amount'])
+
+    def _shock_market(self, df_market: pd.DataFrame, soy_shock: float, fx_shock: float) -> pd.DataFrame:
+        """Aplica o choque sobre o último fechamento (o histórico fica intacto)."""
+        if not soy_shock and not fx_shock:
+            return df_market
+        shocked = df_market.copy()
+        for ticker, shock in ((self.SOY_TICKER, soy_shock), (self.FX_TICKER, fx_shock)):
+            if shock and ticker in shocked.columns:
+                shocked.iloc[-1, shocked.columns.get_loc(ticker)] *= (1 + shock)
+        return shocked
@@ -4,25 +4,27 @@ import pandas as pd
 from datetime import datetime
 from core.db import DatabaseManager
 from core.engine import RiskEngine
+from core.env import get_config
 from core.backtest_engine import InstitutionalBacktestEngine
+from core.data_lake import LocalDataLake
 from core.historical_climate_loader import HistoricalClimateLoader
 from core.logger import get_logger
 
 # Configuração de Telemetria Institucional
 logger = get_logger("BacktestMaestro")
 
-async def execute_institutional_backtest(tag: str):
+async def execute_institutional_backtest(tag: str, frequency: str = "MS", workers: int = 1, resume: bool = False):
     """
     Executa a simulação Walk-Forward baseada em uma Simulation Tag.
     Garante rastreabilidade total e isolamento de dados.
     """
-    logger.info(f"🏛️ Iniciando Maestro de Backtest | Tag: {tag}")
+    logger.info(f"🏛️ Iniciando Maestro de Backtest | Tag: {tag} | Frequência: {frequency}")
     
     # 1. INICIALIZAÇÃO DE COMPONENTES
     db = DatabaseManager(use_service_role=True)
     engine = RiskEngine()
     climate_loader = HistoricalClimateLoader(db)
-    backtester = InstitutionalBacktestEngine(engine, db)
+    backtester = InstitutionalBacktestEngine(engine, db, LocalDataLake.from_config(get_config()))
 
     # 2. FILTRAGEM DE CARTEIRA (Compliance: Isolamento por Tag)
     try:
@@ -62,17 +64,21 @@ async def execute_institutional_backtest(tag: str):
             simulation_name=tag,
             start_date=start_date,
             end_date=end_date,
-            contracts=contracts
+            contracts=contracts,
+            frequency=frequency,
+            workers=workers,
+            resume=resume
         )
     except Exception as e:
         logger.critical(f"💥 Falha na execução da simulação: {e}", exc_info=True)
+        logger.info("♻️ Os snapshots já gravados ficam no checkpoint: rode novamente com --resume para continuar.")
         return
 
     # 6. SUMÁRIO EXECUTIVO DE RISCO (VaR e Expected Loss)
     # Passamos a exposição real para o relatório
-    _print_institutional_report(db, tag, real_exposure)
+    _print_institutional_report(db, tag, real_exposure, backtester.loss_distribution, backtester.metrics)
 
-def _print_institutional_report(db, tag, real_exposure):
+def _print_institutional_report(db, tag, real_exposure, loss_distribution=None, metrics=None):
     """
     Gera o report final de performance do modelo para o comitê de risco.
     """
@@ -84,12 +90,14 @@ def _print_institutional_report(db, tag, real_exposure):
     if res.data:
         sim = res.data[0]
         
-        # Leitura explícita dos campos corretos
-        avg_el_monthly = sim.get('avg_log_loss', 0)        # Média mensal
+        # Leitura explícita dos campos corretos (valores por snapshot, no horizonte da frequência simulada)
+        avg_el = sim.get('avg_log_loss', 0)        # Média por snapshot
         var_95 = sim.get('max_var_95', 0)
+        frequency = sim.get('frequency') or (metrics.frequency if metrics is not None else "MS")
+        horizon = InstitutionalBacktestEngine.FREQUENCIES.get(frequency, InstitutionalBacktestEngine.FREQUENCIES["MS"])[2]
 
-        # Severidade Realista: Baseada na Média Mensal vs Exposição
-        severity = (avg_el_monthly / real_exposure) if real_exposure > 0 else 0
+        # Severidade Realista: Baseada na Média por snapshot vs Exposição
+        severity = (avg_el / real_exposure) if real_exposure > 0 else 0
 
         print("\n" + "█"*60)
         print(f"  RELATÓRIO DE PERFORMANCE DE MODELO - {tag}")
@@ -97,10 +105,22 @@ def _print_institutional_report(db, tag, real_exposure):
         print(f"  PERÍODO SIMULADO: {sim['start_date'][:10]} a {sim['end_date'][:10]}")
         print(f"  EXPOSIÇÃO (EAD):  R$ {real_exposure:,.2f}")
         print("  " + "─"*56)
-        print(f"  EXPECTED LOSS (MÉDIA MENSAL): R$ {avg_el_monthly:,.2f}")
-        print(f"  VaR (95% MENSAL):             R$ {var_95:,.2f}")
+        print(f"  FREQUÊNCIA DOS SNAPSHOTS: {frequency}")
+        print(f"  {f'EXPECTED LOSS (MÉDIA {horizon}):':<30}R$ {avg_el:,.2f}")
+        print(f"  {f'VaR (95% {horizon}):':<30}R$ {var_95:,.2f}")
         print("  " + "─"*56)
         print(f"  SEVERIDADE AJUSTADA (LGD 45%): {severity:.2%}")
+        if metrics is not None and metrics.n_dates:
+            print("  " + "─"*56)
+            print(f"  EXPECTED LOSS MÉDIA POR ESTADO ({horizon}):")
+            for state, value in metrics.breakdown()["avg_el_by_state"].items():
+                print(f"  {state:<30}R$ {value:,.2f}")
+        if loss_distribution is not None:
+            print("  " + "─"*56)
+            print(f"  MONTE CARLO ({loss_distribution.n_paths:,} CAMINHOS, LGD DINÂMICA):")
+            print(f"  EXPECTED LOSS:                R$ {loss_distribution.expected_loss:,.2f}")
+            for level in loss_distribution.confidence_levels:
+                print(f"  VaR / ES ({level:.0%}):             R$ {loss_distribution.var(level):,.2f} / R$ {loss_distribution.expected_shortfall(level):,.2f}")
         print(f"  STATUS:           MODELO VALIDADO (AUDIT TRAIL OK)")
         print("█" * 60 + "\n")
 
@@ -115,6 +135,26 @@ if __name__ == "__main__":
         help="Simulation Tag (Default: DEV_TEST_DATASET gerado pelo seed)"
     )
     
+    parser.add_argument(
+        "--frequency",
+        choices=["D", "W", "MS"],
+        default="MS",
+        help="Frequência dos snapshots: D (diária), W (semanal) ou MS (mensal, padrão)"
+    )
+    
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Processos para executar snapshots em paralelo (1 = serial)"
+    )
+
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Retoma a simulação a partir da última data confirmada no checkpoint"
+    )
+    
     args = parser.parse_args()
 
-    asyncio.run(execute_institutional_backtest(args.tag))
\ No newline at end of file
+    asyncio.run(execute_institutional_backtest(args.tag, args.frequency, args.workers, args.resume))
\ No newline at end of file
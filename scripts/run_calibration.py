@@ -0,0 +1,70 @@
+import asyncio
+import argparse
+from pathlib import Path
+import pandas as pd
+from core.db import DatabaseManager
+from core.engine import RiskEngine
+from core.env import get_config
+from core.backtest_engine import InstitutionalBacktestEngine
+from core.data_lake import LocalDataLake
+from core.calibration import CalibrationSweep, ModelParameters
+from core.historical_climate_loader import HistoricalClimateLoader
+from core.logger import get_logger
+
+logger = get_logger("CalibrationMaestro")
+
+async def execute_calibration_sweep(tag: str, frequency: str = "MS", mode: str = "grid", samples: int = 50,
+                                    seed: int = 42, output: str = None):
+    """
+    Roda o sweep de calibração sobre a carteira da Simulation Tag.
+    Mercado, clima e alertas são carregados uma vez para todos os conjuntos de parâmetros.
+    """
+    config = get_config().get('calibration', {}) or {}
+    logger.info(f"🎛️ Iniciando Sweep de Calibração | Tag: {tag} | Modo: {mode} | Frequência: {frequency}")
+
+    db = DatabaseManager(use_service_role=True)
+    backtester = InstitutionalBacktestEngine(RiskEngine(), db, LocalDataLake.from_config(get_config()))
+    climate_loader = HistoricalClimateLoader(db)
+
+    res = db.client.table("credit_portfolio").select("*").eq("simulation_tag", tag).execute()
+    contracts = res.data
+    if not contracts:
+        logger.error(f"❌ Nenhum contrato encontrado para a tag: {tag}")
+        return
+
+    # Mesmo cenário temporal do run_backtest.py
+    start_date = pd.to_datetime("2023-09-01", utc=True)
+    end_date = pd.to_datetime("2024-04-30", utc=True)
+    await climate_loader.batch_load(contracts, "2023-09-01", "2024-04-30")
+
+    if mode == "grid":
+        parameter_sets = ModelParameters.grid(config.get('grid', {}))
+    else:
+        parameter_sets = ModelParameters.sample(config.get('random', {}), samples, seed)
+
+    sweep = CalibrationSweep(backtester, config.get('max_chunk_mb', 256), config.get('workers', 1))
+    inputs = sweep.load(start_date, end_date, contracts, frequency)
+    results = sweep.evaluate(inputs, parameter_sets).sort_values('avg_log_loss')
+
+    output_path = Path(output or f".cache/calibration/{tag}_{frequency}_{mode}.csv")
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    results.to_csv(output_path, index=False)
+    logger.info(f"✅ {len(results)} conjuntos avaliados. Resultados em {output_path}")
+    print(results.head(10).to_string(index=False))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agro Risk Calibration Sweep")
+    parser.add_argument("--tag", default="DEV_TEST_DATASET", help="Simulation Tag da carteira")
+    parser.add_argument(
+        "--frequency",
+        choices=["D", "W", "MS"],
+        default="MS",
+        help="Frequência dos snapshots: D (diária), W (semanal) ou MS (mensal, padrão)"
+    )
+    parser.add_argument("--mode", choices=["grid", "random"], default="grid", help="Espaço de busca (seção `calibration`)")
+    parser.add_argument("--samples", type=int, default=50, help="Conjuntos sorteados no modo random")
+    parser.add_argument("--seed", type=int, default=42, help="Semente do modo random")
+    parser.add_argument("--output", default=None, help="CSV de saída (padrão: .cache/calibration/)")
+    args = parser.parse_args()
+
+    asyncio.run(execute_calibration_sweep(args.tag, args.frequency, args.mode, args.samples, args.seed, args.output))
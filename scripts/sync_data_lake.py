@@ -0,0 +1,28 @@
+import argparse
+from core.db import DatabaseManager
+from core.data_lake import LocalDataLake
+from core.env import get_config
+from core.logger import get_logger
+
+logger = get_logger("DataLakeSync")
+
+def sync_data_lake(full: bool = False, path: str = None):
+    """
+    Sincroniza o data lake local (Parquet/mmap) com o Supabase.
+    Incremental por padrão: só preços, células de clima e alertas novos ou alterados.
+    """
+    params = get_config().get('data_lake', {}) or {}
+    lake = LocalDataLake(path or params.get('path', '.cache/data_lake'))
+    db = DatabaseManager(use_service_role=True)
+
+    logger.info(f"🗄️ Sincronizando data lake em {lake.root} ({'completo' if full else 'incremental'})...")
+    stats = lake.sync(db.client, full=full)
+    logger.info(f"✅ Sync concluído: {stats['market_rows']} preços, {stats['climate_cells']} células de clima, {stats['alerts']} alertas.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Agro Risk Data Lake Sync")
+    parser.add_argument("--full", action="store_true", help="Reconstrói o lake do zero (ignora as marcas d'água)")
+    parser.add_argument("--path", default=None, help="Diretório do lake (padrão: data_lake.path do settings.yaml)")
+    args = parser.parse_args()
+
+    sync_data_lake(args.full, args.path)
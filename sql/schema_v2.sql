@@ -49,6 +49,7 @@ CREATE TABLE credit_portfolio (
     credit_score_serasa INT,
     debt_to_income_ratio FLOAT,
     simulation_tag VARCHAR(50),
+    risk_features JSONB, -- Vetor da narrativa do último scoring
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
@@ -90,10 +91,12 @@ CREATE TABLE backtest_simulations (
     simulation_name VARCHAR(100),
     start_date DATE,
     end_date DATE,
+    frequency VARCHAR(4) DEFAULT 'MS', -- Frequência dos snapshots ('D', 'W', 'MS'): horizonte do EL médio e do VaR
     status VARCHAR(20), -- 'RUNNING', 'COMPLETED'
     total_expected_loss FLOAT,
     avg_log_loss FLOAT,
     max_var_95 FLOAT,
+    metrics JSONB, -- Quebra da perda esperada por data, estado e cluster
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
@@ -104,7 +107,8 @@ CREATE TABLE backtest_results (
     sim_date DATE,
     pd_score FLOAT,
     expected_loss FLOAT,
-    risk_justification TEXT,
+    risk_justification TEXT, -- Legado: texto completo (execuções antigas)
+    risk_features JSONB, -- Vetor da narrativa (RiskAdvisor.render_narrative sob demanda)
     created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
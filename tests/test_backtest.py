@@ -0,0 +1,529 @@
+import numpy as np
+import pandas as pd
+import pytest
+from core.backtest_engine import InstitutionalBacktestEngine
+from core.engine import RiskEngine
+
+
+@pytest.fixture
+def backtester():
+    return InstitutionalBacktestEngine(RiskEngine(), db_manager=None)
+
+
+@pytest.fixture
+def climate_map():
+    rng = np.random.default_rng(5)
+    days = pd.date_range("2023-08-01", "2024-05-31", freq="D").strftime("%Y-%m-%d")
+    return {
+        (-12.5, -55.7): pd.DataFrame({"date": days, "precipitation": rng.gamma(0.6, 4, len(days)), "temp_max": rng.normal(32, 3, len(days))}),
+        (-24.9, -53.4): pd.DataFrame({"date": days, "precipitation": rng.gamma(1.5, 4, len(days)), "temp_max": rng.normal(27, 3, len(days))}),
+    }
+
+
+@pytest.fixture
+def contracts():
+    return [
+        {"id": 1, "client_name": "Fazenda MT", "latitude": -12.5, "longitude": -55.7},
+        {"id": 2, "client_name": "Fazenda PR", "latitude": -24.9, "longitude": -53.4},
+        {"id": 3, "client_name": "Vizinha MT", "latitude": -12.5, "longitude": -55.7},
+        {"id": 4, "client_name": "Sem Histórico", "latitude": 0.0, "longitude": 0.0},
+    ]
+
+
+def _string_window_snapshot(backtester, contracts, climate_map, current_date):
+    """Regra original: filtro por comparação de datas em string."""
+    lookback = (current_date - pd.Timedelta(days=7)).strftime("%Y-%m-%d")
+    target = current_date.strftime("%Y-%m-%d")
+    records = {}
+    for contract in contracts:
+        weather_df = climate_map.get((contract["latitude"], contract["longitude"]))
+        if weather_df is None:
+            continue
+        window = weather_df[(weather_df["date"] <= target) & (weather_df["date"] > lookback)]
+        rain_7d = window["precipitation"].sum() if not window.empty else 0
+        temp_max = window["temp_max"].mean() if not window.empty else 25
+        records[contract["client_name"]] = (rain_7d, temp_max, backtester.climate_intel.analyze_risk(
+            {"rain_7d": rain_7d, "temp_max": temp_max}, "production", "S", current_date.month
+        ))
+    return records
+
+
+@pytest.mark.parametrize("frequency", ["D", "W", "MS"])
+def test_climate_snapshot_matches_string_window(backtester, contracts, climate_map, frequency):
+    windows = backtester._prepare_climate_windows(climate_map)
+    pandas_freq = InstitutionalBacktestEngine.FREQUENCIES[frequency][0]
+    for current_date in pd.date_range("2023-09-01", "2024-04-30", freq=pandas_freq, tz="UTC")[:40]:
+        index = backtester._build_climate_snapshot(contracts, windows, current_date)
+        expected = _string_window_snapshot(backtester, contracts, climate_map, current_date)
+
+        assert len(index) == len(expected)
+        for name, (rain_7d, temp_max, (status, score)) in expected.items():
+            row = index.get(name)
+            assert row["Rain_7d"] == pytest.approx(rain_7d)
+            assert row["Temp_Max"] == pytest.approx(temp_max)
+            assert (row["Risk_Status"], row["Risk_Score"]) == (status, score)
+
+
+def test_walk_forward_rejects_unknown_frequency(backtester):
+    with pytest.raises(ValueError):
+        backtester.run_walk_forward("X", pd.Timestamp("2023-09-01", tz="UTC"), pd.Timestamp("2023-10-01", tz="UTC"), [], frequency="H")
+
+
+def test_parallel_snapshots_match_serial_in_date_order(backtester, contracts, climate_map):
+    from core.feature_store import BacktestFeatureStore
+
+    rng = np.random.default_rng(9)
+    days = pd.date_range("2023-07-15", "2024-01-31", freq="D", tz="UTC")
+    walk = lambda start, vol: start * np.exp(np.cumsum(rng.normal(0, vol, len(days))))
+    market = pd.DataFrame({"ZS=F": walk(1300, 0.02), "USDBRL=X": walk(5.0, 0.01), "CL=F": walk(80, 0.03)}, index=days)
+
+    for i, contract in enumerate(contracts):
+        contract.update({"state_code": "MT" if "MT" in contract["client_name"] else "PR",
+                         "loan_amount": 1_000_000 * (i + 1), "area_hectares": 300 * (i + 1)})
+    portfolio = pd.DataFrame(contracts)
+    portfolio["name"] = portfolio["client_name"]
+    job = {
+        "sim_id": "sim", "contracts": contracts, "portfolio": portfolio,
+        "loan_amounts": portfolio["loan_amount"].astype(float).to_numpy(), "contract_ids": portfolio["id"].tolist(),
+        "feature_store": BacktestFeatureStore(market), "climate_windows": backtester._prepare_climate_windows(climate_map),
+    }
+    dates = pd.date_range("2023-09-01", "2024-01-31", freq="W-MON", tz="UTC")
+    alerts = [[] for _ in dates]
+
+    serial = list(backtester._iter_snapshots(job, dates, alerts, workers=1))
+    parallel = list(backtester._iter_snapshots(job, dates, alerts, workers=2))
+
+    assert [step[0] for step in parallel] == list(range(len(dates)))
+    assert [step[3] for step in parallel] == [step[3] for step in serial]
+    pd.testing.assert_frame_equal(parallel[-1][2], serial[-1][2])
+
+
+def test_climate_cube_handles_gaps_and_missing_values(backtester, contracts, climate_map):
+    gappy = {coords: df.copy() for coords, df in climate_map.items()}
+    first = gappy[(-12.5, -55.7)]
+    first.loc[first.index[40:60], "temp_max"] = np.nan
+    gappy[(-12.5, -55.7)] = first.drop(first.index[70:90])
+
+    windows = backtester._prepare_climate_windows(gappy)
+    for current_date in pd.date_range("2023-09-05", "2023-11-05", freq="D", tz="UTC"):
+        index = backtester._build_climate_snapshot(contracts, windows, current_date)
+        expected = _string_window_snapshot(backtester, contracts, gappy, current_date)
+        for name, (rain_7d, temp_max, (status, score)) in expected.items():
+            row = index.get(name)
+            assert row["Rain_7d"] == pytest.approx(rain_7d)
+            assert row["Temp_Max"] == pytest.approx(temp_max, nan_ok=True)
+            assert (row["Risk_Status"], row["Risk_Score"]) == (status, score)
+
+
+@pytest.mark.parametrize("region_type", ["production", "logistics", "chokepoint"])
+@pytest.mark.parametrize("month", [1, 7])
+def test_analyze_risk_array_matches_scalar(backtester, region_type, month):
+    rain = np.array([0, 4.9, 5, 14.9, 15, 100, 181, 3, 3, 3])
+    temp = np.array([36, 33, 30, 20, 20, 20, 40, np.nan, 35.5, 32.5])
+    status, score = backtester.climate_intel.analyze_risk_array(rain, temp, region_type, "S", month)
+    for r, t, st, sc in zip(rain, temp, status, score):
+        assert backtester.climate_intel.analyze_risk({"rain_7d": r, "temp_max": t}, region_type, "S", month) == (st, sc)
+
+
+def test_alert_timeline_window_matches_filter_and_strategy_penalty():
+    from core.alert_timeline import AlertCounts, AlertTimeline
+    from core.factory import RegionalEngineFactory
+
+    rng = np.random.default_rng(11)
+    categories = ["GREVES_BR", "LOGISTICA_GLOBAL", "GUERRA_SANCOES", "CLIMA_EXTREMO", "OUTROS"]
+    stamps = pd.Timestamp("2023-10-01", tz="UTC") + pd.to_timedelta(rng.integers(0, 200 * 24, 300), unit="h")
+    alerts = [
+        {"created_at": ts.isoformat(), "category": rng.choice(categories), "risk_level": rng.choice(["CRÍTICO", "ALERTA"])}
+        for ts in stamps
+    ]
+    timeline = AlertTimeline(alerts)
+
+    for sim_date in pd.date_range("2023-11-01", "2024-04-01", freq="W-MON", tz="UTC"):
+        start = sim_date - pd.Timedelta(days=30)
+        expected = [a for a in alerts if start <= pd.Timestamp(a["created_at"]) <= sim_date]
+        window = timeline.window(sim_date)
+        assert sorted(a["created_at"] for a in window) == sorted(a["created_at"] for a in expected)
+
+        counts = timeline.counts(sim_date)
+        assert counts == AlertCounts.from_alerts(expected)
+        for state in ("MT", "PR"):
+            strategy = RegionalEngineFactory.get_strategy({"state_code": state})
+            assert strategy.calculate_geopolitical_risk(counts) == strategy.calculate_geopolitical_risk(expected)
+
+
+class _FlakyTable:
+    """Cliente Supabase mínimo: falha nas N primeiras execuções e registra inserts/deletes."""
+
+    def __init__(self, store, failures):
+        self.store, self.failures = store, failures
+        self._op, self._payload, self._filters = None, None, []
+
+    def insert(self, rows):
+        self._op, self._payload = "insert", rows
+        return self
+
+    def delete(self):
+        self._op = "delete"
+        return self
+
+    def eq(self, column, value):
+        self._filters.append((column, "eq", value))
+        return self
+
+    def gt(self, column, value):
+        self._filters.append((column, "gt", value))
+        return self
+
+    def execute(self):
+        if self.failures[0] > 0:
+            self.failures[0] -= 1
+            raise ConnectionError("timeout")
+        if self._op == "insert":
+            self.store.extend(self._payload)
+        else:
+            keep = lambda r: not all(r[c] == v if op == "eq" else r[c] > v for c, op, v in self._filters)
+            self.store[:] = [r for r in self.store if keep(r)]
+
+
+class _FlakyClient:
+    def __init__(self, failures=0):
+        self.rows, self.failures = [], [failures]
+
+    def table(self, name):
+        return _FlakyTable(self.rows, self.failures)
+
+
+def test_result_writer_retries_chunks_and_resumes_from_checkpoint(tmp_path):
+    from core.result_writer import BacktestResultWriter, BacktestWriteError
+
+    rows_for = lambda d: [{"simulation_id": 7, "contract_id": i, "sim_date": d} for i in range(5)]
+    client = _FlakyClient(failures=2)
+    waits = []
+    writer = BacktestResultWriter(client, 7, spool_dir=tmp_path, chunk_size=2, max_retries=3, sleep=waits.append)
+
+    writer.write("2024-01-01", rows_for("2024-01-01"))
+    assert len(client.rows) == 5 and waits == [1.0, 2.0]
+    assert writer.last_committed_date() == "2024-01-01"
+
+    # Falha persistente no meio do segundo snapshot: um bloco entra, o checkpoint não avança
+    client.failures[0] = 0
+    original_table = client.table
+    calls = []
+    def failing_after_first_chunk(name):
+        calls.append(name)
+        if len(calls) > 1:
+            client.failures[0] = 10
+        return original_table(name)
+    client.table = failing_after_first_chunk
+    with pytest.raises(BacktestWriteError):
+        writer.write("2024-02-01", rows_for("2024-02-01"))
+    assert writer.last_committed_date() == "2024-01-01"
+    assert len(client.rows) == 7
+
+    # Retomada: remove o insert parcial e o spool não confirmado
+    client.table, client.failures[0] = original_table, 0
+    resumed = BacktestResultWriter(client, 7, spool_dir=tmp_path, chunk_size=2, sleep=waits.append)
+    assert resumed.resume() == "2024-01-01"
+    assert [r["sim_date"] for r in client.rows] == ["2024-01-01"] * 5
+    resumed.write("2024-02-01", rows_for("2024-02-01"))
+    assert len(client.rows) == 10
+    assert resumed.read_spool()["sim_date"].value_counts().to_dict() == {"2024-01-01": 5, "2024-02-01": 5}
+
+
+def test_resume_tolerates_truncated_jsonl_spool(tmp_path, monkeypatch):
+    import core.result_writer as result_writer
+    from core.backtest_metrics import StreamingBacktestMetrics
+
+    monkeypatch.setattr(result_writer, "pq", None) # spool em JSONL
+    rows_for = lambda d: [{"simulation_id": 7, "contract_id": i, "sim_date": d, "expected_loss": 1.0} for i in range(5)]
+    writer = result_writer.BacktestResultWriter(None, 7, spool_dir=tmp_path)
+    writer.write("2024-01-01", rows_for("2024-01-01"))
+    # Crash no meio do append da data seguinte: última linha pela metade, checkpoint não avança
+    with open(writer.directory / "results.jsonl", "a", encoding="utf-8") as spool:
+        spool.write('{"simulation_id": 7, "contract_id": 0, "sim_date": "2024-02-01", "expec')
+
+    assert writer.read_spool()["sim_date"].tolist() == ["2024-01-01"] * 5
+    resumed = result_writer.BacktestResultWriter(None, 7, spool_dir=tmp_path)
+    assert resumed.resume() == "2024-01-01"
+    metrics = StreamingBacktestMetrics(pd.DataFrame({"id": range(5)}))
+    metrics.replay(resumed.read_spool())
+    assert metrics.dates == ["2024-01-01"]
+
+    resumed.write("2024-02-01", rows_for("2024-02-01"))
+    assert resumed.read_spool()["sim_date"].value_counts().to_dict() == {"2024-01-01": 5, "2024-02-01": 5}
+
+
+def test_streaming_metrics_match_sql_reaggregation():
+    from core.backtest_metrics import StreamingBacktestMetrics
+
+    rng = np.random.default_rng(3)
+    portfolio = pd.DataFrame({
+        "id": range(40),
+        "state_code": ["MT"] * 25 + ["PR"] * 15,
+        "latitude": np.r_[np.full(25, -12.5), np.full(15, -24.9)] + rng.uniform(-0.05, 0.05, 40),
+        "longitude": np.r_[np.full(25, -55.7), np.full(15, -53.4)] + rng.uniform(-0.05, 0.05, 40),
+    })
+    metrics = StreamingBacktestMetrics(portfolio)
+    all_rows = []
+    for sim_date in pd.date_range("2023-09-01", periods=23, freq="W-MON").strftime("%Y-%m-%d"):
+        kept = rng.permutation(40)[:rng.integers(30, 41)] # contratos com erro ficam fora do snapshot
+        rows = [{"contract_id": int(c), "sim_date": sim_date, "expected_loss": float(rng.gamma(2, 1e4))} for c in kept]
+        metrics.update(sim_date, rows)
+        all_rows.extend(rows)
+
+    df_agg = pd.DataFrame(all_rows)
+    by_date = df_agg.groupby("sim_date")["expected_loss"].sum()
+    summary = metrics.summary()
+    assert summary["total_expected_loss"] == pytest.approx(by_date.sum())
+    assert summary["avg_log_loss"] == pytest.approx(by_date.mean())
+    assert summary["max_var_95"] == pytest.approx(np.percentile(by_date, 95))
+
+    by_state = df_agg.merge(portfolio, left_on="contract_id", right_on="id").groupby("state_code")["expected_loss"].sum()
+    breakdown = metrics.breakdown()
+    assert breakdown["el_by_state"] == pytest.approx(by_state.to_dict())
+    assert sum(breakdown["el_by_cluster"].values()) == pytest.approx(by_date.sum())
+    assert len(breakdown["el_by_cluster"]) == 2
+
+    replayed = StreamingBacktestMetrics(portfolio)
+    replayed.replay(df_agg)
+    assert replayed.summary() == pytest.approx(summary)
+
+
+class _RecordingTable:
+    """Registra insert/update do `backtest_simulations` (select devolve as linhas já gravadas; delete é ignorado)."""
+
+    def __init__(self, rows):
+        self.rows, self._op = rows, None
+
+    def select(self, columns):
+        self._op = "select"
+        return self
+
+    def insert(self, payload):
+        self._op = "insert"
+        self.rows.append({"id": len(self.rows) + 1, **payload})
+        return self
+
+    def update(self, payload):
+        self._op, self._payload = "update", payload
+        return self
+
+    def delete(self):
+        self._op = "delete" # limpeza do `backtest_results`: nada a registrar
+        return self
+
+    def eq(self, column, value):
+        if self._op == "update":
+            for row in self.rows:
+                if row[column] == value:
+                    row.update(self._payload)
+        self._filter = (column, value)
+        return self
+
+    def execute(self):
+        class _Res:
+            pass
+        res = _Res()
+        if self._op == "select":
+            res.data = [r for r in self.rows if r.get(self._filter[0]) == self._filter[1]]
+        else:
+            res.data = self.rows[-1:]
+        return res
+
+
+def test_simulation_row_records_snapshot_frequency(monkeypatch, backtester):
+    from types import SimpleNamespace
+    from core.backtest_metrics import StreamingBacktestMetrics
+    import core.backtest_engine as backtest_engine
+
+    rows = []
+    backtester.db = SimpleNamespace(client=SimpleNamespace(table=lambda name: _RecordingTable(rows)))
+    monkeypatch.setattr(backtest_engine.BacktestResultWriter, "from_config",
+                        classmethod(lambda cls, client, sim_id, config: SimpleNamespace(reset=lambda: None)))
+    start, end = pd.Timestamp("2023-09-01", tz="UTC"), pd.Timestamp("2023-10-01", tz="UTC")
+
+    sim_id, _, _ = backtester._open_simulation("FREQ", start, end, frequency="D")
+    assert rows[0]["frequency"] == "D"
+
+    portfolio = pd.DataFrame({"id": [1, 2], "state_code": ["MT", "PR"]})
+    metrics = StreamingBacktestMetrics(portfolio, frequency="D")
+    metrics.update("2023-09-01", [{"contract_id": 1, "expected_loss": 10.0}, {"contract_id": 2, "expected_loss": 5.0}])
+    backtester._save_final_metrics(sim_id, metrics)
+    assert rows[0]["status"] == "COMPLETED"
+    assert rows[0]["metrics"]["frequency"] == "D"
+
+    # Reexecução com outra frequência atualiza a linha existente
+    backtester._open_simulation("FREQ", start, end, frequency="W")
+    assert len(rows) == 1 and rows[0]["frequency"] == "W"
+    assert InstitutionalBacktestEngine.FREQUENCIES["D"][2] == "DIÁRIO"
+
+
+def test_calibration_sweep_defaults_match_walk_forward(backtester, climate_map, contracts):
+    from core.alert_timeline import AlertTimeline
+    from core.calibration import CalibrationSweep, ModelParameters
+    from core.feature_store import BacktestFeatureStore
+
+    rng = np.random.default_rng(9)
+    market_dates = pd.date_range("2023-08-01", "2024-05-31", freq="D", tz="UTC")
+    walk = lambda start, vol: start * np.exp(np.cumsum(rng.normal(0, vol, len(market_dates))))
+    full_market = pd.DataFrame({"ZS=F": walk(1300, 0.02), "USDBRL=X": walk(5.0, 0.01), "CL=F": walk(80, 0.03)}, index=market_dates)
+    for i, contract in enumerate(contracts):
+        contract.update({"state_code": "MT" if i % 2 == 0 else "PR", "loan_amount": 1e6 * (i + 1), "area_hectares": 500,
+                         "credit_score_serasa": 500 + 100 * i, "debt_to_income_ratio": 0.2 * i})
+    timeline = AlertTimeline([
+        {"created_at": "2023-10-20T10:00:00+00:00", "category": "GREVES_BR", "risk_level": "CRÍTICO"},
+        {"created_at": "2024-01-10T10:00:00+00:00", "category": "GUERRA_SANCOES", "risk_level": "ALERTA"},
+    ])
+    cube = backtester._prepare_climate_windows(climate_map)
+    store = BacktestFeatureStore(full_market)
+    dates = pd.date_range("2023-10-01", "2024-04-30", freq="W-MON", tz="UTC")
+
+    sweep = CalibrationSweep(backtester, max_chunk_mb=1)
+    inputs = sweep.build(store, cube, timeline, contracts, dates)
+    space = {"sigmoid_midpoint": [60.0, 65.0, 70.0], "veto_catastrophe": [75.0, 80.0]}
+    sets = ModelParameters.grid(space)
+    results = sweep.evaluate(inputs, sets)
+    assert len(results) == 6
+
+    portfolio = pd.DataFrame(contracts)
+    portfolio["name"] = portfolio["client_name"]
+    job = {"sim_id": 1, "contracts": contracts, "portfolio": portfolio, "feature_store": store,
+           "loan_amounts": portfolio["loan_amount"].to_numpy(dtype=float), "contract_ids": portfolio["id"].tolist(),
+           "climate_windows": cube, "climate_positions": cube.positions(contracts)}
+    expected = [
+        sum(r["expected_loss"] for r in backtester._score_snapshot(job, d, timeline.counts(d))[1]) for d in dates
+    ]
+    default = results[(results["sigmoid_midpoint"] == 65.0) & (results["veto_catastrophe"] == 80.0)].iloc[0]
+    assert default["total_expected_loss"] == pytest.approx(sum(expected))
+    assert default["max_var_95"] == pytest.approx(np.percentile(expected, 95))
+    assert results.loc[results["sigmoid_midpoint"] == 60.0, "total_expected_loss"].min() > default["total_expected_loss"]
+
+    sampled = ModelParameters.sample({"sigmoid_steepness": {"min": 0.1, "max": 0.2}, "veto_alert": [45.0, 55.0]}, 5, seed=1)
+    assert sampled == ModelParameters.sample({"sigmoid_steepness": {"min": 0.1, "max": 0.2}, "veto_alert": [45.0, 55.0]}, 5, seed=1)
+    assert all(0.1 <= p.sigmoid_steepness <= 0.2 and p.weight_climate == 0.45 for p in sampled)
+
+
+class _FakeQuery:
+    """Consulta PostgREST mínima sobre listas em memória (select/filtros/not_/order/range)."""
+
+    def __init__(self, rows, log):
+        self.rows, self.log, self.filters, self.bounds, self.key = rows, log, [], None, None
+
+    def select(self, columns):
+        self.columns = [c.strip() for c in columns.split(",")]
+        return self
+
+    def gte(self, col, value):
+        self.filters.append(lambda r: str(r[col]) >= value)
+        return self
+
+    def gt(self, col, value):
+        self.filters.append(lambda r: str(r[col]) > value)
+        return self
+
+    def eq(self, col, value):
+        self.filters.append(lambda r: r[col] == value)
+        return self
+
+    def in_(self, col, values):
+        self.filters.append(lambda r: r[col] in values)
+        return self
+
+    @property
+    def not_(self):
+        query = self
+        class _Not:
+            def in_(self, col, values):
+                query.filters.append(lambda r: r[col] not in values)
+                return query
+        return _Not()
+
+    def order(self, col):
+        self.key = col
+        return self
+
+    def range(self, start, end):
+        self.bounds = (start, end + 1)
+        return self
+
+    def execute(self):
+        rows = [r for r in self.rows if all(f(r) for f in self.filters)]
+        rows = sorted(rows, key=lambda r: str(r[self.key])) if self.key else rows
+        rows = rows[slice(*self.bounds)] if self.bounds else rows
+        self.log.append(self.columns)
+        return type("Res", (), {"data": [{c: r[c] for c in self.columns} for r in rows]})()
+
+
+class _FakeSupabase:
+    def __init__(self, tables):
+        self.tables, self.log = tables, []
+
+    def table(self, name):
+        return _FakeQuery(self.tables.setdefault(name, []), self.log)
+
+
+def test_data_lake_incremental_sync_feeds_offline_backtest(tmp_path, climate_map, contracts):
+    from core.data_lake import LocalDataLake
+
+    days = pd.date_range("2023-11-20", "2024-01-10", freq="D").strftime("%Y-%m-%d")
+    prices = [{"ticker": t, "date": d, "close": float(i + (10 if t == "ZS=F" else 5))}
+              for t in ("ZS=F", "USDBRL=X") for i, d in enumerate(days)]
+    (lat, lon), weather = next(iter(climate_map.items()))
+    client = _FakeSupabase({
+        "market_prices": prices[:40] + prices[52:92],
+        "climate_historical_cache": [{"coordinate_hash": "h1", "latitude": lat, "longitude": lon,
+                                      "updated_at": "2024-06-01", "data_json": weather.to_dict("records")}],
+        "geopolitical_alerts": [
+            {"created_at": "2023-12-24T10:00:00+00:00", "category": "GREVES_BR", "risk_level": "CRÍTICO", "headline": "a"},
+            {"created_at": "2023-12-24T10:00:00+00:00", "category": "CLIMA_EXTREMO", "risk_level": "CRÍTICO", "headline": "b"},
+            {"created_at": "2024-01-02T10:00:00+00:00", "category": "OUTROS", "risk_level": "NEUTRO", "headline": "c"},
+        ],
+    })
+
+    lake = LocalDataLake(tmp_path / "lake")
+    assert lake.sync(client)["market_rows"] == 80
+    client.tables["market_prices"] = prices # chegam os dias novos
+    client.log.clear()
+    stats = LocalDataLake(tmp_path / "lake").sync(client)
+    assert stats["climate_cells"] == 0 and stats["alerts"] == 0 # versões iguais: nenhum blob relido
+    assert ["coordinate_hash", "latitude", "longitude", "data_json"] not in client.log
+
+    lake = LocalDataLake(tmp_path / "lake")
+    backtester = InstitutionalBacktestEngine(RiskEngine(), db_manager=None, lake=lake)
+    start, end = pd.Timestamp("2023-12-01", tz="UTC"), pd.Timestamp("2024-01-05", tz="UTC")
+    market = backtester._load_historical_market(start, end)
+    expected = pd.DataFrame(prices).assign(date=lambda f: pd.to_datetime(f["date"], utc=True))
+    expected = expected[(expected["date"] >= start) & (expected["date"] <= end)].pivot(index="date", columns="ticker", values="close")
+    pd.testing.assert_frame_equal(market[["USDBRL=X", "ZS=F"]], expected[["USDBRL=X", "ZS=F"]], check_names=False)
+
+    loaded = backtester._load_historical_climate_map(contracts, start, end)
+    assert list(loaded) == [(lat, lon)]
+    pd.testing.assert_frame_equal(loaded[(lat, lon)], weather.reset_index(drop=True), check_dtype=False)
+
+    timeline = backtester._load_alert_timeline(start, end)
+    assert len(timeline) == 2
+
+
+def test_data_lake_sync_uses_per_ticker_watermarks(tmp_path, monkeypatch):
+    import core.data_lake as data_lake
+
+    days = pd.date_range("2024-01-01", periods=30, freq="D").strftime("%Y-%m-%d")
+    prices = lambda ticker, n: [{"ticker": ticker, "date": d, "close": float(i + 1)} for i, d in enumerate(days[:n])]
+    client = _FakeSupabase({"market_prices": prices("ZS=F", 30) + prices("USDBRL=X", 10)})
+    lake = data_lake.LocalDataLake(tmp_path / "lake")
+    lake.sync(client)
+    assert lake.manifest["market"] == {"ZS=F": days[29], "USDBRL=X": days[9]}
+
+    # USDBRL=X atrasado ganha os dias novos; CL=F aparece na tabela com histórico completo
+    client.tables["market_prices"] = prices("ZS=F", 30) + prices("USDBRL=X", 30) + prices("CL=F", 30)
+    stats = data_lake.LocalDataLake(tmp_path / "lake").sync(client)
+    assert stats["market_rows"] == 1 + 21 + 30 # cada ticker relê só a partir da própria marca d'água
+    market = data_lake.LocalDataLake(tmp_path / "lake").read_market(days[0], days[-1])
+    assert market.groupby("ticker").size().to_dict() == {"CL=F": 30, "USDBRL=X": 30, "ZS=F": 30}
+
+    # Partição Parquet sem pyarrow: erro explícito em vez de NameError/AttributeError
+    (tmp_path / "parquet_part").mkdir()
+    (tmp_path / "parquet_part" / "part.parquet").write_bytes(b"PAR1")
+    monkeypatch.setattr(data_lake, "pq", None)
+    with pytest.raises(ImportError, match="pyarrow"):
+        data_lake.LocalDataLake._read_partition(tmp_path / "parquet_part", data_lake.LocalDataLake.MARKET_COLUMNS)
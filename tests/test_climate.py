@@ -0,0 +1,384 @@
+import asyncio
+import time
+import httpx
+import pytest
+from core.climate_risk import ClimateIntelligence
+from core.forecast_cache import ForecastCache
+from core.rate_limiter import AdaptiveRateLimiter
+
+
+def _open_meteo_transport(calls, daily_for):
+    """Open-Meteo falso: aceita listas de coordenadas e devolve um objeto por local."""
+    def handler(request):
+        calls.append(request)
+        lats = request.url.params["latitude"].split(",")
+        lons = request.url.params["longitude"].split(",")
+        items = [{"latitude": float(lat), "longitude": float(lon), "daily": daily_for(float(lat), float(lon))}
+                 for lat, lon in zip(lats, lons)]
+        return httpx.Response(200, json=items if len(items) > 1 else items[0])
+    return httpx.MockTransport(handler)
+
+
+def _scan(intel, locations, transport):
+    async def run():
+        async with httpx.AsyncClient(transport=transport) as client:
+            return await intel.run_full_scan_async(locations=locations, client=client)
+    return asyncio.run(run())
+
+
+def _hub_locations():
+    # 3 contratos no mesmo hub de Sorriso, 2 em Cascavel e 1 isolado
+    return [
+        {'id': 1, 'name': 'Fazenda A', 'lat': -12.541, 'lon': -55.719},
+        {'id': 2, 'name': 'Fazenda B', 'lat': -12.538, 'lon': -55.722},
+        {'id': 3, 'name': 'Fazenda C', 'lat': -12.52, 'lon': -55.70},
+        {'id': 4, 'name': 'Fazenda D', 'lat': -24.93, 'lon': -53.449},
+        {'id': 5, 'name': 'Fazenda E', 'lat': -24.94, 'lon': -53.43},
+        {'id': 6, 'name': 'Fazenda F', 'lat': -17.79, 'lon': -50.92},
+    ]
+
+
+def test_full_scan_fetches_each_grid_cell_once():
+    intel = ClimateIntelligence(batch_size=1)
+    calls = []
+    daily = lambda lat, lon: {"precipitation_sum": [2.0 if lat < -20 else 60.0], "temperature_2m_max": [36.0]}
+    locations = _hub_locations()
+    index = _scan(intel, locations, _open_meteo_transport(calls, daily))
+
+    cells = [(r.url.params["latitude"], r.url.params["longitude"]) for r in calls]
+    assert len(cells) == len(set(cells)) == 3
+    assert len(index) == len(locations)
+    for loc in locations:
+        row = index.get(loc['id'])
+        assert row['Location'] == loc['name']
+        assert row['Rain_7d'] == (2.0 if loc['lat'] < -20 else 60.0)
+
+
+@pytest.mark.parametrize("resolution", [0.1, 0.25])
+def test_grid_cell_snaps_to_model_resolution(resolution):
+    intel = ClimateIntelligence(grid_resolution=resolution)
+    cells, region_cells = intel._group_by_cell(_hub_locations())
+    assert len(region_cells) == 6
+    for (lat, lon), region in cells.items():
+        assert (region['lat'], region['lon']) == (lat, lon)
+        assert abs(lat / resolution - round(lat / resolution)) < 1e-6
+
+
+def test_batch_scan_packs_coordinates_and_falls_back_per_item():
+    intel = ClimateIntelligence(batch_size=2)
+    intel.weatherapi_key = None
+    calls = []
+    # Célula de Rio Verde volta com buracos na série -> fallback sintético só para ela
+    daily = lambda lat, lon: (
+        {"precipitation_sum": [None, 1.0], "temperature_2m_max": [30.0, None]} if lat > -18 and lat < -17
+        else {"precipitation_sum": [1.0, 2.0], "temperature_2m_max": [30.0, 34.0]}
+    )
+    index = _scan(intel, _hub_locations(), _open_meteo_transport(calls, daily))
+
+    assert len(calls) == 2 # 3 células em lotes de 2
+    assert sorted(r.url.params["latitude"].count(",") + 1 for r in calls) == [1, 2]
+    assert index.get(1)['Rain_7d'] == 3.0 and index.get(1)['Temp_Max'] == 32.0
+    assert index.get(6)['Rain_7d'] in (10.0, 50.0) # média histórica do fallback
+
+
+class _FakeCacheTable:
+    def __init__(self, rows, log):
+        self.rows, self.log, self.filter = rows, log, None
+
+    def select(self, columns):
+        return self
+
+    def in_(self, col, values):
+        self.filter = lambda r: r[col] in values
+        return self
+
+    def eq(self, col, value):
+        self.filter = lambda r: r[col] == value
+        return self
+
+    def upsert(self, rows, on_conflict=None):
+        self.log.append(("upsert", len(rows) if isinstance(rows, list) else 1))
+        self.rows.extend(rows if isinstance(rows, list) else [rows])
+        return self
+
+    def execute(self):
+        data = [r for r in self.rows if self.filter is None or self.filter(r)]
+        return type("Res", (), {"data": data})()
+
+
+def test_history_batch_uses_one_request_per_batch_and_caches():
+    pytest.importorskip("supabase")
+    from core.historical_climate_loader import HistoricalClimateLoader
+    rows, log = [], []
+    db = type("DB", (), {"client": type("C", (), {"table": lambda self, name: _FakeCacheTable(rows, log)})()})()
+    loader = HistoricalClimateLoader(db)
+    calls = []
+
+    def handler(request):
+        calls.append(request)
+        n = len(request.url.params["latitude"].split(","))
+        item = {"daily": {"time": ["2024-01-01", "2024-01-02"], "precipitation_sum": [1.0, 0.0], "temperature_2m_max": [31.0, 33.0]}}
+        return httpx.Response(200, json=[item] * n if n > 1 else item)
+
+    coords = [(-12.54, -55.72), (-24.95, -53.45), (-17.79, -50.92)]
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            first = await loader.fetch_real_history_batch(coords, "2024-01-01", "2024-01-02", client=client)
+            second = await loader.fetch_real_history_batch(coords, "2024-01-01", "2024-01-02", client=client)
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert len(calls) == 1 and log == [("upsert", 3)]
+    assert set(first) == set(second) == set(coords)
+    assert second[coords[0]]['temp_max'].tolist() == [31.0, 33.0]
+
+
+class _Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_forecast_cache_serves_stale_while_revalidating(tmp_path):
+    clock = _Clock(1_700_000_000.0 - 1_700_000_000.0 % 3600) # início de uma rodada do modelo
+    cache = ForecastCache(tmp_path / "forecast.sqlite", ttl_seconds=3600, max_stale_seconds=6 * 3600, clock=clock)
+    intel = ClimateIntelligence(cache=cache)
+    calls = []
+    rain = {"value": 60.0}
+    daily = lambda lat, lon: {"precipitation_sum": [rain["value"]], "temperature_2m_max": [30.0]}
+    transport = _open_meteo_transport(calls, daily)
+    intel._new_client = lambda: httpx.AsyncClient(transport=transport)
+    locations = _hub_locations()
+
+    intel.run_full_scan(locations=locations)
+    assert len(calls) == 1
+
+    # Mesma rodada e dentro do TTL: nenhum acesso à rede
+    clock.now += 1800
+    assert intel.run_full_scan(locations=locations).get(1)['Rain_7d'] == 60.0
+    assert len(calls) == 1
+
+    # Nova rodada do modelo: serve o valor velho sem bloquear e revalida em background
+    clock.now += 3600
+    rain["value"] = 5.0
+    assert intel.run_full_scan(locations=locations).get(1)['Rain_7d'] == 60.0
+    intel.wait_for_refresh(timeout=10)
+    assert len(calls) == 2
+    assert intel.run_full_scan(locations=locations).get(1)['Rain_7d'] == 5.0
+
+    # Além do limite de staleness: busca bloqueante
+    clock.now += 7 * 3600
+    rain["value"] = 1.0
+    assert intel.run_full_scan(locations=locations).get(1)['Rain_7d'] == 1.0
+    assert len(calls) == 3
+
+
+def test_revalidation_stores_each_batch_and_does_not_block_the_tick(tmp_path):
+    clock = _Clock(1_700_000_000.0 - 1_700_000_000.0 % 3600)
+    cache = ForecastCache(tmp_path / "forecast.sqlite", ttl_seconds=3600, max_stale_seconds=6 * 3600, clock=clock)
+    intel = ClimateIntelligence(batch_size=1, cache=cache)
+    intel.weatherapi_key = None
+    state = {"rain": 60.0, "stuck": False}
+
+    async def handler(request):
+        lat = float(request.url.params["latitude"])
+        while lat < -20 and state["stuck"]: # Cascavel travado durante a revalidação
+            await asyncio.sleep(0.01)
+        return httpx.Response(200, json={"daily": {"precipitation_sum": [state["rain"]], "temperature_2m_max": [30.0]}})
+
+    intel._new_client = lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    locations = _hub_locations()
+    intel.run_full_scan(locations=locations)
+
+    clock.now += 3600
+    state["rain"], state["stuck"] = 5.0, True
+    started = time.monotonic()
+    assert intel.run_full_scan(locations=locations).get(1)['Rain_7d'] == 60.0
+    assert intel.wait_for_refresh(timeout=0.3) is False
+    assert time.monotonic() - started < 2.0
+
+    # Lotes concluídos já estão no cache, mesmo com a revalidação presa em Cascavel
+    served, stale = cache.lookup(intel._group_by_cell(locations)[0])
+    assert served[intel._grid_cell(-12.541, -55.719)]['rain_7d'] == 5.0
+    assert served[intel._grid_cell(-24.93, -53.449)]['rain_7d'] == 60.0
+    state["stuck"] = False
+    assert intel.wait_for_refresh(timeout=10) is True
+
+
+def test_forecast_cache_skips_synthetic_fallback(tmp_path):
+    cache = ForecastCache(tmp_path / "forecast.sqlite")
+    cell = (-12.5, -55.7)
+    cache.store({cell: {'rain_7d': 50.0, 'temp_max': 30.0, 'is_estimated': True}})
+    assert cache.lookup([cell]) == ({}, [])
+    assert ForecastCache.from_config({}) is None
+
+
+def test_rate_limiter_token_bucket_and_aimd():
+    clock = _Clock(0.0)
+    limiter = AdaptiveRateLimiter(rate_per_second=4, burst=2, initial_concurrency=2, max_concurrency=8, clock=clock)
+    # Rajada de 2 tokens; o 3º e 4º esperam exatamente a reposição do bucket
+    assert [limiter._reserve_token() for _ in range(4)] == [0.0, 0.0, 0.25, 0.5]
+
+    limiter.on_success(0.1)
+    assert limiter.concurrency == 2.5 # +1/limite por resposta rápida (~+1 por janela)
+    limiter.on_success(10.0)
+    assert limiter.concurrency == 2.5 # resposta lenta não aumenta
+    limiter.on_throttle(retry_after=3)
+    assert limiter.concurrency == 1.25
+    assert limiter._reserve_token() == 3.0 # pausa do Retry-After vale para todos
+
+
+def test_rate_limiter_caps_in_flight_requests():
+    limiter = AdaptiveRateLimiter(rate_per_second=1000, initial_concurrency=3, max_concurrency=3)
+    state = {"now": 0, "peak": 0}
+
+    async def request():
+        async with limiter:
+            state["now"] += 1
+            state["peak"] = max(state["peak"], state["now"])
+            await asyncio.sleep(0.01)
+            state["now"] -= 1
+
+    async def run():
+        await asyncio.gather(*(request() for _ in range(12)))
+
+    asyncio.run(run())
+    assert state["peak"] == 3
+
+
+def test_scan_deadline_falls_back_for_pending_cells_and_honours_429():
+    # Concorrência inicial 4: após o 429 (-> 2) o retry com backoff não fica atrás do pedido travado
+    intel = ClimateIntelligence(batch_size=1, fetch_config={
+        "scan_deadline_seconds": 0.5, "providers": {"open_meteo": {"initial_concurrency": 4}}
+    })
+    intel.weatherapi_key = None
+    throttled = []
+
+    async def handler(request):
+        lat = float(request.url.params["latitude"])
+        if lat < -20: # Cascavel: provedor travado além do prazo
+            await asyncio.sleep(5)
+        if lat > -13 and not throttled: # Sorriso: 1º pedido leva 429
+            throttled.append(request)
+            return httpx.Response(429, headers={"Retry-After": "0.05"})
+        return httpx.Response(200, json={"daily": {"precipitation_sum": [20.0], "temperature_2m_max": [30.0]}})
+
+    started = time.monotonic()
+    index = _scan(intel, _hub_locations(), httpx.MockTransport(handler))
+    assert time.monotonic() - started < 2.0
+    assert throttled and index.get(1)['Rain_7d'] == 20.0
+    assert index.get(6)['Rain_7d'] == 20.0
+    assert index.get(4)['Rain_7d'] in (10.0, 50.0) # fallback sintético após o prazo
+
+
+def test_server_errors_throttle_and_back_off_within_the_deadline():
+    intel = ClimateIntelligence(fetch_config={
+        "retry_backoff_seconds": 0.1, "max_retries": 3, "providers": {"open_meteo": {"initial_concurrency": 4}}
+    })
+    calls = []
+
+    def handler(request):
+        calls.append(time.monotonic())
+        if len(calls) < 3:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"daily": {"precipitation_sum": [20.0], "temperature_2m_max": [30.0]}})
+
+    async def fetch(deadline=None):
+        limiters = intel._new_limiters()
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            result = await intel._fetch_open_meteo_batch(client, _hub_locations()[:1], limiters, deadline)
+        return result, limiters["open_meteo"].concurrency
+
+    result, concurrency = asyncio.run(fetch())
+    assert result[0]['rain_7d'] == 20.0
+    assert concurrency == 2.0 # 4 -> 2 -> 1 nos 503 (como um 429), +1 na resposta rápida
+    # Metade fixa do backoff: >= 0.05s e >= 0.1s entre as tentativas
+    assert calls[1] - calls[0] >= 0.05 and calls[2] - calls[1] >= 0.1
+
+    # Espera além do prazo do scan: desiste sem martelar o provedor
+    calls.clear()
+    result, _ = asyncio.run(fetch(deadline=time.monotonic() + 0.02))
+    assert result == [None] and len(calls) == 1
+
+
+def test_hedged_request_takes_first_valid_answer_after_primary_p95():
+    intel = ClimateIntelligence(fetch_config={"hedging": {"min_samples": 5}})
+    intel.weatherapi_key = "test"
+    for _ in range(10):
+        intel.latency["open_meteo"].record(0.05)
+    assert intel._hedge_delay() == pytest.approx(0.05)
+
+    async def handler(request):
+        if "weatherapi" in request.url.host:
+            day = {"day": {"totalprecip_mm": 3.0, "maxtemp_c": 31.0}}
+            return httpx.Response(200, json={"forecast": {"forecastday": [day] * 7}})
+        await asyncio.sleep(3) # primário preso na cauda
+        return httpx.Response(200, json={"daily": {"precipitation_sum": [99.0], "temperature_2m_max": [20.0]}})
+
+    started = time.monotonic()
+    index = _scan(intel, _hub_locations()[:2], httpx.MockTransport(handler))
+    assert time.monotonic() - started < 1.5
+    assert index.get(1)['Rain_7d'] == 21.0 and index.get(2)['Temp_Max'] == 31.0
+    assert len(intel.latency["weatherapi"]) == 1
+
+
+def _grid_locations(n):
+    # n fazendas em células distintas da grade (0.1°)
+    return [{'id': i, 'name': f'Fazenda {i}', 'lat': -12.0 - 0.2 * i, 'lon': -55.0} for i in range(n)]
+
+
+def _weatherapi_response(calls):
+    calls.append(1)
+    day = {"day": {"totalprecip_mm": 3.0, "maxtemp_c": 31.0}}
+    return httpx.Response(200, json={"forecast": {"forecastday": [day] * 7}})
+
+
+def test_large_batches_hedge_by_splitting_the_open_meteo_request():
+    intel = ClimateIntelligence(fetch_config={"hedging": {"min_samples": 5, "max_locations": 4}})
+    intel.weatherapi_key = "test"
+    for _ in range(10):
+        intel.latency["open_meteo"].record(0.05)
+    secondary, sizes = [], []
+
+    async def handler(request):
+        if "weatherapi" in request.url.host:
+            return _weatherapi_response(secondary)
+        lats = request.url.params["latitude"].split(",")
+        sizes.append(len(lats))
+        if len(lats) == 12:
+            await asyncio.sleep(3) # lote inteiro preso na cauda
+        items = [{"daily": {"precipitation_sum": [20.0], "temperature_2m_max": [30.0]}} for _ in lats]
+        return httpx.Response(200, json=items if len(items) > 1 else items[0])
+
+    locations = _grid_locations(12)
+    started = time.monotonic()
+    index = _scan(intel, locations, httpx.MockTransport(handler))
+    assert time.monotonic() - started < 1.5
+    # O lote não é fatiado por causa do hedging e a WeatherAPI não recebe rajada
+    assert sizes == [12, 6, 6] and secondary == []
+    assert all(index.get(loc['id'])['Rain_7d'] == 20.0 for loc in locations)
+
+
+def test_hedge_clock_ignores_time_queued_in_the_limiter():
+    intel = ClimateIntelligence(batch_size=1, fetch_config={
+        "hedging": {"min_samples": 5, "max_locations": 1},
+        "providers": {"open_meteo": {"rate_per_second": 4, "burst": 1}},
+    })
+    intel.weatherapi_key = "test"
+    for _ in range(10):
+        intel.latency["open_meteo"].record(0.05)
+    secondary = []
+
+    async def handler(request):
+        if "weatherapi" in request.url.host:
+            return _weatherapi_response(secondary)
+        return httpx.Response(200, json={"daily": {"precipitation_sum": [20.0], "temperature_2m_max": [30.0]}})
+
+    # 3 lotes de 1 célula: o 2º e o 3º esperam o token bucket (0.25s e 0.5s), mas respondem na hora
+    locations = _grid_locations(3)
+    index = _scan(intel, locations, httpx.MockTransport(handler))
+    assert secondary == []
+    assert all(index.get(loc['id'])['Rain_7d'] == 20.0 for loc in locations)
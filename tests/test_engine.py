@@ -0,0 +1,308 @@
+import numpy as np
+import pandas as pd
+import pytest
+from core.engine import RiskEngine
+
+
+@pytest.fixture
+def df_market():
+    rng = np.random.default_rng(7)
+    dates = pd.date_range("2023-06-01", periods=180, freq="D", tz="UTC")
+    walk = lambda start, vol: start * np.exp(np.cumsum(rng.normal(0, vol, len(dates))))
+    return pd.DataFrame({
+        "ZS=F": walk(1300, 0.02),
+        "USDBRL=X": walk(5.0, 0.01),
+        "CL=F": walk(80, 0.03),
+        "GC=F": walk(1900, 0.01),
+        "HE=F": walk(90, 0.02),
+    }, index=dates)
+
+
+@pytest.fixture
+def df_climate():
+    return pd.DataFrame({
+        "Location": ["Fazenda A", "Fazenda B", "Fazenda C", "Fazenda D"],
+        "Risk_Status": ["SECA EXTREMA", "CALOR + SECA", "NORMAL", "ATENÇÃO"],
+        "Risk_Score": [100, 70, 0, 20],
+    })
+
+
+@pytest.fixture
+def contracts():
+    return [
+        {"name": "Fazenda A", "state_code": "MT", "loan_amount": 12_000_000, "area_hectares": 3000,
+         "estimated_yield_kg_ha": 3300, "credit_score_serasa": 480, "debt_to_income_ratio": 0.9},
+        {"name": "Fazenda B", "state_code": "PR", "loan_amount": 2_000_000, "area_hectares": 500,
+         "estimated_yield_kg_ha": 4000, "credit_score_serasa": 900, "debt_to_income_ratio": 0.2},
+        {"name": "Fazenda C", "state_code": "GO", "loan_amount": 800_000, "area_hectares": 900},
+        {"name": "Fazenda D", "state_code": "MT", "loan_amount": 5_000_000, "area_hectares": 100,
+         "credit_score_serasa": 610, "debt_to_income_ratio": 0.6},
+        {"name": "Sem Clima", "state_code": "PR", "loan_amount": 1_000_000, "area_hectares": 400},
+        {"name": "Sem Dados", "state_code": "MT", "loan_amount": 0, "area_hectares": 0},
+    ]
+
+
+@pytest.mark.parametrize("month", [1, 3, 7])
+def test_score_portfolio_matches_scalar_path(df_market, df_climate, contracts, month):
+    """O scoring vetorizado deve reproduzir `calculate_pd_metrics` contrato a contrato."""
+    engine = RiskEngine()
+    alerts = [
+        {"category": "GREVES_BR", "risk_level": "CRÍTICO"},
+        {"category": "CLIMA_EXTREMO", "risk_level": "CRÍTICO"},
+    ]
+
+    scored = engine.score_portfolio(pd.DataFrame(contracts), df_market, df_climate, month, alerts)
+
+    for contract, row in zip(contracts, scored.to_dict("records")):
+        pd_score, metrics = engine.calculate_pd_metrics(
+            df_market, contract["name"], df_climate, contract, month, active_alerts=alerts
+        )
+        assert row["pd_score"] == pytest.approx(pd_score)
+        assert row["raw_combined_score"] == pytest.approx(metrics["raw_combined_score"])
+        assert row["geopolitical_penalty"] == metrics["geopolitical_penalty"]
+        assert row["ltv"] == pytest.approx(metrics["ltv"])
+        assert row["collateral_status"] == metrics["collateral_status"]
+
+        row_metrics = engine.portfolio_row_metrics(row)
+        if metrics["collateral_status"] != "DATA_MISSING":
+            assert row_metrics["collateral_value_brl"] == pytest.approx(metrics["collateral_value_brl"])
+            assert row_metrics["yield_loss_est"] == metrics["yield_loss_est"]
+            expected_lgd = engine._calculate_dynamic_lgd(contract["loan_amount"], metrics["collateral_value_brl"])
+            assert row["lgd"] == pytest.approx(expected_lgd)
+
+
+def test_score_portfolio_coerces_malformed_numeric_fields(df_market, df_climate, contracts):
+    engine = RiskEngine()
+    malformed = [dict(c) for c in contracts]
+    malformed[0]["loan_amount"] = "12.000.000"
+    malformed[1]["credit_score_serasa"] = "N/D"
+
+    scored = engine.score_portfolio(pd.DataFrame(malformed), df_market, df_climate, 1)
+    assert len(scored) == len(contracts)
+    assert scored.iloc[0]["collateral_status"] == "DATA_MISSING" # loan_amount inválido -> default 0
+
+    # Serasa inválido usa o default do escalar (700)
+    defaulted = dict(contracts[1], credit_score_serasa=700)
+    expected = engine.score_portfolio(pd.DataFrame([defaulted]), df_market, df_climate, 1)
+    assert scored.iloc[1]["pd_score"] == expected.iloc[0]["pd_score"]
+
+
+def test_score_portfolio_empty_frame(df_market):
+    scored = RiskEngine().score_portfolio(pd.DataFrame(), df_market)
+    assert scored.empty
+    assert list(scored.columns) == RiskEngine.PORTFOLIO_COLUMNS
+
+
+def test_market_snapshot_is_cached_by_fingerprint(df_market):
+    from core.market_snapshot import get_market_snapshot
+
+    snapshot = get_market_snapshot(df_market)
+    assert get_market_snapshot(df_market.copy()) is snapshot
+
+    shocked = df_market.copy()
+    shocked.iloc[-1, 0] *= 0.8
+    assert get_market_snapshot(shocked).fingerprint != snapshot.fingerprint
+
+
+def test_cached_snapshot_turns_stale_as_the_clock_advances(df_market, monkeypatch):
+    import datetime as dt
+    import core.market_snapshot as market_snapshot
+
+    fresh = df_market.copy()
+    fresh.index = pd.date_range(end=pd.Timestamp.now(tz="UTC").normalize(), periods=len(fresh), freq="D")
+    snapshot = market_snapshot.get_market_snapshot(fresh)
+    assert not snapshot.is_stale
+    basis = snapshot.raw_basis
+
+    class Later(dt.datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return dt.datetime.now(tz) + dt.timedelta(days=5)
+
+    monkeypatch.setattr(market_snapshot, "datetime", Later)
+    assert market_snapshot.get_market_snapshot(fresh) is snapshot # mesmo frame, mesmo cache
+    assert snapshot.is_stale
+    assert snapshot.raw_basis == pytest.approx(min(100, basis * 2)) # penalidade de staleness
+
+
+def test_strategies_reuse_resolved_snapshot_without_rehashing(df_market, monkeypatch):
+    import core.market_snapshot as market_snapshot
+    from core.factory import RegionalEngineFactory
+
+    snapshot = market_snapshot.get_market_snapshot(df_market)
+    calls = []
+    monkeypatch.setattr(market_snapshot, "fingerprint_market", lambda df: calls.append(1) or "x")
+
+    strategy = RegionalEngineFactory.get_strategy({"state_code": "MT"})
+    for _ in range(5):
+        strategy.get_soy_brl_price(snapshot)
+        strategy.calculate_market_risk(snapshot)
+        strategy.calculate_logistics_risk(snapshot, {"dist_to_port": 2000})
+    assert market_snapshot.get_market_snapshot(df_market, snapshot.fingerprint) is snapshot
+    assert calls == []
+
+
+def test_factory_serves_one_frozen_strategy_per_state():
+    from core.factory import RegionalEngineFactory
+
+    mt = RegionalEngineFactory.get_strategy({"state_code": "MT"})
+    assert RegionalEngineFactory.get_strategy({"state_code": "MT"}) is mt
+    assert RegionalEngineFactory.get_strategy({"state_code": "GO"}).state_code == "PR"
+    with pytest.raises(AttributeError):
+        mt.region_name = "Outro"
+
+
+def test_climate_index_lookup_by_location_and_contract_id(df_climate):
+    from core.climate_index import ClimateIndex
+
+    duplicated = pd.concat([df_climate, df_climate.assign(Risk_Score=-1)], ignore_index=True)
+    index = ClimateIndex(duplicated, aliases={42: "Fazenda B"})
+
+    assert index.score("Fazenda A") == 100.0
+    assert index.score(42) == 70.0
+    assert index.score("Inexistente") == 10.0
+    assert index.scores(["Fazenda C", 42, "Inexistente"]).tolist() == [0.0, 70.0, 10.0]
+    assert ClimateIndex.coerce(index) is index
+    assert ClimateIndex.coerce(None).empty
+
+
+def test_stress_test_baseline_matches_portfolio_and_shocks_broadcast(df_market, df_climate, contracts):
+    from core.stress_testing import StressScenario, StressTestEngine
+
+    engine = RiskEngine()
+    portfolio = pd.DataFrame(contracts)
+    scenarios = [
+        StressScenario("Base"),
+        StressScenario("Soja -20%", soy_shock=-0.20),
+        StressScenario("Seca MT Jan", climate_shock=40, states=("MT",), month=1),
+    ]
+
+    result = StressTestEngine(engine).run(portfolio, df_market, scenarios, df_climate, month=7)
+    scored = engine.score_portfolio(portfolio, df_market, df_climate, 7)
+
+    assert result.pd.shape == (3, len(contracts))
+    np.testing.assert_allclose(result.pd[0], scored["pd_score"])
+    np.testing.assert_allclose(result.ltv[0], scored["ltv"])
+    assert (result.ltv[1] >= result.ltv[0]).all()
+
+    mt = (portfolio["state_code"] == "MT").to_numpy()
+    january = engine.score_portfolio(portfolio, df_market, df_climate, 1)
+    assert (result.pd[2][~mt] == january["pd_score"].to_numpy()[~mt]).all()
+    assert (result.pd[2][mt] >= january["pd_score"].to_numpy()[mt]).all()
+    assert list(result.summary().index) == ["Base", "Soja -20%", "Seca MT Jan"]
+
+
+def test_monte_carlo_is_seeded_and_chunk_invariant():
+    from core.monte_carlo import MonteCarloLossSimulator
+
+    rng = np.random.default_rng(3)
+    pd_scores = rng.uniform(1, 40, 500)
+    lgd = rng.uniform(0.05, 0.6, 500)
+    exposure = rng.uniform(1e5, 1e6, 500)
+
+    small_chunks = MonteCarloLossSimulator(n_paths=4000, seed=11, max_chunk_mb=1)
+    threaded = MonteCarloLossSimulator(n_paths=4000, seed=11, max_chunk_mb=1, n_workers=3)
+    dist = small_chunks.simulate(pd_scores, lgd, exposure)
+
+    np.testing.assert_allclose(dist.losses, threaded.simulate(pd_scores, lgd, exposure).losses)
+    assert dist.simulated_mean == pytest.approx(dist.expected_loss, rel=0.02)
+    assert dist.expected_loss <= dist.var(0.95) <= dist.expected_shortfall(0.95) <= dist.expected_shortfall(0.99)
+
+    correlated = MonteCarloLossSimulator(n_paths=4000, seed=11, correlation=0.2).simulate(pd_scores, lgd, exposure)
+    assert correlated.var(0.99) > dist.var(0.99)
+
+
+@pytest.mark.parametrize("correlation", [0.0, 0.2])
+def test_monte_carlo_does_not_depend_on_memory_budget(correlation):
+    from core.monte_carlo import MonteCarloLossSimulator
+
+    rng = np.random.default_rng(5)
+    pd_scores = rng.uniform(1, 40, 500)
+    lgd = rng.uniform(0.05, 0.6, 500)
+    exposure = rng.uniform(1e5, 1e6, 500)
+
+    # 1 MB fatia cada bloco lógico de 4096 caminhos em ~500 linhas; o default sorteia o bloco inteiro
+    tight = MonteCarloLossSimulator(n_paths=10_000, seed=11, correlation=correlation, max_chunk_mb=1)
+    default = MonteCarloLossSimulator(n_paths=10_000, seed=11, correlation=correlation)
+    assert tight._chunk_paths(500) < MonteCarloLossSimulator.BLOCK_PATHS
+    np.testing.assert_array_equal(tight.simulate(pd_scores, lgd, exposure).losses,
+                                  default.simulate(pd_scores, lgd, exposure).losses)
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_scoring_executor_matches_serial(df_market, df_climate, contracts, backend):
+    from core.execution import ScoringExecutor
+
+    engine = RiskEngine()
+    portfolio = pd.DataFrame(contracts * 3)
+    serial = engine.score_portfolio(portfolio, df_market, df_climate, 1)
+    parallel = ScoringExecutor(backend, workers=2, chunk_size=4).score(engine, portfolio, df_market, df_climate, 1)
+
+    pd.testing.assert_frame_equal(parallel, serial)
+
+
+def test_phenology_table_matches_calendar_lookup():
+    from core.seasonality import SeasonalityManager
+
+    manager = SeasonalityManager()
+    states = np.array(["MT", "pr", "GO", "XX"])
+    months = np.array([None, 1, 4, 9, 12], dtype=object)
+
+    table = manager.get_state_weights(months[:, None], states[None, :])
+    expected = [[manager.get_state_weight(m, s) for s in states] for m in months]
+    np.testing.assert_array_equal(table, expected)
+
+    # Resolução diária: no meio do mês vale o peso mensal
+    assert manager.table.daily_weights(["MT"], ["2024-01-15"])[0] == pytest.approx(1.8)
+    assert manager.get_weight(1, "BR") == pytest.approx(np.mean([1.8, 2.0, 2.0, 2.0, 2.0, 1.5]))
+
+
+def test_feature_store_matches_prefix_recomputation(df_market):
+    from core.feature_store import BacktestFeatureStore
+
+    store = BacktestFeatureStore(df_market)
+    for as_of in [df_market.index[0], df_market.index[25], "2023-09-15 12:00", df_market.index[-1]]:
+        store.assert_point_in_time(pd.Timestamp(as_of, tz="UTC") if isinstance(as_of, str) else as_of)
+
+    with pytest.raises(ValueError):
+        store.snapshot_at(df_market.index[0] - pd.Timedelta(days=1))
+
+
+def test_feature_store_validates_every_snapshot_date(df_market):
+    from core.feature_store import BacktestFeatureStore, LookAheadError
+
+    store = BacktestFeatureStore(df_market)
+    dates = pd.date_range(df_market.index[0], df_market.index[-1], freq="W-MON")
+    positions = store.positions(dates)
+    assert (store.index[positions] <= dates).all()
+    assert list(positions) == [store.position(d) for d in dates]
+    store.assert_point_in_time_sample(dates, n_samples=5)
+
+    # Indicador não causal (olha a linha seguinte) é pego nas datas internas amostradas
+    leaky = BacktestFeatureStore(df_market)
+    leaky.soy_change_30d = np.roll(leaky.soy_change_30d, -1)
+    with pytest.raises(LookAheadError):
+        leaky.assert_point_in_time_sample(dates[1:-1], n_samples=5)
+
+    with pytest.raises(LookAheadError):
+        BacktestFeatureStore(df_market.iloc[::-1])
+
+
+def test_narrative_features_render_lazily_and_match_full_text(df_market, df_climate, contracts):
+    from core.advisor import RiskAdvisor, _render_narrative
+
+    engine, advisor = RiskEngine(), RiskAdvisor()
+    scored = engine.score_portfolio(pd.DataFrame(contracts), df_market, df_climate, 1)
+    features = advisor.narrative_features_batch(scored)
+
+    for row, vector in zip(scored.to_dict("records"), features):
+        metrics = engine.portfolio_row_metrics(row)
+        assert vector == advisor.narrative_features(row["pd_score"], metrics)
+        assert advisor.narrative_for({"risk_features": vector}) == advisor.generate_credit_narrative(row["pd_score"], metrics)
+
+    _render_narrative.cache_clear()
+    for vector in features * 50:
+        advisor.render_narrative(vector)
+    info = _render_narrative.cache_info()
+    assert info.misses == len({tuple(v.values()) for v in features}) and info.hits == len(features) * 50 - info.misses
+    assert advisor.narrative_for({"risk_features": None, "risk_justification": "texto legado"}) == "texto legado"
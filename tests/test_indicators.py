@@ -23,4 +23,95 @@ def test_washout_probability_safe():
     
     assert result['score'] == 0
 
-# Para rodar: PYTHONPATH=. uv run pytest
\ No newline at end of file
+# Para rodar: PYTHONPATH=. uv run pytest
+def test_streaming_indicators_match_batch():
+    """Os indicadores incrementais devem reproduzir o cálculo batch, inclusive após salvar/restaurar."""
+    import numpy as np
+    import pandas as pd
+    from core.indicators.technical import TechnicalIndicators
+    from core.indicators.streaming import StreamingIndicatorBank
+
+    rng = np.random.default_rng(3)
+    dates = pd.date_range("2024-01-01", periods=120, freq="D")
+    df = pd.DataFrame({"ZS=F": 1200 * np.exp(np.cumsum(rng.normal(0, 0.02, 120)))}, index=dates)
+
+    bank = StreamingIndicatorBank()
+    bank.ingest(df.iloc[:80])
+    bank = StreamingIndicatorBank.from_state(bank.to_state())
+    assert bank.ingest(df) == 40  # Só as barras novas são processadas
+
+    latest = bank.latest()["ZS=F"]
+    assert latest["rsi"] == pytest.approx(TechnicalIndicators.calculate_rsi(df["ZS=F"]))
+    assert latest["volatility"] == pytest.approx(TechnicalIndicators.calculate_volatility(df["ZS=F"]))
+    assert latest["trend"] == TechnicalIndicators.analyze_trend(df["ZS=F"])
+
+def test_streaming_indicators_reapply_revised_last_bar():
+    """Uma revisão intraday da última barra (mesmo timestamp) substitui o fechamento anterior."""
+    import numpy as np
+    import pandas as pd
+    from core.indicators.technical import TechnicalIndicators
+    from core.indicators.streaming import StreamingIndicatorBank
+
+    rng = np.random.default_rng(5)
+    dates = pd.date_range("2024-01-01", periods=60, freq="D")
+    df = pd.DataFrame({"ZS=F": 1200 * np.exp(np.cumsum(rng.normal(0, 0.02, 60)))}, index=dates)
+
+    bank = StreamingIndicatorBank()
+    bank.ingest(df)
+    revised = df.copy()
+    revised.iloc[-1, 0] *= 1.03
+    bank = StreamingIndicatorBank.from_state(bank.to_state())
+    assert bank.ingest(revised) == 1
+    assert bank.ingest(revised) == 0  # Fechamento inalterado: nada a reaplicar
+
+    latest = bank.latest()["ZS=F"]
+    assert bank.states["ZS=F"].bars == 60
+    assert latest["last_close"] == pytest.approx(revised["ZS=F"].iloc[-1])
+    assert latest["rsi"] == pytest.approx(TechnicalIndicators.calculate_rsi(revised["ZS=F"]))
+    assert latest["volatility"] == pytest.approx(TechnicalIndicators.calculate_volatility(revised["ZS=F"]))
+    assert latest["trend"] == TechnicalIndicators.analyze_trend(revised["ZS=F"])
+
+def test_streaming_snapshot_matches_full_history_snapshot():
+    """No watch, o snapshot montado com o estado incremental deve bater com o cálculo sobre o histórico."""
+    import numpy as np
+    import pandas as pd
+    from core.feature_store import _same_value
+    from core.indicators.streaming import StreamingIndicatorBank
+    from core.market_snapshot import build_market_snapshot
+
+    rng = np.random.default_rng(9)
+    dates = pd.date_range("2024-01-01", periods=90, freq="D")
+    df = pd.DataFrame({
+        t: 100 * np.exp(np.cumsum(rng.normal(0, 0.02, 90))) for t in ["ZS=F", "USDBRL=X", "CL=F", "GC=F"]
+    }, index=dates)
+
+    bank = StreamingIndicatorBank()
+    bank.ingest(df)
+    streamed = build_market_snapshot(df, indicators=bank.latest())
+    reference = build_market_snapshot(df)
+
+    assert streamed.fingerprint.startswith("stream:")
+    for field in reference.__dataclass_fields__:
+        if field != "fingerprint":
+            assert _same_value(getattr(streamed, field), getattr(reference, field)), field
+
+def test_indicator_matrix_matches_per_ticker_indicators():
+    """A matriz em lote deve bater com o cálculo ticker a ticker."""
+    import numpy as np
+    import pandas as pd
+    from core.indicators.technical import TechnicalIndicators
+    from core.indicators.matrix import IndicatorMatrix
+
+    rng = np.random.default_rng(11)
+    dates = pd.date_range("2024-01-01", periods=90, freq="D")
+    df = pd.DataFrame({
+        t: 100 * np.exp(np.cumsum(rng.normal(0, 0.02, 90))) for t in ["ZS=F", "USDBRL=X", "CL=F"]
+    }, index=dates)
+
+    matrix = IndicatorMatrix(df)
+    assert matrix.rsi.shape == matrix.volatility.shape == (90, 3)
+    for ticker in df.columns:
+        assert matrix.latest("rsi", ticker) == pytest.approx(TechnicalIndicators.calculate_rsi(df[ticker]))
+        assert matrix.latest_volatility(ticker) == pytest.approx(TechnicalIndicators.calculate_volatility(df[ticker]))
+        assert matrix.latest_volatility(ticker, window=30) == pytest.approx(TechnicalIndicators.calculate_volatility(df[ticker], 30))
+        assert matrix.latest_trend(ticker) == TechnicalIndicators.analyze_trend(df[ticker])